@@ -0,0 +1,182 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from elasticsearch import ApiError, helpers
+
+# Starting point and bounds of the controller, overridable through the environment
+BULK_CHUNK_BYTES = int(os.environ.get("BULK_CHUNK_BYTES", str(5 * 1024 * 1024)))
+BULK_MIN_CHUNK_BYTES = int(os.environ.get("BULK_MIN_CHUNK_BYTES", str(256 * 1024)))
+BULK_MAX_CHUNK_BYTES = int(os.environ.get("BULK_MAX_CHUNK_BYTES", str(50 * 1024 * 1024)))
+BULK_MAX_IN_FLIGHT = int(os.environ.get("BULK_MAX_IN_FLIGHT", "4"))
+# A request slower than this counts as back-pressure, like a rejection
+BULK_TARGET_LATENCY = float(os.environ.get("BULK_TARGET_LATENCY", "2.0"))
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", "8"))
+
+# Only what the controller reads from each item
+FILTER_PATH = "errors,items.*.status,items.*.error"
+REJECTED = 429
+
+
+def _encode(action):
+    """(NDJSON lines of one action, their size in bytes)."""
+    header, body = helpers.expand_action(action)
+    lines = json.dumps(header, separators=(",", ":"))
+    if body is not None:
+        lines += "\n" + (body if isinstance(body, str) else json.dumps(body, separators=(",", ":")))
+    lines = (lines + "\n").encode("utf-8")
+    return lines, len(lines)
+
+
+class AdaptiveBulk:
+    """
+    Bulk submission that tunes itself from Elasticsearch's feedback.
+
+    Actions (in ``helpers.bulk`` format) are packed into requests of
+    ``chunk_bytes`` and sent ``in_flight`` at a time. After every wave of
+    requests the limits follow an AIMD rule: when nothing was rejected and
+    every request finished within the target latency, chunk_bytes grows by
+    one step and in_flight by one; a 429 (for the request or any item) or a
+    slow request halves both. Rejected items are resent after an
+    exponential backoff with jitter; any other item error raises
+    ``helpers.BulkIndexError`` like ``helpers.bulk`` does.
+
+    One controller is meant to be shared by all threads writing through a
+    client (see ``get_bulk``), so what one thread learns about the cluster
+    applies to all.
+    """
+
+    def __init__(self, es, chunk_bytes=None, max_in_flight=None, target_latency=None):
+        self.es = es
+        self.chunk_bytes = chunk_bytes or BULK_CHUNK_BYTES
+        self.max_in_flight = max_in_flight or BULK_MAX_IN_FLIGHT
+        self.target_latency = target_latency or BULK_TARGET_LATENCY
+        self.step = max(BULK_MIN_CHUNK_BYTES, self.chunk_bytes // 4)
+        self.in_flight = 1
+
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix="bulk")
+        self.requests = 0
+        self.docs = 0
+        self.rejected = 0
+        self.latency = 0.0
+
+    # ---------------- limits ---------------- #
+
+    def _limits(self):
+        with self._lock:
+            return self.chunk_bytes, self.in_flight
+
+    def _adapt(self, backpressure):
+        with self._lock:
+            if backpressure:
+                self.chunk_bytes = max(BULK_MIN_CHUNK_BYTES, self.chunk_bytes // 2)
+                self.in_flight = max(1, self.in_flight // 2)
+            else:
+                self.chunk_bytes = min(BULK_MAX_CHUNK_BYTES, self.chunk_bytes + self.step)
+                self.in_flight = min(self.max_in_flight, self.in_flight + 1)
+
+    # ---------------- requests ---------------- #
+
+    def _send(self, chunk):
+        """(rejected entries, errors, latency) of one request."""
+        body = b"".join(lines for lines, _ in chunk)
+        start = time.perf_counter()
+        try:
+            resp = self.es.bulk(operations=body, filter_path=FILTER_PATH)
+        except ApiError as e:
+            if e.meta.status == REJECTED:
+                return list(chunk), [], time.perf_counter() - start
+            raise
+        latency = time.perf_counter() - start
+
+        if not resp.get("errors"):
+            return [], [], latency
+
+        rejected, errors = [], []
+        for entry, item in zip(chunk, resp["items"]):
+            op_type, result = next(iter(item.items()))
+            status = result.get("status", 500)
+            if status == REJECTED:
+                rejected.append(entry)
+            elif not 200 <= status < 300:
+                errors.append({op_type: result})
+        return rejected, errors, latency
+
+    def _chunks(self, pending, chunk_bytes, count):
+        """Up to ``count`` requests of at most ``chunk_bytes`` taken off ``pending``."""
+        chunks = []
+        while pending and len(chunks) < count:
+            chunk, size = [], 0
+            while pending and (not chunk or size + pending[-1][1] <= chunk_bytes):
+                entry = pending.pop()
+                chunk.append(entry)
+                size += entry[1]
+            chunks.append(chunk)
+        return chunks
+
+    def submit(self, actions):
+        """Sends every action; returns how many were indexed."""
+        pending = [_encode(action) for action in actions]
+        pending.reverse()
+        total = len(pending)
+        attempt = 0
+
+        while pending:
+            chunk_bytes, in_flight = self._limits()
+            chunks = self._chunks(pending, chunk_bytes, in_flight)
+            results = list(self._executor.map(self._send, chunks)) if len(chunks) > 1 \
+                else [self._send(chunks[0])]
+
+            rejected = [entry for result in results for entry in result[0]]
+            errors = [error for result in results for error in result[1]]
+            slowest = max(result[2] for result in results)
+            with self._lock:
+                self.requests += len(chunks)
+                self.rejected += len(rejected)
+                self.latency += sum(result[2] for result in results)
+            self._adapt(bool(rejected) or slowest > self.target_latency)
+
+            if errors:
+                raise helpers.BulkIndexError(f"{len(errors)} document(s) failed to index.", errors)
+            if rejected:
+                attempt += 1
+                if attempt > BULK_MAX_RETRIES:
+                    raise helpers.BulkIndexError(f"{len(rejected)} document(s) still rejected after "
+                                                 f"{BULK_MAX_RETRIES} retries.", [])
+                time.sleep(min(60.0, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0))
+                pending.extend(reversed(rejected))
+            else:
+                attempt = 0
+
+        with self._lock:
+            self.docs += total
+        return total
+
+    def report(self):
+        with self._lock:
+            average = self.latency / self.requests if self.requests else 0.0
+            return (f"{self.docs} documents in {self.requests} requests "
+                    f"(avg {average:.2f}s), {self.rejected} rejections retried, "
+                    f"now {self.chunk_bytes / 2**20:.1f} MiB x {self.in_flight} in flight")
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_bulk(es, **kwargs):
+    """
+    The AdaptiveBulk shared by everything writing through ``es`` with the
+    same settings (``kwargs`` of AdaptiveBulk); callers asking for other
+    settings get a controller of their own rather than the first caller's.
+    """
+    key = (id(es), tuple(sorted(kwargs.items())))
+    with _controllers_lock:
+        controller = _controllers.get(key)
+        if controller is None:
+            controller = _controllers[key] = AdaptiveBulk(es, **kwargs)
+        return controller
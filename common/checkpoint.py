@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    Progress of one pipeline stage, kept in a local JSON file so a run that
+    died halfway can be resumed.
+
+    The file holds the run's parameters (dates, target indices, ...), the
+    units already completed with their high-water date, and the units that
+    failed with their error. ``start`` either resumes the unfinished run
+    found on disk, whose parameters then win over the requested ones, or
+    starts afresh; ``remaining`` filters out the finished units. Failed
+    units are not finished: a resumed run tries them again. ``finish``
+    writes the failures to a ``.retry.json`` next to the checkpoint and
+    removes the checkpoint itself.
+
+    Every change is written through at once (atomically, via a temporary
+    file), and all methods are safe to call from several threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.retry_path = os.path.splitext(path)[0] + ".retry.json"
+        self.params = {}
+        self.completed = {}
+        self.failed = {}
+        self.previous = None
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return None
+
+    @classmethod
+    def peek(cls, path):
+        """Parameters of the unfinished run at ``path``, or None; nothing is written."""
+        state = cls(path)._read()
+        return state["params"] if state is not None else None
+
+    def _write(self):
+        state = {"params": self.params, "completed": self.completed, "failed": self.failed,
+                 "updated": datetime.now().isoformat(timespec="seconds")}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+    def start(self, resume=False, **params):
+        """
+        Resumes the unfinished run on disk when ``resume`` is set and there
+        is one, otherwise starts a new run with ``params``. The parameters of
+        an unfinished run that is replaced are left in ``previous`` so the
+        caller can clean up after it.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        state = self._read()
+        with self._lock:
+            if resume and state is not None:
+                self.params = state["params"]
+                self.completed = state["completed"]
+                self.failed = state["failed"]
+                logger.info(f"Resuming {self.path}: {len(self.completed)} done, "
+                            f"{len(self.failed)} to retry")
+            else:
+                if resume:
+                    logger.info(f"No checkpoint at {self.path}, starting from the beginning")
+                self.previous = state["params"] if state is not None else None
+                self.params = params
+                self.completed = {}
+                self.failed = {}
+            self._write()
+        return self
+
+    def update(self, **params):
+        """Adds parameters only known once the run has started."""
+        with self._lock:
+            self.params.update(params)
+            self._write()
+
+    def remaining(self, units):
+        """The ``units`` not completed yet, in their order."""
+        with self._lock:
+            return [unit for unit in units if unit not in self.completed]
+
+    def complete(self, units, high_water=None):
+        """Records ``units`` as done, with the last date they were processed up to."""
+        high_water = str(high_water) if high_water is not None else None
+        with self._lock:
+            for unit in units:
+                self.completed[unit] = high_water
+                self.failed.pop(unit, None)
+            self._write()
+
+    def fail(self, units, error):
+        """Records ``units`` as failed; they are retried on resume."""
+        with self._lock:
+            for unit in units:
+                self.failed[unit] = str(error)
+            self._write()
+
+    def finish(self):
+        """
+        Ends the run: writes the failed units to the retry list and removes
+        the checkpoint. Returns {unit: error} of the failures.
+        """
+        with self._lock:
+            failed = dict(self.failed)
+            if failed:
+                with open(self.retry_path, "w") as f:
+                    json.dump(failed, f, indent=2)
+                logger.warning(f"{len(failed)} unit(s) failed, retry list written to {self.retry_path}")
+            elif os.path.exists(self.retry_path):
+                os.remove(self.retry_path)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        return failed
+
+    def report(self):
+        with self._lock:
+            dates = [date for date in self.completed.values() if date]
+            return (f"{len(self.completed)} done (up to {max(dates) if dates else 'n/a'}), "
+                    f"{len(self.failed)} failed")
@@ -0,0 +1,43 @@
+import os
+import threading
+
+from elasticsearch import Elasticsearch
+
+# Defaults for every subsystem, overridable through the environment
+ES_HOST = os.environ.get("ES_HOST", "http://elasticsearch:9200")
+ES_CONNECTIONS = int(os.environ.get("ES_CONNECTIONS", "10"))
+ES_REQUEST_TIMEOUT = float(os.environ.get("ES_REQUEST_TIMEOUT", "60"))
+ES_MAX_RETRIES = int(os.environ.get("ES_MAX_RETRIES", "3"))
+ES_HTTP_COMPRESS = os.environ.get("ES_HTTP_COMPRESS", "true").lower() == "true"
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_es_client(host=None, connections=None) -> Elasticsearch:
+    """
+    The process-wide Elasticsearch client for ``host`` (default ES_HOST).
+
+    One client per host is created on first use and shared by every module
+    and thread after that, so HTTP connections are pooled and kept alive
+    instead of being opened per call. The pool holds ``connections``
+    connections (default ES_CONNECTIONS): callers running N worker threads
+    should ask for at least N on their first call, since a later call
+    cannot grow the pool of an existing client. Request bodies are gzip
+    compressed, and timed-out or failed requests are retried ES_MAX_RETRIES
+    times.
+    """
+    host = host or ES_HOST
+    with _lock:
+        client = _clients.get(host)
+        if client is None:
+            client = Elasticsearch(
+                host,
+                connections_per_node=max(connections or 0, ES_CONNECTIONS),
+                http_compress=ES_HTTP_COMPRESS,
+                request_timeout=ES_REQUEST_TIMEOUT,
+                max_retries=ES_MAX_RETRIES,
+                retry_on_timeout=True,
+            )
+            _clients[host] = client
+        return client
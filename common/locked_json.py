@@ -0,0 +1,40 @@
+import fcntl
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def update_json(path, changes):
+    """
+    Applies ``changes`` ({key: value}, None deleting the key) to the JSON
+    object stored at ``path`` and returns the merged object.
+
+    The file is re-read and rewritten (atomically) under an exclusive lock
+    on ``<path>.lock``, so processes sharing the file (e.g. shards on one
+    volume) each merge in their own keys instead of overwriting the others'.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except ValueError as e:
+            logger.warning(f"Discarding unreadable {path}: {e}")
+            data = {}
+
+        for key, value in changes.items():
+            if value is None:
+                data.pop(key, None)
+            else:
+                data[key] = value
+
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    return data
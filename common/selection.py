@@ -0,0 +1,189 @@
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+
+from common.es_client import get_es_client
+
+logger = logging.getLogger(__name__)
+
+# Index holding every index with its constituents (technical/IndexConstituents)
+INDICES_INDEX = "indices"
+
+
+# Exchange suffixes of the tickers (NSE, BSE)
+SUFFIXES = (".NS", ".BO")
+
+
+def symbol(ticker):
+    """``ticker`` without its exchange suffix, upper-cased: "abb.ns" -> "ABB"."""
+    ticker = ticker.strip().upper()
+    return ticker[:-3] if ticker.endswith(SUFFIXES) else ticker
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"expected a YYYY-MM-DD date, got {value!r}") from e
+
+
+def read_tickers(value):
+    """
+    Tickers of a ``--tickers`` value: a comma separated list, or ``@path``
+    of a file holding them. A JSON file may be a list or an object whose
+    keys are the tickers, such as the ``.retry.json`` lists of failed
+    units written next to the checkpoints.
+    """
+    if not value.startswith("@"):
+        return [ticker.strip() for ticker in value.split(",") if ticker.strip()]
+    with open(value[1:], "r") as f:
+        text = f.read()
+    if value.endswith(".json"):
+        data = json.loads(text)
+        return list(data.keys() if isinstance(data, dict) else data)
+    return [ticker for ticker in text.replace(",", " ").split()]
+
+
+def add_selection_args(parser):
+    """Adds the selectors every stage entry point shares."""
+    group = parser.add_argument_group("selection", "process and upsert only a slice of the universe")
+    group.add_argument("--tickers", action="append", default=None, metavar="T1,T2|@FILE",
+                       help="only these tickers (comma separated, or @file such as a .retry.json); repeatable")
+    group.add_argument("--index", action="append", default=None, metavar="INDEX",
+                       help="only the constituents of this index, by ticker (^NSEI) or name (Nifty 50); repeatable")
+    group.add_argument("--since", type=_date, default=None,
+                       help="only write candles (records) dated on or after YYYY-MM-DD")
+    group.add_argument("--until", type=_date, default=None,
+                       help="only use and write data up to YYYY-MM-DD")
+    return group
+
+
+def index_constituents(names, es=None):
+    """
+    {index ticker: constituents} of the indices in ``names``, looked up by
+    ticker or name in the "indices" index. Raises ValueError for names
+    that match no index.
+    """
+    es = es or get_es_client()
+    body = {
+        "size": len(names) * 10,
+        "_source": ["ticker", "Name", "constituents"],
+        "query": {"bool": {"should": [{"terms": {"ticker": names}}, {"terms": {"Name": names}}]}}
+    }
+    res = es.search(index=INDICES_INDEX, body=body)
+    found = {}
+    matched = set()
+    for hit in res["hits"]["hits"]:
+        source = hit["_source"]
+        found.setdefault(source["ticker"], set()).update(source.get("constituents") or [])
+        matched.update({source["ticker"], source.get("Name")})
+    unknown = [name for name in names if name not in matched]
+    if unknown:
+        raise ValueError(f"unknown index {', '.join(unknown)}")
+    return {ticker: sorted(constituents) for ticker, constituents in found.items()}
+
+
+class Selection:
+    """
+    The slice of the universe a partial run works on: ``tickers`` (None
+    for every ticker), ``indices`` they were expanded from, and the
+    ``since`` / ``until`` dates (YYYY-MM-DD strings, None for open ends).
+
+    Tickers match case-insensitively. One given with an exchange suffix
+    ("ABB.NS") only matches that listing; a bare symbol ("ABB") matches
+    it on every exchange.
+    """
+
+    def __init__(self, tickers=None, indices=None, since=None, until=None):
+        self.tickers = None if tickers is None else sorted(set(tickers))
+        self.indices = indices or {}
+        self.since = since
+        self.until = until
+        self._listings = self._symbols = None
+        if tickers is not None:
+            names = {ticker.strip().upper() for ticker in tickers}
+            self._listings = {name for name in names if name.endswith(SUFFIXES)}
+            self._symbols = names - self._listings
+
+    @property
+    def partial(self):
+        """True when only some tickers or dates are selected."""
+        return self.tickers is not None or self.since is not None or self.until is not None
+
+    def owns(self, ticker):
+        if self._symbols is None:
+            return True
+        return ticker.strip().upper() in self._listings or symbol(ticker) in self._symbols
+
+    def select(self, tickers):
+        """The ``tickers`` of the universe that are selected, in their order."""
+        if self._symbols is None:
+            return list(tickers)
+        selected = [ticker for ticker in tickers if self.owns(ticker)]
+        unknown = (self._listings - {ticker.strip().upper() for ticker in selected}) | \
+            (self._symbols - {symbol(ticker) for ticker in selected})
+        if unknown:
+            logger.warning(f"Selected tickers not in the universe, ignored: {', '.join(sorted(unknown))}")
+        return selected
+
+    def in_range(self, date):
+        """Whether ``date`` ("YYYY-MM-DD...") is between ``since`` and ``until``."""
+        date = str(date)[:10]
+        return (self.since is None or date >= self.since) and (self.until is None or date <= self.until)
+
+    def clip(self, frame, column="Date"):
+        """The rows of ``frame`` whose ``column`` is between ``since`` and ``until``."""
+        if self.since is None and self.until is None:
+            return frame
+        keep = frame[column].notna()
+        if self.since is not None:
+            keep &= frame[column] >= self.since
+        if self.until is not None:
+            keep &= frame[column] <= self.until
+        return frame[keep].reset_index(drop=True)
+
+    def __str__(self):
+        parts = []
+        if self.indices:
+            parts.append(f"constituents of {', '.join(self.indices)}")
+        if self.tickers is not None:
+            parts.append(f"{len(self.tickers)} tickers")
+        if self.since or self.until:
+            parts.append(f"{self.since or 'start'} to {self.until or 'today'}")
+        return "; ".join(parts) or "everything"
+
+
+def parse_selection(parser, args, es=None):
+    """
+    The Selection of the parsed ``args`` (see add_selection_args); bad
+    selectors are reported through ``parser.error``.
+    """
+    if args.since and args.until and args.since > args.until:
+        parser.error(f"--since {args.since} is after --until {args.until}")
+    tickers = None
+    indices = {}
+    try:
+        if args.tickers:
+            tickers = [ticker for value in args.tickers for ticker in read_tickers(value)]
+        if args.index:
+            indices = index_constituents(args.index, es)
+            tickers = (tickers or []) + [ticker for members in indices.values() for ticker in members]
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if tickers is not None and not tickers:
+        parser.error("the selection holds no tickers")
+    return Selection(tickers, indices, args.since, args.until)
+
+
+def partial_path(path, selection):
+    """
+    ``path`` of a checkpoint with ``.partial`` before the extension when
+    only a slice is selected, so a partial run leaves the checkpoint of an
+    interrupted full run alone.
+    """
+    if selection is None or not selection.partial:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.partial{ext}"
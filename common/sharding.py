@@ -0,0 +1,94 @@
+import argparse
+import glob
+import json
+import os
+import zlib
+from datetime import datetime
+
+
+class Shard:
+    """
+    Shard ``index`` (1-based) of ``count``: the tickers whose stable hash
+    (CRC-32 of the symbol, the same in every process and on every machine)
+    falls into it, so N containers can split one universe without talking
+    to each other.
+    """
+
+    def __init__(self, index, count):
+        if not 1 <= index <= count:
+            raise ValueError(f"shard {index}/{count} out of range")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, value):
+        """``"i/N"`` as a Shard; usable as an argparse ``type``."""
+        try:
+            index, count = (int(part) for part in value.split("/"))
+            return cls(index, count)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"expected i/N with 1 <= i <= N, got {value!r}") from e
+
+    def owns(self, ticker):
+        return zlib.crc32(ticker.encode("utf-8")) % self.count == self.index - 1
+
+    def select(self, tickers):
+        """The ``tickers`` of this shard, in their order."""
+        return [ticker for ticker in tickers if self.owns(ticker)]
+
+    @property
+    def name(self):
+        return f"shard-{self.index}-of-{self.count}"
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+def shard_path(path, shard):
+    """``path`` with the shard's name before the extension (unchanged without a shard)."""
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{shard.name}{ext}"
+
+
+def _marker(directory, stage, shard):
+    return os.path.join(directory, f"{stage}.{shard.name}.done.json")
+
+
+def mark_shard_done(directory, stage, shard, run=None, **summary):
+    """Records that ``shard`` finished ``stage`` of ``run`` (e.g. a plan id)."""
+    os.makedirs(directory, exist_ok=True)
+    marker = {"run": run, "shard": str(shard), "finished": datetime.now().isoformat(timespec="seconds")}
+    marker.update(summary)
+    tmp = _marker(directory, stage, shard) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(marker, f)
+    os.replace(tmp, _marker(directory, stage, shard))
+
+
+def shard_status(directory, stage, count, run=None):
+    """
+    ({shard: marker} of the shards of ``count`` that finished ``stage``,
+    [shards still missing]). With ``run`` a marker of another run counts
+    as missing.
+    """
+    done, missing = {}, []
+    for index in range(1, count + 1):
+        shard = Shard(index, count)
+        try:
+            with open(_marker(directory, stage, shard), "r") as f:
+                marker = json.load(f)
+        except (OSError, ValueError):
+            marker = None
+        if marker is None or (run is not None and marker.get("run") != run):
+            missing.append(str(shard))
+        else:
+            done[str(shard)] = marker
+    return done, missing
+
+
+def clear_shards(directory, stage):
+    """Removes the completion markers of every shard of ``stage``."""
+    for marker in glob.glob(os.path.join(directory, f"{stage}.shard-*.done.json")):
+        os.remove(marker)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The shared modules are imported as the "common" package from the
+# repository root, as run.sh sets PYTHONPATH up.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+import types
+
+import pytest
+from elasticsearch import ApiError, helpers
+
+from common import adaptive_bulk
+from common.adaptive_bulk import AdaptiveBulk, get_bulk
+
+
+class FakeES:
+    """_bulk endpoint storing documents; can reject whole requests or items with 429, or answer slowly."""
+
+    def __init__(self, reject_requests=0, reject_items=0, fail_items=0, latency=0.0):
+        self.reject_requests = reject_requests
+        self.reject_items = reject_items
+        self.fail_items = fail_items
+        self.latency = latency
+        self.store = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def bulk(self, operations, filter_path=None):
+        lines = operations.decode().splitlines()
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests.append(len(operations))
+            if self.reject_requests:
+                self.reject_requests -= 1
+                raise ApiError("rejected", types.SimpleNamespace(status=429), {})
+            items = []
+            for header, source in zip(lines[::2], lines[1::2]):
+                op_type, meta = next(iter(json.loads(header).items()))
+                if self.reject_items:
+                    self.reject_items -= 1
+                    items.append({op_type: {"status": 429}})
+                elif self.fail_items:
+                    self.fail_items -= 1
+                    items.append({op_type: {"status": 400, "error": {"type": "mapper_parsing_exception"}}})
+                else:
+                    self.store[meta["_id"]] = json.loads(source)
+                    items.append({op_type: {"status": 201}})
+        return {"errors": any(next(iter(item.values()))["status"] != 201 for item in items), "items": items}
+
+
+def _actions(n):
+    return [{"_index": "i", "_id": f"d{k}", "_source": {"v": k, "pad": "x" * 100}} for k in range(n)]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    slept = []
+    monkeypatch.setattr(adaptive_bulk, "time", types.SimpleNamespace(perf_counter=time.perf_counter,
+                                                                      sleep=slept.append))
+    monkeypatch.setattr(adaptive_bulk, "BULK_MIN_CHUNK_BYTES", 1024)
+    return slept
+
+
+def test_limits_grow_without_backpressure():
+    es = FakeES()
+    bulk = AdaptiveBulk(es, chunk_bytes=4096, max_in_flight=3, target_latency=10)
+
+    assert bulk.submit(_actions(500)) == 500
+    assert len(es.store) == 500
+    assert bulk.in_flight == 3 and bulk.chunk_bytes > 4096
+    assert es.requests[-1] > es.requests[0]
+
+
+def test_a_rejected_request_halves_the_limits_and_is_resent(no_backoff):
+    es = FakeES(reject_requests=1)
+    bulk = AdaptiveBulk(es, chunk_bytes=8192, max_in_flight=4, target_latency=10)
+    bulk.in_flight = 4
+
+    bulk._adapt(False)
+    grown = bulk.chunk_bytes
+    assert bulk.submit(_actions(20)) == 20
+    assert len(es.store) == 20 and bulk.rejected == 20
+    assert len(no_backoff) == 1
+    # halved by the rejection, then grown again by the retry
+    assert bulk.chunk_bytes == grown // 2 + bulk.step
+
+
+def test_slow_requests_halve_the_limits():
+    bulk = AdaptiveBulk(FakeES(latency=0.05), chunk_bytes=8192, max_in_flight=4, target_latency=0.01)
+    bulk.in_flight = 4
+
+    bulk.submit(_actions(10))
+    assert bulk.chunk_bytes == 4096 and bulk.in_flight == 2
+
+
+def test_rejected_items_are_retried_with_backoff(no_backoff):
+    es = FakeES(reject_items=7)
+    bulk = AdaptiveBulk(es, chunk_bytes=2048, max_in_flight=2, target_latency=10)
+
+    assert bulk.submit(_actions(40)) == 40
+    assert sorted(es.store) == sorted(f"d{k}" for k in range(40))
+    assert bulk.rejected == 7 and no_backoff
+
+
+def test_other_item_errors_raise():
+    with pytest.raises(helpers.BulkIndexError):
+        AdaptiveBulk(FakeES(fail_items=1), target_latency=10).submit(_actions(3))
+
+
+def test_rejections_give_up_after_the_retries(monkeypatch):
+    monkeypatch.setattr(adaptive_bulk, "BULK_MAX_RETRIES", 2)
+    with pytest.raises(helpers.BulkIndexError):
+        AdaptiveBulk(FakeES(reject_requests=10), target_latency=10).submit(_actions(3))
+
+
+def test_controllers_are_shared_per_client_and_settings():
+    es, other = FakeES(), FakeES()
+
+    assert get_bulk(es, chunk_bytes=1 << 20) is get_bulk(es, chunk_bytes=1 << 20)
+    assert get_bulk(es, chunk_bytes=1 << 20) is not get_bulk(es, chunk_bytes=2 << 20)
+    assert get_bulk(es) is not get_bulk(other)
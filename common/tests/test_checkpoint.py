@@ -0,0 +1,70 @@
+import json
+import os
+
+from common.checkpoint import Checkpoint
+
+
+def test_a_resumed_run_skips_finished_units_and_retries_failed_ones(tmp_path):
+    path = str(tmp_path / "stage.json")
+    first = Checkpoint(path).start(start="2024-01-01", indices=["a"])
+    first.complete(["A", "B"], high_water="2024-06-03")
+    first.fail(["C"], RuntimeError("timeout"))
+
+    resumed = Checkpoint(path).start(resume=True, start="2025-01-01", indices=["b"])
+    # the unfinished run's parameters win over the requested ones
+    assert resumed.params == {"start": "2024-01-01", "indices": ["a"]}
+    assert resumed.remaining(["A", "B", "C", "D"]) == ["C", "D"]
+    assert resumed.failed == {"C": "timeout"}
+
+    resumed.complete(["C"])
+    assert resumed.failed == {}
+
+
+def test_a_fresh_start_keeps_the_replaced_parameters(tmp_path):
+    path = str(tmp_path / "stage.json")
+    Checkpoint(path).start(start="2024-01-01").complete(["A"])
+
+    fresh = Checkpoint(path).start(start="2025-01-01")
+    assert fresh.previous == {"start": "2024-01-01"}
+    assert fresh.remaining(["A", "B"]) == ["A", "B"]
+    assert Checkpoint(str(tmp_path / "none.json")).start(resume=True, x=1).params == {"x": 1}
+
+
+def test_updates_are_written_through(tmp_path):
+    path = str(tmp_path / "stage.json")
+    checkpoint = Checkpoint(path).start(start="2024-01-01")
+    checkpoint.update(plan="p1")
+    checkpoint.complete(["A"], high_water="2024-06-03")
+
+    assert Checkpoint.peek(path) == {"start": "2024-01-01", "plan": "p1"}
+    with open(path) as f:
+        assert json.load(f)["completed"] == {"A": "2024-06-03"}
+    assert not os.path.exists(path + ".tmp")
+    assert Checkpoint.peek(str(tmp_path / "none.json")) is None
+
+
+def test_an_unreadable_checkpoint_starts_afresh(tmp_path):
+    path = tmp_path / "stage.json"
+    path.write_text("{not json")
+
+    checkpoint = Checkpoint(str(path)).start(resume=True, start="2024-01-01")
+    assert checkpoint.params == {"start": "2024-01-01"} and checkpoint.completed == {}
+
+
+def test_finish_writes_the_retry_list(tmp_path):
+    path = str(tmp_path / "stage.json")
+    checkpoint = Checkpoint(path).start()
+    checkpoint.complete(["A"], high_water="2024-06-03")
+    checkpoint.fail(["B"], "boom")
+
+    assert checkpoint.report() == "1 done (up to 2024-06-03), 1 failed"
+    assert checkpoint.finish() == {"B": "boom"}
+    assert not os.path.exists(path)
+    with open(checkpoint.retry_path) as f:
+        assert json.load(f) == {"B": "boom"}
+
+    # a clean run removes the stale retry list
+    clean = Checkpoint(path).start()
+    clean.complete(["B"])
+    assert clean.finish() == {}
+    assert not os.path.exists(checkpoint.retry_path)
@@ -0,0 +1,22 @@
+from common import es_client
+from common.es_client import get_es_client
+
+
+def test_one_client_per_host(monkeypatch):
+    monkeypatch.setattr(es_client, "_clients", {})
+
+    client = get_es_client("http://es-a:9200", connections=4)
+    assert get_es_client("http://es-a:9200") is client
+    assert get_es_client("http://es-b:9200") is not client
+
+
+def test_the_pool_holds_at_least_the_default_connections(monkeypatch):
+    monkeypatch.setattr(es_client, "_clients", {})
+    created = []
+    monkeypatch.setattr(es_client, "Elasticsearch", lambda host, **kwargs: created.append(kwargs) or object())
+
+    get_es_client("http://es-a:9200", connections=1)
+    get_es_client("http://es-b:9200", connections=es_client.ES_CONNECTIONS + 6)
+    assert [kwargs["connections_per_node"] for kwargs in created] == \
+        [es_client.ES_CONNECTIONS, es_client.ES_CONNECTIONS + 6]
+    assert created[0]["retry_on_timeout"] and created[0]["max_retries"] == es_client.ES_MAX_RETRIES
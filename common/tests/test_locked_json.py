@@ -0,0 +1,32 @@
+import json
+import threading
+
+from common.locked_json import update_json
+
+
+def test_changes_are_merged_and_none_deletes(tmp_path):
+    path = str(tmp_path / "sub" / "state.json")
+
+    assert update_json(path, {"a": 1, "b": 2}) == {"a": 1, "b": 2}
+    assert update_json(path, {"a": None, "c": 3}) == {"b": 2, "c": 3}
+    with open(path) as f:
+        assert json.load(f) == {"b": 2, "c": 3}
+
+
+def test_an_unreadable_file_is_replaced(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text("{broken")
+
+    assert update_json(str(path), {"a": 1}) == {"a": 1}
+
+
+def test_concurrent_writers_lose_no_keys(tmp_path):
+    path = str(tmp_path / "state.json")
+    threads = [threading.Thread(target=update_json, args=(path, {f"k{i}": i})) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path) as f:
+        assert json.load(f) == {f"k{i}": i for i in range(20)}
@@ -0,0 +1,61 @@
+import argparse
+import json
+
+import pytest
+
+from common.selection import Selection, add_selection_args, parse_selection, partial_path, read_tickers
+
+UNIVERSE = ["ABB.NS", "ABB.BO", "ACC.NS", "TCS.NS", "TCS.BO", "^NSEI"]
+
+
+def test_a_suffixed_ticker_selects_only_that_listing():
+    assert Selection(["ABB.NS"]).select(UNIVERSE) == ["ABB.NS"]
+    assert Selection(["tcs.bo"]).select(UNIVERSE) == ["TCS.BO"]
+
+
+def test_a_bare_symbol_selects_every_listing():
+    assert Selection(["abb", "^NSEI"]).select(UNIVERSE) == ["ABB.NS", "ABB.BO", "^NSEI"]
+
+
+def test_unknown_tickers_are_left_out(caplog):
+    selection = Selection(["ACC.BO", "TCS"])
+
+    assert selection.select(UNIVERSE) == ["TCS.NS", "TCS.BO"]
+    assert "ACC.BO" in caplog.text
+
+
+def test_everything_is_selected_without_tickers():
+    selection = Selection(since="2024-01-01")
+
+    assert selection.partial and selection.owns("ANY.NS")
+    assert selection.select(UNIVERSE) == UNIVERSE
+    assert not Selection().partial
+
+
+def test_dates_are_clipped_inclusively():
+    selection = Selection(since="2024-01-01", until="2024-01-31")
+
+    assert selection.in_range("2024-01-01T00:00") and selection.in_range("2024-01-31")
+    assert not selection.in_range("2023-12-31") and not selection.in_range("2024-02-01")
+
+
+def test_read_tickers_from_a_retry_file(tmp_path):
+    retry = tmp_path / "full_index.retry.json"
+    retry.write_text(json.dumps({"XYZ.NS": "boom", "ABC.NS": "boom"}))
+
+    assert read_tickers(" abb, TCS.NS ,") == ["abb", "TCS.NS"]
+    assert read_tickers(f"@{retry}") == ["XYZ.NS", "ABC.NS"]
+
+
+def test_partial_runs_keep_their_own_checkpoint():
+    assert partial_path("c/full_index.json", Selection(["ABB"])) == "c/full_index.partial.json"
+    assert partial_path("c/full_index.json", Selection()) == "c/full_index.json"
+
+
+def test_bad_selectors_are_rejected():
+    parser = argparse.ArgumentParser()
+    add_selection_args(parser)
+    for argv in (["--since", "2024-02-01", "--until", "2024-01-01"], ["--since", "2024-13-01"],
+                 ["--tickers", "@/no/such/file"]):
+        with pytest.raises(SystemExit):
+            parse_selection(parser, parser.parse_args(argv))
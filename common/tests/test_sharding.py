@@ -0,0 +1,53 @@
+import argparse
+import zlib
+
+import pytest
+
+from common.sharding import Shard, clear_shards, mark_shard_done, shard_path, shard_status
+
+TICKERS = [f"S{i:03d}.NS" for i in range(500)]
+
+
+def test_shards_split_the_universe_disjointly():
+    shards = [Shard(index, 4) for index in range(1, 5)]
+    selected = [shard.select(TICKERS) for shard in shards]
+
+    assert sorted(ticker for tickers in selected for ticker in tickers) == TICKERS
+    assert all(len(tickers) > 0 for tickers in selected)
+    assert sum(len(tickers) for tickers in selected) == len(TICKERS)
+    # selection keeps the universe's order
+    assert selected[0] == [ticker for ticker in TICKERS if ticker in set(selected[0])]
+
+
+def test_assignment_is_the_crc32_of_the_ticker():
+    # stable across processes and machines, unlike hash()
+    shard = Shard(3, 7)
+    assert [shard.owns(t) for t in TICKERS] == [zlib.crc32(t.encode()) % 7 == 2 for t in TICKERS]
+    assert Shard(1, 1).select(TICKERS) == TICKERS
+
+
+def test_parse():
+    shard = Shard.parse("2/5")
+    assert (shard.index, shard.count, str(shard), shard.name) == (2, 5, "2/5", "shard-2-of-5")
+    for value in ("0/3", "4/3", "2", "a/b"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            Shard.parse(value)
+
+
+def test_shard_path():
+    assert shard_path("checkpoints/index.json", None) == "checkpoints/index.json"
+    assert shard_path("checkpoints/index.json", Shard(1, 2)) == "checkpoints/index.shard-1-of-2.json"
+
+
+def test_status_follows_the_markers_of_the_run(tmp_path):
+    directory = str(tmp_path)
+    mark_shard_done(directory, "index", Shard(1, 3), run="p1", tickers=10)
+    mark_shard_done(directory, "index", Shard(3, 3), run="p0")
+
+    done, missing = shard_status(directory, "index", 3, run="p1")
+    assert list(done) == ["1/3"] and done["1/3"]["tickers"] == 10
+    assert missing == ["2/3", "3/3"]
+    assert list(shard_status(directory, "index", 3)[0]) == ["1/3", "3/3"]
+
+    clear_shards(directory, "index")
+    assert shard_status(directory, "index", 3) == ({}, ["1/3", "2/3", "3/3"])
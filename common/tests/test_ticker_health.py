@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from common import ticker_health
+from common.ticker_health import TickerHealth
+
+
+def _health(tmp_path):
+    return TickerHealth("yfinance", path=str(tmp_path / "yfinance.json"))
+
+
+def test_tickers_back_off_after_repeated_failures(tmp_path):
+    health = _health(tmp_path)
+    health.update(failed=["A.NS"])
+    assert health.filter(["A.NS", "B.NS"]) == ["A.NS", "B.NS"]
+
+    health.update(ok=["B.NS"], failed=["A.NS"])
+    assert health.filter(["A.NS", "B.NS"]) == ["B.NS"]
+    assert health.skipped == {"A.NS"}
+    assert "1 tickers skipped" in health.report()
+
+    # the registry outlives the run
+    assert _health(tmp_path).filter(["A.NS"]) == []
+
+
+def test_the_backoff_doubles_up_to_the_maximum(tmp_path):
+    health = _health(tmp_path)
+    days = []
+    for _ in range(10):
+        health.update(failed=["A.NS"])
+        record = health.records["A.NS"]
+        if "skip_until" in record:
+            until = datetime.fromisoformat(record["skip_until"])
+            days.append(round((until - datetime.fromisoformat(record["last_failure"])) / timedelta(days=1)))
+
+    start = ticker_health.TICKER_BACKOFF_DAYS
+    assert days[:3] == [start, start * 2, start * 4]
+    assert max(days) == days[-1] == ticker_health.TICKER_MAX_BACKOFF_DAYS
+
+
+def test_a_success_clears_the_record(tmp_path):
+    health = _health(tmp_path)
+    health.update(failed=["A.NS"], error=ValueError("empty"))
+    assert health.records["A.NS"]["last_error"] == "empty"
+
+    health.update(ok=["A.NS"])
+    assert health.recovered == {"A.NS"}
+    assert _health(tmp_path).records == {}
+
+
+def test_tickers_past_their_backoff_are_tried_again(tmp_path):
+    health = _health(tmp_path)
+    health.update(failed=["A.NS"] * 2)
+    health.records["A.NS"]["skip_until"] = (datetime.now() - timedelta(minutes=1)).isoformat(timespec="seconds")
+
+    assert health.filter(["A.NS"]) == ["A.NS"]
+
+
+def test_processes_sharing_the_registry_keep_each_others_records(tmp_path):
+    first, second = _health(tmp_path), _health(tmp_path)
+    first.update(failed=["A.NS"])
+    second.update(failed=["B.NS"])
+
+    assert set(_health(tmp_path).records) == {"A.NS", "B.NS"}
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from common.locked_json import update_json
+
+logger = logging.getLogger(__name__)
+
+# Where the registries live and how the backoff grows, overridable through the environment
+TICKER_HEALTH_DIR = os.environ.get("TICKER_HEALTH_DIR", "ticker_health")
+TICKER_FAILURES_BEFORE_SKIP = int(os.environ.get("TICKER_FAILURES_BEFORE_SKIP", "2"))
+TICKER_BACKOFF_DAYS = float(os.environ.get("TICKER_BACKOFF_DAYS", "1"))
+TICKER_MAX_BACKOFF_DAYS = float(os.environ.get("TICKER_MAX_BACKOFF_DAYS", "32"))
+
+
+class TickerHealth:
+    """
+    Consecutive empty or failed fetches per ticker for one data source
+    (yfinance, screener, ...), persisted in ``<TICKER_HEALTH_DIR>/<source>.json``.
+
+    After TICKER_FAILURES_BEFORE_SKIP failures in a row a ticker is skipped
+    for TICKER_BACKOFF_DAYS, doubling with every further failure up to
+    TICKER_MAX_BACKOFF_DAYS; once the backoff has passed it is tried again,
+    and a success clears its record. Callers should only report failures
+    that say something about the ticker (an empty answer from a source that
+    answered for others), not outages of the source itself.
+    """
+
+    def __init__(self, source, path=None):
+        self.source = source
+        self.path = path or os.path.join(TICKER_HEALTH_DIR, f"{source}.json")
+        self.records = self._load()
+        self.skipped = set()
+        self.failed = set()
+        self.recovered = set()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable ticker health registry {self.path}: {e}")
+            return {}
+
+    def _save(self, tickers):
+        # merged into the file, so processes sharing it (shards) keep each other's records
+        self.records = update_json(self.path, {ticker: self.records.get(ticker) for ticker in tickers})
+
+    def _backing_off(self, ticker, now):
+        record = self.records.get(ticker)
+        return record is not None and record.get("skip_until") is not None and now < record["skip_until"]
+
+    def filter(self, tickers):
+        """The ``tickers`` not backing off, in their order; the rest count as skipped this run."""
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            kept = []
+            for ticker in tickers:
+                if self._backing_off(ticker, now):
+                    self.skipped.add(ticker)
+                else:
+                    kept.append(ticker)
+            return kept
+
+    def update(self, ok=(), failed=(), error=None):
+        """Records successful and failed fetches."""
+        now = datetime.now()
+        with self._lock:
+            changed = []
+            for ticker in ok:
+                if self.records.pop(ticker, None) is not None:
+                    self.recovered.add(ticker)
+                    changed.append(ticker)
+            for ticker in failed:
+                record = self.records.setdefault(ticker, {"failures": 0})
+                record["failures"] += 1
+                record["last_failure"] = now.isoformat(timespec="seconds")
+                record["last_error"] = str(error) if error is not None else "no data"
+                extra = record["failures"] - TICKER_FAILURES_BEFORE_SKIP
+                if extra >= 0:
+                    days = min(TICKER_MAX_BACKOFF_DAYS, TICKER_BACKOFF_DAYS * 2 ** extra)
+                    record["skip_until"] = (now + timedelta(days=days)).isoformat(timespec="seconds")
+                self.failed.add(ticker)
+                changed.append(ticker)
+            if changed:
+                self._save(changed)
+
+    def report(self):
+        """Summary of this run: what was skipped, what failed, what came back."""
+        with self._lock:
+            skipped = ", ".join(f"{ticker} ({self.records[ticker]['failures']} failures, "
+                                f"until {self.records[ticker]['skip_until'][:10]})"
+                                if ticker in self.records else ticker
+                                for ticker in sorted(self.skipped))
+            return (f"{self.source}: {len(self.skipped)} tickers skipped in backoff"
+                    f"{': ' + skipped if skipped else ''}; {len(self.failed)} failed this run"
+                    f"{': ' + ', '.join(sorted(self.failed)) if self.failed else ''}; "
+                    f"{len(self.recovered)} recovered")
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_health(source):
+    """The process-wide TickerHealth of ``source``."""
+    with _registries_lock:
+        health = _registries.get(source)
+        if health is None:
+            health = _registries[source] = TickerHealth(source)
+        return health
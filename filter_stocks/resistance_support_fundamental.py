@@ -1,4 +1,4 @@
-from elasticsearch import Elasticsearch
+from common.es_client import get_es_client
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -12,7 +12,7 @@ FUND_INDEX = "nifty_fundamental"
 SCAN_DATE = "2026-02-09"
 OUTPUT_FILE = "support_resistance_scan.xlsx"
 
-es = Elasticsearch(ES_HOST)
+es = get_es_client(ES_HOST)
 
 # ==========================================================
 # UTILITY FUNCTIONS
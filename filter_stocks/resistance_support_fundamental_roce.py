@@ -1,4 +1,4 @@
-from elasticsearch import Elasticsearch
+from common.es_client import get_es_client
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -40,7 +40,7 @@ ES_HOST = "http://elasticsearch:9200"
 TECH_INDEX = "nifty_data_weekly"
 FUND_INDEX = "nifty_fundamental"
 
-es = Elasticsearch(ES_HOST)
+es = get_es_client(ES_HOST)
 
 # ==========================================================
 # UTILITY FUNCTIONS
@@ -1,3 +1,9 @@
+import argparse
+
+import requests
+
+from common.selection import add_selection_args, parse_selection
+from common.ticker_health import get_health
 from fundamental.client.screener_client import ScreenerClient
 from fundamental.parser.screener_parser import ScreenerParser
 from fundamental.service.fundamental_service import FundamentalService
@@ -9,20 +15,49 @@ from fundamental.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+def _screener_unavailable(e: Exception) -> bool:
+    """Errors that are about screener.in itself rather than about the ticker."""
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+    return status is not None and (status == 429 or status >= 500)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch the fundamentals of every ticker from screener.in")
+    # --since/--until only limit the quarterly results merged into a ticker's document
+    add_selection_args(parser)
+    args = parser.parse_args()
+    args.selection = parse_selection(parser, args)
+    return args
+
 def main():
+    selection = parse_args().selection
     http = HttpClient(timeout=REQUEST_TIMEOUT)
     client = ScreenerClient(http)
     parser = ScreenerParser()
     service = FundamentalService(client, parser)
     writer = ElasticWriter(index_name="nifty_fundamental")
 
-    for ticker in STOCK_SYMBOLS:
+    # Tickers screener keeps failing for back off instead of costing a request delay every run
+    health = get_health("screener")
+
+    for ticker in health.filter(selection.select(STOCK_SYMBOLS)):
         try:
             data = service.fetch_fundamentals(ticker)
-            writer.write(ticker, data)
+        except Exception as e:
+            logger.error(f"❌ Failed {ticker}: {e}")
+            if not _screener_unavailable(e):
+                health.update(failed=[ticker], error=e)
+            continue
+        health.update(ok=[ticker])
+
+        try:
+            writer.write(ticker, data, selection)
             logger.info(f"✅ Indexed {ticker}")
         except Exception as e:
             logger.error(f"❌ Failed {ticker}: {e}")
 
+    logger.info(f"Ticker health: {health.report()}")
+
 if __name__ == "__main__":
     main()
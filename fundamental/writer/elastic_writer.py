@@ -1,5 +1,5 @@
 import math
-from elasticsearch import Elasticsearch
+from common.es_client import get_es_client
 from fundamental.models.fundamental import FundamentalData
 from fundamental.utils.logger import get_logger
 import pandas as pd
@@ -13,11 +13,15 @@ class ElasticWriter:
 
     def __init__(self, index_name: str, host: str = "http://elasticsearch:9200"):
         self.index = index_name
-        self.es = Elasticsearch(host)
+        self.es = get_es_client(host)
 
-    def write(self, ticker: str, data: FundamentalData):
+    def write(self, ticker: str, data: FundamentalData, selection=None):
         existing = self._get_existing_doc(ticker)
         new_quarterly = self._quarterly_docs(data)
+        if selection is not None:
+            # a partial run only replaces the quarters ending in its date range
+            new_quarterly = [q for q in new_quarterly
+                             if selection.in_range(pd.Period(q["period_date"], "M").end_time)]
 
         if existing and "quarterly" in existing:
             quarterly = self._merge_quarterly(existing["quarterly"], new_quarterly)
@@ -13,17 +13,23 @@ done
 echo "Elasticsearch is ready!"
 
 
-echo "Deleting Elasticsearch index..."
-curl -XDELETE http://elasticsearch:9200/nifty_data_weekly || true
-
-echo "Running Technical Full Indexing..."
-python technical/technicalCharts/fullIndexing.py
+# INDEX_MODE=full (default) rebuilds nifty_data_daily/weekly/monthly into
+# new index versions and swaps the aliases once they are complete (readers
+# keep the old version meanwhile), INDEX_MODE=incremental only upserts the
+# new candles.
+INDEX_MODE="${INDEX_MODE:-full}"
+# RESUME=1 carries on with the full index and the enricher from their
+# checkpoints after an interrupted run instead of starting over.
+RESUME_FLAG="${RESUME:+--resume}"
+
+echo "Running Technical Indexing ($INDEX_MODE)..."
+python technical/technicalCharts/fullIndexing.py --mode "$INDEX_MODE" $RESUME_FLAG
 
 echo "creating the custom indices"
 python technical/IndexConstituents/indicesAndConstituents.py
 
 echo "Running Pattern Enricher..."
-python stock-pattern-enricher/main.py
+python stock-pattern-enricher/main.py $RESUME_FLAG
 
 echo "Running Fundamental Module..."
 python fundamental/main.py
@@ -3,7 +3,12 @@ port = "9200"
 index_name = "nifty_data_weekly"
 START_DATE = "2010-01-01"
 MAX_WORKERS = 10
-BATCH_SIZE = 1
+BATCH_SIZE = 20
+# Latest candles fetched per symbol (the helpers look back at most 50 + 10)
+# and the fields they read
+CANDLE_WINDOW = 100
+CANDLE_FIELDS = ["ticker", "date", "open", "high", "low", "close"]
+CHECKPOINT_DIR = "checkpoints"
 DUMPLING_TOP_CANDLE_COUNT = 10
 FRYPAN_BOTTOM_CANDLE_COUNT = 10
 DOUBLE_BOTTOM_CANDLE_COUNT = 20
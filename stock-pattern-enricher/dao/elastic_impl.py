@@ -1,5 +1,7 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from elasticsearch import helpers
+
+from common.adaptive_bulk import get_bulk
 from .elastic_interface import ElasticDAOInterface
 from .es_client import get_es_client
 from utils.logger import get_logger
@@ -7,6 +9,9 @@ import config.config as config
 
 logger = get_logger(__name__)
 
+# Most candles a search returns (the index's max_result_window)
+MAX_CANDLES = 10000
+
 class ElasticDAOImpl(ElasticDAOInterface):
     def __init__(self, es_host: str = "elasticsearch", es_port: int = 9200):
         self.es = get_es_client(es_host, es_port)
@@ -31,45 +36,48 @@ class ElasticDAOImpl(ElasticDAOInterface):
         logger.info(f"Fetched {len(results)} OHLCV records for {symbol}")
         return results
 
-    def fetch_batch_stock_ohlcv(self, symbols: List[str], start_date: str, end_date: str) -> Dict[str, List[Dict[str, Any]]]:
+    def fetch_batch_stock_ohlcv(self, symbols: List[str], start_date: str, end_date: str,
+                                candles: Optional[int] = config.CANDLE_WINDOW) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        The last ``candles`` candles (with None every candle, up to
+        MAX_CANDLES) of each symbol between the dates, in ascending date
+        order and with only config.CANDLE_FIELDS. One _msearch carries a
+        sub-query per symbol, so every symbol gets its whole window however
+        many share the batch.
+        """
         logger.debug(f"Batch fetching OHLCV for symbols: {symbols}")
+        if not symbols:
+            return {}
 
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"terms": {"ticker": symbols}},
-                        {
-                            "range": {
-                                "date": {
-                                    "gte": start_date,
-                                    "lte": end_date
-                                }
-                            }
-                        }
-                        # filter for multiple symbols
-                    ]
-                }
-            },
-            "sort": [{"date": {"order": "desc"}}],  # sort by latest date
-            "size": 1000  # limit to last 100 documents
-        }
+        searches = []
+        for symbol in symbols:
+            searches.append({"index": config.index_name})
+            searches.append({
+                "size": candles or MAX_CANDLES,
+                "_source": config.CANDLE_FIELDS,
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"term": {"ticker": symbol}},
+                            {"range": {"date": {"gte": start_date, "lte": end_date}}}
+                        ]
+                    }
+                },
+                "sort": [{"date": {"order": "desc"}}]  # latest candles first, reversed below
+            })
 
-        response = self.es.search(index=config.index_name, body=query)
-        hits = response.get("hits", {}).get("hits", [])
+        response = self.es.msearch(searches=searches)
 
         results = {}
-        for hit in hits:
-            source = hit["_source"]
-            sym = source.get("ticker")
-            if sym not in results:
-                results[sym] = []
-            results[sym].append(source)
-
-        for sym in symbols:
-            results.setdefault(sym, [])
+        for symbol, result in zip(symbols, response["responses"]):
+            if "error" in result:
+                # not "no data": the caller fails the batch so it is retried
+                raise RuntimeError(f"Fetching the candles of {symbol} failed: {result['error']}")
+            hits = result["hits"]["hits"]
+            results[symbol] = [hit["_source"] for hit in reversed(hits)]
 
-        logger.info(f"Batch fetched data for {len(symbols)} symbols, total records: {len(hits)}")
+        logger.info(f"Batch fetched data for {len(symbols)} symbols, "
+                    f"total records: {sum(len(records) for records in results.values())}")
         return results
 
     def index_stock_data(self, symbol: str, data: List[Dict[str, Any]]) -> None:
@@ -103,13 +111,16 @@ class ElasticDAOImpl(ElasticDAOInterface):
                 actions.append(action)
         if actions:
             try:
-                helpers.bulk(self.es, actions)
+                # shared by all enrichment threads, so it adapts to their combined load
+                get_bulk(self.es).submit(actions)
                 logger.info(f"Batch up-serted {len(actions)} records across {len(batch_data)} symbols")
             except helpers.BulkIndexError as e:
                 logger.error(f"Failed to upsert batch data: {len(e.errors)} document(s) failed to index.")
                 for error in e.errors[:5]:  # Log first 5 errors for debugging
                     logger.error(f"Index error: {error}")
+                raise  # the caller retries these symbols
             except Exception as e:
                 logger.error(f"Failed to upsert batch data: {e}", exc_info=True)
+                raise
         else:
             logger.info("No records to upsert in batch")
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+import config.config as config
 
 class ElasticDAOInterface(ABC):
 
@@ -8,7 +10,8 @@ class ElasticDAOInterface(ABC):
         pass
 
     @abstractmethod
-    def fetch_batch_stock_ohlcv(self, symbols: List[str], start_date: str, end_date: str) -> Dict[str, List[Dict[str, Any]]]:
+    def fetch_batch_stock_ohlcv(self, symbols: List[str], start_date: str, end_date: str,
+                                candles: Optional[int] = config.CANDLE_WINDOW) -> Dict[str, List[Dict[str, Any]]]:
         pass
 
     @abstractmethod
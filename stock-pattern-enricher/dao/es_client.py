@@ -1,9 +1,9 @@
 from elasticsearch import Elasticsearch
 
-_es_client = None
+from common.es_client import get_es_client as shared_client
+from config.config import MAX_WORKERS
+
 
 def get_es_client(host="elasticsearch", port=9200) -> Elasticsearch:
-    global _es_client
-    if _es_client is None:
-        _es_client = Elasticsearch([{"host": host, "port": int(port), "scheme": "http"}])
-    return _es_client
+    # one pooled connection per enrichment thread
+    return shared_client(f"http://{host}:{int(port)}", connections=MAX_WORKERS)
@@ -1,12 +1,35 @@
+import argparse
+import sys
+
+from common.selection import add_selection_args, parse_selection
+from common.sharding import Shard
 from services.thread_executor import ThreadExecutor
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Enrich the indexed candles with chart patterns")
+    parser.add_argument("--resume", action="store_true",
+                        help="carry on with an interrupted run from its checkpoint instead of starting over")
+    parser.add_argument("--shard", type=Shard.parse, default=None,
+                        help="enrich only shard i/N of the symbols")
+    parser.add_argument("--verify-shards", type=int, default=None, metavar="N",
+                        help="only check that all N shards completed, exiting non-zero otherwise")
+    add_selection_args(parser)
+    args = parser.parse_args()
+    args.selection = parse_selection(parser, args)
+    return args
+
 def main():
+    args = parse_args()
+    if args.verify_shards is not None:
+        if not ThreadExecutor.verify_shards(args.verify_shards):
+            sys.exit(1)
+        return
     logger.info("Starting stock data enrichment process")
     executor = ThreadExecutor()
-    executor.process_all_from_config()
+    executor.process_all_from_config(resume=args.resume, shard=args.shard, selection=args.selection)
     logger.info("Stock data enrichment process completed")
 
 if __name__ == "__main__":
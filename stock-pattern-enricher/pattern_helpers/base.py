@@ -3,6 +3,9 @@ from typing import List, Dict, Any
 
 
 class CandlePatternHelper(ABC):
+    # Fewest candles apply_pattern can enrich the last one of
+    min_candles = 2
+
     @abstractmethod
     def apply_pattern(self, candles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -1,8 +1,11 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Error of symbols the index has no candles for
+NO_DATA = "no data"
+
 class StockPatternPipeline:
     def __init__(self,
                  dao,
@@ -10,12 +13,24 @@ class StockPatternPipeline:
         self.dao = dao
         self.resistance_support_helpers = resistance_support_helpers
 
-    def process_batch(self, symbols: List[str], start_date: str, end_date: str) -> None:
-        # 1. Fetch batch data
-        raw_data = self.dao.fetch_batch_stock_ohlcv(symbols, start_date, end_date)
+    def process_batch(self, symbols: List[str], start_date: str, end_date: str,
+                      since: Optional[str] = None) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Enriches and indexes the latest record of every symbol, or with
+        ``since`` every record from that date on (each one against the
+        history up to it). Returns ({symbol: date of the last record
+        indexed}, {symbol: error}) so the caller can checkpoint the done
+        symbols and retry the failed ones.
+        """
+        # 1. Fetch batch data: the latest candles, or every one to enrich those since ``since``
+        if since is None:
+            raw_data = self.dao.fetch_batch_stock_ohlcv(symbols, start_date, end_date)
+        else:
+            raw_data = self.dao.fetch_batch_stock_ohlcv(symbols, start_date, end_date, candles=None)
 
         # 2. Enrich data
         enriched_data = {}
+        failed = {symbol: NO_DATA for symbol in symbols if not raw_data.get(symbol)}
 
         for symbol, records in raw_data.items():
             if not records:
@@ -24,16 +39,30 @@ class StockPatternPipeline:
             try:
                 # Ensure data is sorted by date ascending
                 records.sort(key=lambda r: r["date"])
-                for helper in self.resistance_support_helpers:
-                    helper.apply_pattern(records)
+                if since is None:
+                    for helper in self.resistance_support_helpers:
+                        helper.apply_pattern(records)
 
-                # Take only the latest day's enriched record
-                latest_record = records[-1]
-                enriched_data[symbol] = [latest_record]
+                    # Take only the latest day's enriched record
+                    latest_record = records[-1]
+                    enriched_data[symbol] = [latest_record]
+                else:
+                    # helpers enrich the last record of what they are given, which
+                    # needs at least min_candles records up to it
+                    first = max((helper.min_candles for helper in self.resistance_support_helpers), default=1) - 1
+                    selected = [i for i, record in enumerate(records) if i >= first and record["date"][:10] >= since]
+                    for i in selected:
+                        for helper in self.resistance_support_helpers:
+                            helper.apply_pattern(records[:i + 1])
+                    if selected:
+                        enriched_data[symbol] = [records[i] for i in selected]
+                    else:
+                        failed[symbol] = NO_DATA
 
             except Exception as e:
                 logger.error(f"Error processing symbol {symbol}: {e}", exc_info=True)
                 # Skip this symbol but continue processing others
+                failed[symbol] = str(e)
 
         # 3. Index the latest enriched record for each symbol
         if enriched_data:
@@ -41,3 +70,6 @@ class StockPatternPipeline:
         else:
             logger.info("No enriched data to index after processing batch.")
 
+        indexed = {symbol: records[-1]["date"] for symbol, records in enriched_data.items()}
+        return indexed, failed
+
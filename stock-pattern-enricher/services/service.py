@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from dao.elastic_impl import ElasticDAOImpl
 from services.pipeline import StockPatternPipeline
 from utils.logger import get_logger
@@ -20,10 +20,11 @@ class StockEnrichmentService:
             resistance_support_helpers=self.resistance_support_helpers
         )
 
-    def process_single_stock(self, symbol: str, start_date: str, end_date: str) -> None:
+    def process_single_stock(self, symbol: str, start_date: str, end_date: str) -> Tuple[Dict[str, str], Dict[str, str]]:
         logger.info(f"Processing single stock {symbol} from {start_date} to {end_date}")
-        self.pipeline.process_batch([symbol], start_date, end_date)
+        return self.pipeline.process_batch([symbol], start_date, end_date)
 
-    def process_multiple_stocks(self, symbols: List[str], start_date: str, end_date: str) -> None:
+    def process_multiple_stocks(self, symbols: List[str], start_date: str, end_date: str,
+                                since: Optional[str] = None) -> Tuple[Dict[str, str], Dict[str, str]]:
         logger.info(f"Processing multiple stocks: {symbols} from {start_date} to {end_date}")
-        self.pipeline.process_batch(symbols, start_date, end_date)
+        return self.pipeline.process_batch(symbols, start_date, end_date, since)
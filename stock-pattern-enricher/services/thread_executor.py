@@ -1,10 +1,16 @@
+import os
 import traceback
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date
-from typing import List
+from typing import List, Optional
+from common.checkpoint import Checkpoint
+from common.selection import Selection, partial_path
+from common.sharding import Shard, clear_shards, mark_shard_done, shard_path, shard_status
+from common.ticker_health import get_health
+from services.pipeline import NO_DATA
 from services.service import StockEnrichmentService
 from utils.logger import get_logger
-from config.config import STOCK_SYMBOLS, START_DATE, MAX_WORKERS, BATCH_SIZE
+from config.config import STOCK_SYMBOLS, START_DATE, MAX_WORKERS, BATCH_SIZE, CHECKPOINT_DIR
 
 logger = get_logger(__name__)
 
@@ -20,26 +26,81 @@ class ThreadExecutor:
         """Split symbol list into chunks of batch_size"""
         return [symbols[i:i + self.batch_size] for i in range(0, len(symbols), self.batch_size)]
 
-    def process_all_from_config(self) -> None:
-        symbols = STOCK_SYMBOLS
-        start_date = START_DATE
-        end_date = date.today().strftime("%Y-%m-%d")
-        logger.info(f"processing patterns from {start_date} to {end_date}")
+    def process_all_from_config(self, resume: bool = False, shard: Optional[Shard] = None,
+                                selection: Optional[Selection] = None) -> None:
+        """
+        Enriches every configured symbol, or only those of ``shard`` and
+        ``selection``. A selection's ``until`` ends the candles looked at,
+        and with its ``since`` every record from then on is enriched
+        instead of the latest one; a partial run has its own checkpoint.
+        Completed symbols are recorded in a checkpoint (one per shard) with
+        the date of the record indexed, so with ``resume`` an interrupted
+        run only processes what is left; symbols that failed end up in the
+        retry list next to the checkpoint. A shard that finishes is marked
+        done for ``verify_shards``.
+        """
+        selection = selection or Selection()
+        checkpoint = Checkpoint(partial_path(shard_path(os.path.join(CHECKPOINT_DIR, "enricher.json"), shard),
+                                             selection))
+        checkpoint.start(resume, start_date=START_DATE, end_date=selection.until or date.today().strftime("%Y-%m-%d"),
+                         since=selection.since)
+        start_date = checkpoint.params["start_date"]
+        end_date = checkpoint.params["end_date"]
+        since = checkpoint.params.get("since")
+        # symbols the index keeps having no candles for back off (see common/ticker_health.py)
+        health = get_health("enricher")
+        symbols = selection.select(STOCK_SYMBOLS if shard is None else shard.select(STOCK_SYMBOLS))
+        symbols = health.filter(checkpoint.remaining(symbols))
+        logger.info(f"processing patterns from {start_date} to {end_date}"
+                    f"{', enriching the records since ' + since if since else ''}")
 
         chunks = self._chunk_symbols(symbols)
-        logger.info(f"Processing {len(symbols)} symbols in {len(chunks)} batches using {self.max_workers} threads")
+        logger.info(f"Processing {len(symbols)} symbols in {len(chunks)} batches using {self.max_workers} threads "
+                    f"({len(checkpoint.completed)} already done)")
 
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             future_to_chunk = {
-                executor.submit(self.service.process_multiple_stocks, chunk, start_date, end_date): chunk
+                executor.submit(self.service.process_multiple_stocks, chunk, start_date, end_date, since): chunk
                 for chunk in chunks
             }
 
             for future in as_completed(future_to_chunk):
                 chunk = future_to_chunk[future]
                 try:
-                    future.result()
+                    indexed, failed = future.result()
+                    for symbol, latest in indexed.items():
+                        checkpoint.complete([symbol], latest)
+                    for symbol, error in failed.items():
+                        checkpoint.fail([symbol], error)
+                    health.update(ok=indexed, failed=[symbol for symbol, error in failed.items() if error == NO_DATA])
                     logger.info(f"Completed batch for symbols: {chunk}")
                 except Exception as e:
+                    checkpoint.fail(chunk, e)
                     logger.error(f"Batch processing failed for symbols {chunk} with error: {e}")
                     logger.error("Traceback:\n" + traceback.format_exc())
+
+        logger.info(f"Enrichment progress: {checkpoint.report()}")
+        logger.info(f"Ticker health: {health.report()}")
+        if shard is not None:
+            mark_shard_done(CHECKPOINT_DIR, "enricher", shard, run=end_date,
+                            completed=len(checkpoint.completed), failed=len(checkpoint.failed))
+        failed = checkpoint.finish()
+        if failed:
+            logger.warning(f"{len(failed)} symbols failed, retry list in {checkpoint.retry_path}")
+
+    @staticmethod
+    def verify_shards(count: int) -> bool:
+        """
+        True when all ``count`` shards finished enriching the same day's
+        candles; their completion markers are then cleared for the next run.
+        """
+        done, missing = shard_status(CHECKPOINT_DIR, "enricher", count)
+        runs = {marker["run"] for marker in done.values()}
+        if missing or len(runs) > 1:
+            logger.error(f"Enrichment shards incomplete: missing {missing}, runs {sorted(runs)}")
+            return False
+        logger.info(f"All {count} enrichment shards completed for {runs.pop()}: "
+                    f"{sum(marker['completed'] for marker in done.values())} symbols enriched, "
+                    f"{sum(marker['failed'] for marker in done.values())} failed")
+        clear_shards(CHECKPOINT_DIR, "enricher")
+        return True
@@ -1,7 +1,12 @@
-from elasticsearch import Elasticsearch, helpers
+import argparse
+
 import pandas as pd
 
-ES = Elasticsearch("http://elasticsearch:9200")
+from common.adaptive_bulk import get_bulk
+from common.es_client import get_es_client
+from common.selection import add_selection_args, parse_selection
+
+ES = get_es_client("http://elasticsearch:9200")
 SRC_INDEX = "nifty_data_weekly"
 META_INDEX = "indices"
 BASE_VALUE = 1000.0
@@ -18,15 +23,16 @@ def get_custom_indices():
     return [hit["_source"] for hit in res["hits"]["hits"]]
 
 
-def fetch_ohlcv_for_constituents(tickers):
+def fetch_ohlcv_for_constituents(tickers, until=None):
+    must = [{"terms": {"ticker": tickers}}]
+    if until is not None:
+        must.append({"range": {"date": {"lte": until}}})
     query = {
         "_source": ["ticker", "close", "open", "high", "low", "volume", "date"],
         "size": 10000,
         "query": {
             "bool": {
-                "must": [
-                    {"terms": {"ticker": tickers}}
-                ]
+                "must": must
             }
         },
         "sort": [{"date": {"order": "asc"}}]
@@ -114,13 +120,26 @@ def index_custom_index(data):
             "_source": d
         })
 
-    helpers.bulk(ES, actions)
+    get_bulk(ES).submit(actions)
     print(f"✔ Indexed {len(actions)} candles for {data[0]['ticker']}")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the equal weight custom indices from their constituents")
+    # a custom index is rebuilt when it is selected itself or holds a selected ticker;
+    # the whole series is recomputed (it chains from BASE_VALUE) but only --since/--until is written
+    add_selection_args(parser)
+    args = parser.parse_args()
+    args.selection = parse_selection(parser, args, ES)
+    return args
+
+
 def main():
-    custom_indices = get_custom_indices()
-    print(f"Found {len(custom_indices)} custom indices")
+    selection = parse_args().selection
+    custom_indices = [idx for idx in get_custom_indices()
+                      if selection.owns(idx["ticker"]) or idx["ticker"] in selection.indices
+                      or any(map(selection.owns, idx["constituents"]))]
+    print(f"Found {len(custom_indices)} custom indices for {selection}")
 
     for idx in custom_indices:
         ticker = idx["ticker"]
@@ -129,12 +148,15 @@ def main():
         print(f"\n📍 Building custom index: {ticker}")
         print(f"  → Constituents: {len(constituents)}")
 
-        df = fetch_ohlcv_for_constituents(constituents)
+        df = fetch_ohlcv_for_constituents(constituents, selection.until)
         if df.empty:
             print(f"❌ No OHLCV found for {ticker}")
             continue
 
-        result = calculate_equal_weight_index(df, ticker)
+        result = [candle for candle in calculate_equal_weight_index(df, ticker) if selection.in_range(candle["date"])]
+        if not result:
+            print(f"❌ No candles of {ticker} in {selection}")
+            continue
         index_custom_index(result)
 
     print("\n🎯 Completed custom index generation!")
@@ -1,8 +1,8 @@
-from elasticsearch import Elasticsearch
+from common.es_client import get_es_client
 
 ES_INDEX = "indices"
 
-es = Elasticsearch("http://elasticsearch:9200", verify_certs=False)
+es = get_es_client("http://elasticsearch:9200")
 
 def build_reverse_dict():
     reverse_dict = {}
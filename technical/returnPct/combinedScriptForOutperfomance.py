@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 import pandas as pd
-from elasticsearch import Elasticsearch
+from common.es_client import get_es_client
 
 # ---------------------------
 # CONFIG
@@ -81,7 +81,7 @@ def compute_returns(start_data, end_data):
 # ---------------------------
 
 def main():
-    es = Elasticsearch(ES_HOST)
+    es = get_es_client(ES_HOST)
 
     # ---------------------------
     # 1. GET RETURNS FOR ALL INDICES
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import json
 import pandas as pd
-from elasticsearch import Elasticsearch
+from common.es_client import get_es_client
 
 # ---------------------------
 # CONFIGURATION VARIABLES
@@ -121,7 +121,7 @@ def get_prices_and_sectors(es, query):
 # ---------------------------
 
 def main():
-    es = Elasticsearch(ES_HOST)
+    es = get_es_client(ES_HOST)
 
     print("Fetching start prices & sectors...")
     start_prices, start_sectors = get_prices_and_sectors(es, START_QUERY)
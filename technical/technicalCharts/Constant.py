@@ -2,10 +2,80 @@ host = "http://elasticsearch:9200"
 startDate = "2010-01-01"
 interval = "1d"
 index_name = "nifty_data_weekly"
+# Candle timeframes indexed from the same daily download, each into its
+# own index with the same mapping: "D" daily, "W" weekly, "M" monthly.
+timeframes = {"D": "nifty_data_daily", "W": index_name, "M": "nifty_data_monthly"}
 batch_size = 50
+# Peak RSS budget of full indexing in MiB (see memory_budget.py): download
+# batches are min_batch_size tickers until the first one has been measured,
+# then sized from the memory observed per ticker, up to max_batch_size.
+# None keeps batch_size fixed.
+memory_budget_mb = 2048
+min_batch_size = 5
+max_batch_size = 200
 rsi_window = 14
 atr_period = 14
 roc_period = 20
+# Indicators to compute and write, by registry name; None = all of them.
+# A subset is written as partial updates, e.g. ["vcp_trend_template"]
+# refreshes just what the filter_stocks scans read.
+indicators = None
+# Per-ticker running indicator state (see indicator_state.py), seeded by
+# full indexing so later candles can be appended in O(1).
+persist_state = True
+state_dir = "indicator_state"
+# Send only the documents whose content digest changed since the last run
+# (see doc_digest.py); the digests are kept per index under digest_dir.
+skip_unchanged = True
+digest_dir = "doc_digests"
+# Bulk-load mode for full indexing (see bulk_load.py): refresh and replicas
+# are off while loading, and the documents of many tickers share _bulk
+# requests. bulk_chunk_bytes is where the adaptive bulk controller starts
+# and bulk_threads the most requests it keeps in flight.
+bulk_load = True
+bulk_chunk_docs = 2000
+bulk_chunk_bytes = 10 * 1024 * 1024
+bulk_threads = 2
+# Merge every index down to one segment once the load is done
+force_merge = False
+# Full runs build each index into a new "<index>_v<timestamp>" version and
+# then move the index name (an alias) to it, so readers never see a partial
+# index; index_versions_kept versions are kept for rollback. When off, full
+# runs update the live indices in place, skipping unchanged documents.
+versioned_rebuilds = True
+index_versions_kept = 2
+# Progress of full runs (see common/checkpoint.py), resumed with --resume;
+# tickers that failed are listed in full_index.retry.json when it ends.
+checkpoint_dir = "checkpoints"
+# Send each ticker as one pre-encoded NDJSON _bulk body instead of
+# letting helpers.bulk serialize action dicts.
+bulk_ndjson = False
+# Keep price and indicator panels in float32 (the mapping stores them as
+# 32 bit floats anyway), with int8 trend codes and categorical metadata.
+compact_dtypes = True
+# Benchmarks loaded once per run (see benchmark_cache.py): roc_nifty and
+# rs_nifty use nifty_symbol, rs_nifty500 broad_benchmark (None skips it)
+# and rs_sector the first of sector_indices a stock belongs to.
+nifty_symbol = "^NSEI"
+broad_benchmark = "^CRSLDX"
+sector_indices = ['^CNXPSUBANK', '^NSEBANK', 'NIFTY_FIN_SERVICE.NS', '^CNXIT', '^CNXPHARMA', 'NIFTY_HEALTHCARE.NS',
+                  '^CNXAUTO', '^CNXFMCG', '^CNXMETAL', '^CNXREALTY', '^CNXMEDIA', 'NIFTY_CONSR_DURBL.NS',
+                  'NIFTY_OIL_AND_GAS.NS', '^CNXENERGY', '^CNXINFRA']
+# Rank every stock against the universe and within its indices after
+# indexing (see momentum_rank.py)
+momentum_ranks = True
+# Raw daily candles cached per ticker under price_cache_dir (see
+# price_cache.py): later runs only download the days after the cache.
+# price_cache_offline serves everything from disk without downloading.
+price_cache = True
+price_cache_dir = "price_cache"
+price_cache_offline = False
+# full_index runs fetch, compute and index in their own threads with at
+# most pipeline_depth items queued between two stages; 0 runs them serially.
+pipeline_depth = 2
+# Processes computing the indicators of a batch over a shared-memory
+# price panel (see parallel_compute.py); 1 computes in-process.
+compute_workers = 1
 nifty500 = [
     "360ONE.NS",
     "3MINDIA.NS",
@@ -0,0 +1,116 @@
+"""
+Docs/sec of the columnar serializer against the iterrows() generator
+the indexer used before. Runs on a synthetic indicator frame, no network:
+
+    python bench_serializer.py [candles] [tickers]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from doc_serializer import bulk_actions, ndjson_body, serialize
+from panel_indicators import TREND_LABELS, compute_panel, price_dtype, ticker_frame
+
+
+def synthetic_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, n)))
+    prices = {
+        "Open": close * (1 + rng.normal(0, 0.01, n)),
+        "High": close * 1.02,
+        "Low": close * 0.98,
+        "Close": close,
+        "Volume": rng.integers(1_000, 1_000_000, n).astype(float),
+    }
+    prices["Open"][:5] = np.nan
+
+    # the frame full_index hands the serializer: panel dtypes, trend as a categorical of its labels
+    dates = pd.Series(pd.date_range("2010-01-04", periods=n, freq="W-MON"))
+    panel = {k: pd.DataFrame({"T": v}).astype(price_dtype(k)) for k, v in prices.items()}
+    data = ticker_frame(dates, panel, compute_panel(panel), "T")
+    data["roc_nifty"] = rng.normal(0, 5, n)
+    data["type"] = "stock"
+    data["isCustom"] = False
+    data["indices"] = [["^NSEI", "^CNXIT"]] * n
+    return data
+
+
+def legacy_actions(index_name, data, ticker):
+    """The generator the indexer used before the columnar serializer."""
+    data = data.fillna({
+        "Open": 0.0, "Close": 0.0, "High": 0.0, "Low": 0.0, "Volume": 0,
+        "rsi": 0.0, "roc": 0.0, "roc_nifty": 0.0, "atr": 0.0,
+        "ma_10": 0.0, "ma_30": 0.0, "ma_40": 0.0,
+        "ma_10_above_30": False, "ma_30_above_40": False, "ma_10_above_40": False,
+        "trend": "sideways", "high_52w": 0.0, "low_52w": 0.0,
+        "dist_from_52w_high_pct": 0.0, "dist_from_52w_low_pct": 0.0,
+        "vcp_trend_template": False, "type": "stock", "isCustom": False
+    })
+    for _, r in data.iterrows():
+        if r["Open"] == 0:
+            continue
+        date = r["Date"].strftime("%Y-%m-%d")
+        yield {
+            "_op_type": "index",
+            "_index": index_name,
+            "_id": f"{ticker}_{date}",
+            "_source": {
+                "ticker": ticker, "date": date,
+                "open": float(r["Open"]), "close": float(r["Close"]),
+                "high": float(r["High"]), "low": float(r["Low"]),
+                "volume": int(r["Volume"]),
+                "rsi": float(r["rsi"]), "roc": float(r["roc"]),
+                "roc_nifty": float(r["roc_nifty"]), "atr": float(r["atr"]),
+                "ma_10": float(r["ma_10"]), "ma_30": float(r["ma_30"]), "ma_40": float(r["ma_40"]),
+                "ma_10_above_30": bool(r["ma_10_above_30"]),
+                "ma_30_above_40": bool(r["ma_30_above_40"]),
+                "ma_10_above_40": bool(r["ma_10_above_40"]),
+                "trend": r["trend"],
+                "high_52w": float(r["high_52w"]), "low_52w": float(r["low_52w"]),
+                "dist_from_52w_high_pct": float(r["dist_from_52w_high_pct"]),
+                "dist_from_52w_low_pct": float(r["dist_from_52w_low_pct"]),
+                "vcp_trend_template": bool(r["vcp_trend_template"]),
+                "indices": r["indices"], "type": r["type"], "isCustom": r["isCustom"]
+            }
+        }
+
+
+def encode(action):
+    meta = {"index": {"_index": action["_index"], "_id": action["_id"]}}
+    return json.dumps(meta, separators=(",", ":")) + "\n" + json.dumps(action["_source"], separators=(",", ":"))
+
+
+def timed(label, fn, frames, docs):
+    start = time.perf_counter()
+    for data in frames:
+        fn(data)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {docs / elapsed:>12,.0f} docs/sec  ({elapsed:.3f}s)")
+    return elapsed
+
+
+def main():
+    candles = int(sys.argv[1]) if len(sys.argv) > 1 else 850
+    tickers = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    frames = [synthetic_frame(candles, seed) for seed in range(tickers)]
+
+    legacy = [a["_source"] for a in legacy_actions("bench", frames[0], "T")]
+    assert legacy == serialize(frames[0], "T")[1], "columnar output differs from the legacy generator"
+    assert {doc["trend"] for doc in legacy} <= set(TREND_LABELS), "trend is not written as its labels"
+
+    docs = len(legacy) * tickers
+    print(f"{tickers} tickers x {candles} candles ({docs:,} docs)")
+    base = timed("iterrows generator", lambda d: list(legacy_actions("bench", d, "T")), frames, docs)
+    cols = timed("columnar actions", lambda d: bulk_actions("bench", *serialize(d, "T")), frames, docs)
+    # helpers.bulk JSON-encodes every action and source before sending
+    base_enc = timed("iterrows + encoding", lambda d: [encode(a) for a in legacy_actions("bench", d, "T")],
+                     frames, docs)
+    ndj = timed("columnar NDJSON", lambda d: ndjson_body("bench", *serialize(d, "T")), frames, docs)
+    print(f"speed-up: actions {base / cols:.1f}x, encoded body {base_enc / ndj:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
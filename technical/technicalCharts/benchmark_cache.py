@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+import Constant
+from Constant import roc_period
+from data_fetcher import fetch_data, to_timeframe
+from logging_config import get_logger
+from panel_indicators import float_dtype
+
+logger = get_logger(__name__)
+
+
+def sector_index(indices):
+    """The first of Constant.sector_indices among a stock's indices, or None."""
+    member = set(indices or [])
+    return next((symbol for symbol in Constant.sector_indices if symbol in member), None)
+
+
+def _close_column(data, symbol, single):
+    for col in (f"{symbol}/Close", f"Close/{symbol}"):
+        if col in data.columns:
+            return data[col]
+    if single and "Close" in data.columns:
+        return data["Close"]
+    return None
+
+
+class BenchmarkCache:
+    """
+    Closes and ROC of the benchmark indices for one candle timeframe,
+    downloaded once per run and kept as date-sorted NumPy arrays per symbol.
+
+    Values for any candle dates are looked up with ``searchsorted``, so each
+    ticker gets roc_nifty and its relative strength lines without re-sorting
+    the benchmark or merging frames. Dates the benchmark has no candle for
+    come back as NaN.
+    """
+
+    def __init__(self):
+        self._dates = {}
+        self._close = {}
+        self._roc = {}
+
+    @classmethod
+    def from_frame(cls, data, symbols):
+        """Caches the Close of every symbol in a fetch_data frame."""
+        cache = cls()
+        dates = pd.to_datetime(data["Date"]).to_numpy()
+        for symbol in symbols:
+            close = _close_column(data, symbol, len(symbols) == 1)
+            if close is None:
+                logger.warning(f"Benchmark {symbol} missing from the download")
+                continue
+            cache.add(symbol, dates, close.to_numpy(dtype=float))
+        return cache
+
+    @classmethod
+    def load(cls, symbols, start_date, end_date, timeframes=("W",)):
+        """
+        Downloads the daily candles of every symbol in one request and
+        returns {timeframe: BenchmarkCache} built from them.
+        """
+        symbols = list(dict.fromkeys(s for s in symbols if s))
+        data = fetch_data(symbols, start_date, end_date, to_weekly=False)
+        if data is None or data.empty:
+            logger.warning(f"No benchmark data for {symbols}")
+            return {timeframe: cls() for timeframe in timeframes}
+
+        caches = {timeframe: cls.from_frame(to_timeframe(data, timeframe), symbols) for timeframe in timeframes}
+        logger.info(f"Benchmarks cached for {list(timeframes)}: {sorted(next(iter(caches.values()))._dates)}")
+        return caches
+
+    def add(self, symbol, dates, close):
+        """Caches one benchmark; candles without a close are dropped first."""
+        close = np.asarray(close, dtype=float)
+        valid = ~np.isnan(close)
+        order = np.argsort(np.asarray(dates, dtype="datetime64[ns]")[valid], kind="stable")
+
+        self._dates[symbol] = np.asarray(dates, dtype="datetime64[ns]")[valid][order]
+        self._close[symbol] = close[valid][order]
+        self._roc[symbol] = (
+            pd.Series(self._close[symbol]).pct_change(periods=roc_period, fill_method=None) * 100
+        ).fillna(0.0).to_numpy()
+
+    def __contains__(self, symbol):
+        return symbol in self._dates
+
+    def _lookup(self, values, symbol, dates):
+        dates = np.asarray(dates, dtype="datetime64[ns]")
+        out = np.full(len(dates), np.nan)
+        known = self._dates.get(symbol)
+        if known is None or not len(known):
+            return out
+
+        pos = np.minimum(np.searchsorted(known, dates), len(known) - 1)
+        hit = known[pos] == dates
+        out[hit] = values[symbol][pos[hit]]
+        return out
+
+    def close(self, symbol, dates):
+        return self._lookup(self._close, symbol, dates)
+
+    def roc(self, symbol, dates):
+        return self._lookup(self._roc, symbol, dates)
+
+    def relative_strength(self, symbol, dates, close):
+        """Relative strength line: the ticker's close over the benchmark's."""
+        bench = self.close(symbol, dates)
+        return np.asarray(close, dtype=float) / np.where(bench != 0, bench, np.nan)
+
+    def add_columns(self, ticker_data, sector=None):
+        """
+        Adds roc_nifty and the rs_nifty / rs_nifty500 / rs_sector lines to
+        a ticker frame with Date and Close columns, in the panel float dtype.
+        Lines whose benchmark is not configured or not cached are left out
+        of the frame.
+        """
+        dates = ticker_data["Date"].to_numpy()
+        close = ticker_data["Close"].to_numpy(dtype=float)
+        dtype = float_dtype()
+
+        ticker_data["roc_nifty"] = self.roc(Constant.nifty_symbol, dates).astype(dtype)
+        for column, symbol in (("rs_nifty", Constant.nifty_symbol),
+                               ("rs_nifty500", Constant.broad_benchmark),
+                               ("rs_sector", sector)):
+            if symbol in self:
+                ticker_data[column] = self.relative_strength(symbol, dates, close).astype(dtype)
+        if sector in self:
+            ticker_data["sector_index"] = pd.Categorical.from_codes(np.zeros(len(ticker_data), np.int8), [sector])
+        return ticker_data
+
+
+def load_benchmarks(start_date, end_date, timeframes=("W",)):
+    """
+    {timeframe: BenchmarkCache} of nifty, the broad benchmark and every
+    sector index, all from one download.
+    """
+    symbols = [Constant.nifty_symbol, Constant.broad_benchmark] + list(Constant.sector_indices)
+    return BenchmarkCache.load(symbols, start_date, end_date, timeframes)
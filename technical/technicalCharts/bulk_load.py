@@ -0,0 +1,122 @@
+import time
+from contextlib import contextmanager
+
+import Constant
+from doc_serializer import bulk_actions
+from indexer import bulk_controller
+from logging_config import get_logger
+from mappings import index_mapping
+
+logger = get_logger(__name__)
+
+LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+# What the indices are served with afterwards: always the settings of the
+# mapping, never the ones found on entry, which a killed run may have left
+# in bulk-load mode
+SERVING_SETTINGS = {name: index_mapping["settings"][name] for name in LOAD_SETTINGS}
+
+
+def start_bulk_load(es, index_names):
+    """Turns refresh and replicas off for ``index_names`` (see bulk_load)."""
+    for name in index_names:
+        es.indices.put_settings(index=name, settings={"index": LOAD_SETTINGS})
+    logger.info(f"Bulk-load mode on for {list(index_names)}")
+
+
+def end_bulk_load(es, index_names, force_merge=None):
+    """
+    Puts SERVING_SETTINGS back on ``index_names``, refreshes them and, with
+    ``force_merge`` (default Constant.force_merge), merges them down to one
+    segment.
+    """
+    force_merge = Constant.force_merge if force_merge is None else force_merge
+    for name in index_names:
+        es.indices.put_settings(index=name, settings={"index": SERVING_SETTINGS})
+        es.indices.refresh(index=name)
+    logger.info(f"Bulk-load mode off for {list(index_names)}, settings {SERVING_SETTINGS}")
+
+    if force_merge:
+        for name in index_names:
+            start = time.perf_counter()
+            es.options(request_timeout=3600).indices.forcemerge(index=name, max_num_segments=1)
+            logger.info(f"Force-merged {name} in {time.perf_counter() - start:.1f}s")
+
+
+@contextmanager
+def bulk_load(es, index_names, force_merge=None):
+    """
+    Bulk-load mode for ``index_names`` while the block runs. A sharded
+    full index calls start_bulk_load / end_bulk_load once around all its
+    shards instead, so that no shard changes the settings under another.
+    """
+    start_bulk_load(es, index_names)
+    try:
+        yield
+    except BaseException:
+        end_bulk_load(es, index_names, force_merge=False)
+        raise
+    end_bulk_load(es, index_names, force_merge)
+
+
+class BulkWriter:
+    """
+    Collects the documents of many tickers and hands them to the adaptive
+    bulk controller (see common/adaptive_bulk.py), which sizes the
+    requests and how many are in flight from Elasticsearch's latency and
+    rejections, starting at Constant.bulk_chunk_bytes and going up to
+    Constant.bulk_threads concurrent requests.
+
+    Documents are buffered until Constant.bulk_chunk_docs per thread have
+    been added; call ``flush`` once at the end. With a DigestStore only
+    changed documents are buffered, and their digests are committed after
+    the flush that sent them; ``defer`` does the same for any callback.
+    """
+
+    def __init__(self, es, upsert=False, digests=None):
+        self.es = es
+        self.upsert = upsert
+        self.digests = digests
+        self.bulk = bulk_controller(es)
+        self.chunk_docs = Constant.bulk_chunk_docs
+        self.threads = Constant.bulk_threads
+        self._actions = []
+        self._pending = []
+        self._deferred = []
+        self.sent = 0
+        self.elapsed = 0.0
+
+    def add(self, index_name, ticker, ids, sources):
+        if self.digests is not None:
+            ids, sources, pending = self.digests.changed(index_name, ticker, ids, sources)
+            self._pending.append((index_name, ticker, pending))
+        self._actions.extend(bulk_actions(index_name, ids, sources, self.upsert))
+
+        if len(self._actions) >= self.chunk_docs * self.threads:
+            self.flush()
+
+    def flush(self):
+        actions, self._actions = self._actions, []
+        if actions:
+            start = time.perf_counter()
+            self.sent += self.bulk.submit(actions)
+            self.elapsed += time.perf_counter() - start
+
+        if self.digests is not None:
+            for index_name, ticker, pending in self._pending:
+                self.digests.commit(index_name, ticker, pending)
+        self._pending = []
+
+        deferred, self._deferred = self._deferred, []
+        for callback in deferred:
+            callback()
+
+    def defer(self, callback):
+        """Runs ``callback`` once everything added so far has been sent."""
+        self._deferred.append(callback)
+
+    def report(self, wall=None):
+        rate = self.sent / self.elapsed if self.elapsed else 0.0
+        report = f"{self.sent} documents, {self.elapsed:.1f}s sending ({rate:,.0f} docs/s)"
+        if wall:
+            report += f", {self.sent / wall:,.0f} docs/s end to end"
+        return f"{report}; bulk controller: {self.bulk.report()}"
@@ -1,7 +1,9 @@
+import numpy as np
 import yfinance as yf
 import pandas as pd
 from logging_config import get_logger
 import Constant
+from price_cache import get_price_cache, yfinance_health
 
 logger = get_logger(__name__)
 
@@ -11,7 +13,29 @@ def fetch_data(tickers, start_date, end_date, to_weekly=True):
     Fetch OHLCV data for one or more tickers.
     - Single ticker → flat DataFrame
     - Multiple tickers → flattened columns: "Open/TICKER", "Close/TICKER", ...
+
+    Daily candles go through the local price cache (Constant.price_cache),
+    which only downloads the days it does not have yet. Tickers yfinance
+    keeps returning nothing for are skipped while they back off (see
+    common/ticker_health.py).
     """
+    if Constant.price_cache and Constant.interval == "1d":
+        try:
+            data = get_price_cache().fetch(tickers, start_date, end_date)
+        except Exception as e:
+            logger.error(f"Error reading cached data for {tickers}: {e}")
+            return None
+        if data is None:
+            return None
+        return _convert_to_weekly(data) if to_weekly else data
+
+    # the column layout follows what was asked for, even when tickers are skipped
+    group_by = "ticker" if len(tickers) > 1 else "column"
+    health = yfinance_health()
+    tickers = health.filter(tickers)
+    if not tickers:
+        return None
+
     try:
         logger.info(f"Downloading the data for {tickers} from {start_date} to {end_date}")
         data = yf.download(
@@ -19,7 +43,7 @@ def fetch_data(tickers, start_date, end_date, to_weekly=True):
             start=start_date,
             end=end_date,
             interval=Constant.interval,
-            group_by="ticker" if len(tickers) > 1 else "column"
+            group_by=group_by
         )
 
         if data.empty:
@@ -33,6 +57,12 @@ def fetch_data(tickers, start_date, end_date, to_weekly=True):
         # Reset index → add "Date"
         data.reset_index(inplace=True)
 
+        # Nothing back for any ticker looks like an outage, not like dead tickers
+        answered = [t for t in tickers
+                    if any(col in data.columns and data[col].notna().any() for col in (f"{t}/Close", f"Close/{t}"))]
+        if answered:
+            health.update(ok=answered, failed=[t for t in tickers if t not in answered])
+
         # If weekly conversion is needed
         if to_weekly:
             return _convert_to_weekly(data)
@@ -44,22 +74,106 @@ def fetch_data(tickers, start_date, end_date, to_weekly=True):
         return None
 
 
+def _aggregation(col):
+    return ("first" if "Open" in col else
+            "max" if "High" in col else
+            "min" if "Low" in col else
+            "last" if "Close" in col else
+            "sum" if "Volume" in col else "last")
+
+
+def _period_starts(dates, freq):
+    """First day of each date's week (Monday, freq "W") or month ("M")."""
+    if freq == "W":
+        return dates - pd.to_timedelta(dates.dt.weekday, unit="d")
+    if freq == "M":
+        return dates.dt.to_period("M").dt.start_time
+    raise ValueError(f"Unsupported candle frequency: {freq}")
+
+
+def _first_last(block, bounds, ends, kind):
+    """First / last non-NaN row of every period, for a whole column block."""
+    n = len(block)
+    rows = np.arange(n)[:, None]
+    valid = pd.notna(block)
+    if kind == "first":
+        nxt = np.minimum.accumulate(np.where(valid, rows, n)[::-1], axis=0)[::-1]
+        pick = nxt[bounds]
+        found = pick < ends[:, None]
+    else:
+        prev = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+        pick = prev[ends - 1]
+        found = pick >= bounds[:, None]
+
+    values = np.take_along_axis(block, np.clip(pick, 0, n - 1), axis=0)
+    return values if found.all() else np.where(found, values, np.nan)
+
+
+def resample_candles(df: pd.DataFrame, freq="W"):
+    """
+    Convert daily candles to weekly (freq "W", Monday week start) or
+    monthly ("M") candles, dated with the first day of the period.
+
+    The period boundaries are found once on the sorted dates; each block of
+    columns sharing an aggregation (Open first, High max, Low min, Close
+    last, Volume sum) is then reduced in one go with ``np.*.reduceat`` or a
+    gather of the first/last non-NaN row, skipping NaN like groupby().agg().
+    """
+    columns = [col for col in df.columns if col != "Date"]
+    if df.empty:
+        return pd.DataFrame(columns=["Date"] + columns)
+    if not df["Date"].is_monotonic_increasing:
+        df = df.sort_values("Date", kind="stable")
+
+    starts = _period_starts(df["Date"], freq).to_numpy()
+    bounds = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    ends = np.r_[bounds[1:], len(starts)]
+
+    # Columns with the same aggregation and dtype form one 2-D block
+    blocks = {}
+    for col, dtype in df.dtypes.items():
+        if col != "Date":
+            blocks.setdefault((_aggregation(col), dtype), []).append(col)
+
+    frames = [pd.DataFrame({"Date": starts[bounds]})]
+    for (kind, _), cols in blocks.items():
+        block = df[cols].to_numpy()
+        if kind in ("max", "min", "sum") and block.dtype == object:
+            block = block.astype(float)
+
+        if kind == "max":
+            values = np.fmax.reduceat(block, bounds, axis=0)
+        elif kind == "min":
+            values = np.fmin.reduceat(block, bounds, axis=0)
+        elif kind == "sum":
+            if block.dtype.kind == "f":
+                block = np.where(np.isnan(block), 0.0, block)
+            values = np.add.reduceat(block, bounds, axis=0)
+        else:
+            values = _first_last(block, bounds, ends, kind)
+
+        frames.append(pd.DataFrame(values, columns=cols))
+
+    return pd.concat(frames, axis=1)[["Date"] + columns]
+
+
 def _convert_to_weekly(df: pd.DataFrame):
     """
     Convert daily data to weekly candles.
     Uses Monday as week start.
     """
-    df["WeekStart"] = df["Date"] - pd.to_timedelta(df["Date"].dt.weekday, unit="d")
-
-    agg_funcs = {
-        col: ("first" if "Open" in col else
-              "max" if "High" in col else
-              "min" if "Low" in col else
-              "last" if "Close" in col else
-              "sum" if "Volume" in col else "last")
-        for col in df.columns if col not in ["Date", "WeekStart"]
-    }
-
-    weekly = df.groupby("WeekStart").agg(agg_funcs).reset_index()
-    weekly.rename(columns={"WeekStart": "Date"}, inplace=True)
-    return weekly
+    return resample_candles(df, "W")
+
+
+def to_timeframe(daily: pd.DataFrame, timeframe):
+    """Daily candles (fetch_data with to_weekly=False) as "D", "W" or "M" candles."""
+    return daily if timeframe == "D" else resample_candles(daily, timeframe)
+
+
+def period_ends(starts, timeframe):
+    """Last calendar day of the "D", "W" or "M" candles dated ``starts``."""
+    if timeframe == "W":
+        return starts + pd.Timedelta(days=6)
+    if timeframe == "M":
+        return starts + pd.offsets.MonthEnd(0)
+    return starts
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+import Constant
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_UUID = "index_uuid"
+
+
+def digest(source):
+    """64-bit content digest of one document source."""
+    encoded = json.dumps(source, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "little")
+
+
+class DigestStore:
+    """
+    Digests of the documents last sent to each index, one
+    ``<index>/<ticker>.npz`` of (date, digest) arrays per ticker.
+
+    ``changed`` keeps only the documents whose digest differs from the one
+    stored for their date, so unchanged candles are not re-sent; ``commit``
+    records the sent digests once their bulk request has succeeded. The
+    digests of an index are tied to its UUID and dropped when the index
+    was deleted or recreated since they were written.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Constant.digest_dir
+        os.makedirs(self.path, exist_ok=True)
+        self.skipped = 0
+        self.sent = 0
+
+    def _dir(self, index_name):
+        return os.path.join(self.path, index_name)
+
+    def _file(self, index_name, ticker):
+        return os.path.join(self._dir(index_name), f"{ticker}.npz")
+
+    def bind(self, es, index_name):
+        """Drops the digests of ``index_name`` unless they belong to the live index."""
+        settings = es.indices.get_settings(index=index_name)
+        uuid = next(iter(settings.values()))["settings"]["index"]["uuid"]
+
+        marker = os.path.join(self._dir(index_name), INDEX_UUID)
+        try:
+            with open(marker, "r") as f:
+                known = f.read().strip()
+        except FileNotFoundError:
+            known = None
+
+        if known != uuid:
+            if known is not None:
+                logger.info(f"{index_name} was recreated, discarding its document digests")
+            shutil.rmtree(self._dir(index_name), ignore_errors=True)
+            os.makedirs(self._dir(index_name), exist_ok=True)
+            with open(marker, "w") as f:
+                f.write(uuid)
+        return self
+
+    def load(self, index_name, ticker):
+        """{date: digest} of the documents last sent for ``ticker``."""
+        try:
+            with np.load(self._file(index_name, ticker)) as npz:
+                return dict(zip(npz["dates"].astype(str).tolist(), npz["digests"].tolist()))
+        except FileNotFoundError:
+            return {}
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Discarding unreadable document digests of {ticker}: {e}")
+            return {}
+
+    def save(self, index_name, ticker, digests):
+        target = self._file(index_name, ticker)
+        tmp = target[:-len(".npz")] + ".tmp.npz"
+        np.savez(tmp,
+                 dates=np.array(list(digests), dtype="datetime64[D]"),
+                 digests=np.array(list(digests.values()), dtype=np.uint64))
+        os.replace(tmp, target)
+
+    def changed(self, index_name, ticker, ids, sources):
+        """
+        (ids, sources, pending) of the documents that differ from their
+        last sent version; ``pending`` is passed to ``commit`` after they
+        have been sent.
+        """
+        known = self.load(index_name, ticker)
+        kept_ids, kept_sources, pending = [], [], {}
+        for doc_id, source in zip(ids, sources):
+            value = digest(source)
+            if known.get(source["date"]) != value:
+                kept_ids.append(doc_id)
+                kept_sources.append(source)
+                pending[source["date"]] = value
+
+        self.skipped += len(ids) - len(kept_ids)
+        self.sent += len(kept_ids)
+        return kept_ids, kept_sources, (known, pending)
+
+    def commit(self, index_name, ticker, pending):
+        known, sent = pending
+        if sent:
+            known.update(sent)
+            self.save(index_name, ticker, known)
+
+    def report(self):
+        total = self.skipped + self.sent
+        return f"{self.sent} documents sent, {self.skipped} of {total} skipped as unchanged"
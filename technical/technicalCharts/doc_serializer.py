@@ -0,0 +1,110 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# (frame column, document field, kind, default for NaN) in document order
+DOC_FIELDS = [
+    ("Open", "open", "float", 0.0),
+    ("Close", "close", "float", 0.0),
+    ("High", "high", "float", 0.0),
+    ("Low", "low", "float", 0.0),
+    ("Volume", "volume", "int", 0),
+    ("rsi", "rsi", "float", 0.0),
+    ("roc", "roc", "float", 0.0),
+    ("roc_nifty", "roc_nifty", "float", 0.0),
+    ("atr", "atr", "float", 0.0),
+    ("rs_nifty", "rs_nifty", "float", 0.0),
+    ("rs_nifty500", "rs_nifty500", "float", 0.0),
+    ("rs_sector", "rs_sector", "float", 0.0),
+    ("sector_index", "sector_index", "raw", None),
+    ("ma_10", "ma_10", "float", 0.0),
+    ("ma_30", "ma_30", "float", 0.0),
+    ("ma_40", "ma_40", "float", 0.0),
+    ("ma_10_above_30", "ma_10_above_30", "bool", False),
+    ("ma_30_above_40", "ma_30_above_40", "bool", False),
+    ("ma_10_above_40", "ma_10_above_40", "bool", False),
+    ("trend", "trend", "raw", "sideways"),
+    ("high_52w", "high_52w", "float", 0.0),
+    ("low_52w", "low_52w", "float", 0.0),
+    ("dist_from_52w_high_pct", "dist_from_52w_high_pct", "float", 0.0),
+    ("dist_from_52w_low_pct", "dist_from_52w_low_pct", "float", 0.0),
+    ("vcp_trend_template", "vcp_trend_template", "bool", False),
+    ("indices", "indices", "raw", None),
+    ("type", "type", "raw", "stock"),
+    ("isCustom", "isCustom", "raw", False),
+]
+
+
+def _column_values(values, kind, default):
+    """One document field for every kept row, as plain Python values."""
+    if kind == "raw":
+        values = pd.Series(values, dtype=object)
+        if default is not None:
+            values = values.where(values.notna(), default)
+        return values.tolist()
+
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        values = np.where(np.isnan(values), default, values)
+    elif values.dtype == object:
+        values = pd.Series(values).fillna(default).to_numpy()
+
+    if kind == "float":
+        return values.astype(np.float64).tolist()
+    if kind == "int":
+        return values.astype(np.int64).tolist()
+    return values.astype(bool).tolist()
+
+
+def serialize(data, ticker):
+    """
+    Turns an indicator frame (or dict of column arrays) of one ticker into
+    (ids, sources) for every candle with a non-zero Open.
+
+    Works column by column: the Open mask is applied to whole arrays, NaN
+    defaults are filled per column, dates are formatted once, and each
+    column is converted to Python values with a single ``tolist``. Only
+    the DOC_FIELDS columns present in ``data`` go into the sources.
+    """
+    open_ = np.asarray(data["Open"], dtype=np.float64)
+    keep = ~(np.isnan(open_) | (open_ == 0))
+
+    dates = pd.DatetimeIndex(np.asarray(data["Date"])[keep]).strftime("%Y-%m-%d").tolist()
+    ids = [f"{ticker}_{date}" for date in dates]
+
+    names = ["ticker", "date"]
+    columns = [[ticker] * len(dates), dates]
+    for col, field, kind, default in DOC_FIELDS:
+        if col in data:
+            names.append(field)
+            columns.append(_column_values(np.asarray(data[col])[keep], kind, default))
+
+    sources = [dict(zip(names, row)) for row in zip(*columns)]
+    return ids, sources
+
+
+def bulk_actions(index_name, ids, sources, upsert=False):
+    """helpers.bulk actions for serialized documents."""
+    if upsert:
+        return [
+            {"_op_type": "update", "_index": index_name, "_id": doc_id, "doc": source, "doc_as_upsert": True}
+            for doc_id, source in zip(ids, sources)
+        ]
+    return [
+        {"_op_type": "index", "_index": index_name, "_id": doc_id, "_source": source}
+        for doc_id, source in zip(ids, sources)
+    ]
+
+
+def ndjson_body(index_name, ids, sources, upsert=False):
+    """The same documents pre-encoded as a _bulk NDJSON request body."""
+    lines = []
+    for doc_id, source in zip(ids, sources):
+        if upsert:
+            lines.append(json.dumps({"update": {"_index": index_name, "_id": doc_id}}, separators=(",", ":")))
+            lines.append(json.dumps({"doc": source, "doc_as_upsert": True}, separators=(",", ":")))
+        else:
+            lines.append(json.dumps({"index": {"_index": index_name, "_id": doc_id}}, separators=(",", ":")))
+            lines.append(json.dumps(source, separators=(",", ":")))
+    return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
@@ -1,7 +1,7 @@
-from elasticsearch import Elasticsearch
-
 import Constant
+from common.es_client import get_es_client as shared_client
 
 
 def get_es_client():
-    return Elasticsearch([Constant.host])
\ No newline at end of file
+    """The shared client for Constant.host, pooled for the bulk threads plus the pipeline's own requests."""
+    return shared_client(Constant.host, connections=Constant.bulk_threads + 2)
\ No newline at end of file
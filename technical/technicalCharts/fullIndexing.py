@@ -1,11 +1,148 @@
-from full_indexing import full_index
+import argparse
+import sys
+
+import Constant
+from common.checkpoint import Checkpoint
+from common.selection import add_selection_args, parse_selection
+from common.sharding import Shard, clear_shards, mark_shard_done, shard_status
+from bulk_load import end_bulk_load
+from elastic_client import get_es_client
+from full_indexing import full_index, full_index_checkpoint, plan_shards, shard_plan_checkpoint
+from incremental_indexing import incremental_index
+from index_versions import publish, rollback
 from logging_config import get_logger
+from momentum_rank import rank_momentum
+from price_cache import yfinance_health
 
 logger = get_logger(__name__)
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Technical indexing of daily, weekly and monthly candles")
+    parser.add_argument("--mode", choices=["full", "incremental", "rank", "rollback", "plan", "publish"],
+                        default="full",
+                        help="full: rebuild every ticker from Constant.startDate; "
+                             "incremental: upsert only the candles after the last indexed one; "
+                             "rank: only recompute the momentum ranks; "
+                             "rollback: point every index back at its previous version; "
+                             "plan: prepare the indices of a full index split into --shards shards; "
+                             "publish: once every shard is done, rank and publish what they built")
+    parser.add_argument("--resume", action="store_true",
+                        help="full and plan modes: carry on with an interrupted run from its checkpoint "
+                             "instead of starting over")
+    parser.add_argument("--shard", type=Shard.parse, default=None,
+                        help="full mode: index only shard i/N of the tickers, into the indices of the "
+                             "shard plan (see --mode plan)")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="plan mode: number of shards the full index is split into")
+    # full mode re-indexes the selected slice into the live indices;
+    # incremental mode takes tickers, rank mode --since (first date to re-rank)
+    add_selection_args(parser)
+    args = parser.parse_args()
+    if args.shard is not None and args.mode != "full":
+        parser.error("--shard only applies to --mode full")
+    if args.mode == "plan" and not (args.shards and args.shards > 0):
+        parser.error("--mode plan needs --shards N")
+    selects_tickers = args.tickers is not None or args.index is not None
+    selects_dates = args.since is not None or args.until is not None
+    if (selects_tickers or selects_dates) and (args.mode in ("rollback", "plan", "publish") or args.shard):
+        parser.error(f"selectors do not apply to {'--shard' if args.shard else '--mode ' + args.mode}")
+    if args.mode == "incremental" and selects_dates:
+        parser.error("--mode incremental picks its own dates, only --tickers/--index apply")
+    if args.mode == "rank" and (selects_tickers or args.until is not None):
+        parser.error("--mode rank ranks every ticker, only --since applies")
+    args.selection = parse_selection(parser, args)
+    return args
+
+
+def index_shard(shard, resume):
+    """Full-indexes one shard and marks it done for the publish step."""
+    logger.info(f"Starting the full Indexing of shard {shard}")
+    checkpoint = full_index_checkpoint(shard)
+    if full_index(checkpoint, resume, shard) is None:
+        return
+    mark_shard_done(Constant.checkpoint_dir, "full_index", shard, run=checkpoint.params["plan"],
+                    completed=len(checkpoint.completed), failed=len(checkpoint.failed))
+    failed = checkpoint.finish()
+    if failed:
+        print(f"{len(failed)} tickers of shard {shard} failed, listed in {checkpoint.retry_path}")
+    print(f"Ticker health: {yfinance_health().report()}")
+
+
+def shard_targets():
+    """The indices of the shard plan once every shard is done; exits otherwise."""
+    plan = Checkpoint.peek(shard_plan_checkpoint().path)
+    if plan is None or not plan.get("targets"):
+        sys.exit("No shard plan to publish, run --mode plan and the shards first")
+    done, missing = shard_status(Constant.checkpoint_dir, "full_index", plan["shards"], run=plan["id"])
+    if missing:
+        sys.exit(f"Shards {missing} of plan {plan['id']} have not completed, nothing published")
+    print(f"All {plan['shards']} shards of plan {plan['id']} completed: "
+          f"{sum(marker['completed'] for marker in done.values())} tickers indexed, "
+          f"{sum(marker['failed'] for marker in done.values())} failed")
+    return plan["targets"]
+
+
 def main():
-    logger.info("Starting the full Indexing")
-    full_index()
+    args = parse_args()
+    es = get_es_client()
+    targets = dict(Constant.timeframes)
+    since = {timeframe: args.since for timeframe in Constant.timeframes}
+    # only these dates need ranking again (all dates from since when absent)
+    rank_dates = {}
+    if args.mode == "rollback":
+        for alias in Constant.timeframes.values():
+            rollback(es, alias)
+        return
+    if args.mode == "plan":
+        plan_shards(args.shards, args.resume)
+        return
+    if args.mode == "full" and args.shard is not None:
+        index_shard(args.shard, args.resume)
+        return
+    if args.mode == "incremental":
+        logger.info("Starting the incremental Indexing")
+        rank_dates = {timeframe: incremental_index(timeframe, args.selection) for timeframe in Constant.timeframes}
+        since = {timeframe: min(dates) for timeframe, dates in rank_dates.items() if dates}
+    elif args.mode == "full":
+        logger.info(f"Starting the full Indexing of {args.selection}")
+        checkpoint = full_index_checkpoint(selection=args.selection)
+        targets = full_index(checkpoint, args.resume, selection=args.selection)
+        if targets is None:
+            return
+        for index_name in targets.values():
+            es.indices.refresh(index=index_name)
+    elif args.mode == "publish":
+        targets = shard_targets()
+        if Constant.bulk_load:
+            # the shard plan left the indices in bulk-load mode
+            end_bulk_load(es, list(targets.values()))
+        else:
+            for index_name in targets.values():
+                es.indices.refresh(index=index_name)
+
+    # A rebuilt version is ranked before it goes live
+    if Constant.momentum_ranks or args.mode == "rank":
+        for timeframe, first_date in since.items():
+            index_name = targets[timeframe]
+            dates = rank_dates.get(timeframe)
+            logger.info(f"Ranking momentum of {index_name} since {first_date or 'the first candle'}"
+                        + (f" on the {len(dates)} dates written" if dates else ""))
+            rank_momentum(es, index_name, first_date, dates)
+
+    # a partial run wrote into the live indices
+    if args.mode in ("full", "publish") and Constant.versioned_rebuilds and not args.selection.partial:
+        for timeframe, alias in Constant.timeframes.items():
+            publish(es, alias, targets[timeframe])
+    if args.mode == "full":
+        failed = checkpoint.finish()
+        if failed:
+            print(f"{len(failed)} tickers failed, listed in {checkpoint.retry_path}")
+    if args.mode == "publish":
+        shard_plan_checkpoint().finish()
+        clear_shards(Constant.checkpoint_dir, "full_index")
+    if args.mode in ("full", "incremental"):
+        print(f"Ticker health: {yfinance_health().report()}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,47 +1,44 @@
+import glob
+import os
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-import Constant
-from data_fetcher import fetch_data
-from indexer import index_data
+
+import numpy as np
 import pandas as pd
+
+import Constant
+from benchmark_cache import load_benchmarks, sector_index
+from bulk_load import BulkWriter, bulk_load, start_bulk_load
+from data_fetcher import fetch_data, period_ends, to_timeframe
+from elastic_client import get_es_client
+from doc_serializer import serialize
+from doc_digest import DigestStore
+from index_versions import create_version, discard, live_indices
+from indexer import ensure_index, send_changed
+from indicator_state import IndicatorStateStore, seed_states
+from logging_config import get_logger
+from memory_budget import MemoryBudget
+from panel_indicators import panel_nbytes, split_panel, ticker_frame
+from parallel_compute import compute, open_pool
+from pipeline import Pipeline
+from price_cache import yfinance_health
+from common.checkpoint import Checkpoint
+from common.selection import partial_path
+from common.sharding import clear_shards, shard_path
 from technical.fetchConstituents.fetchTickerToIndexMapping import build_reverse_dict, get_tickers_with_custom_flag
 
+logger = get_logger(__name__)
 
-def get_nifty_df():
-    """
-    Fetches and returns Nifty 50 data with columns [Date, Close].
-    """
-    nifty_symbol = "^NSEI"
-    end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-    nifty_data = fetch_data([nifty_symbol], Constant.startDate, end_date)
-    print(f"nifty data fetched from {Constant.startDate} to {end_date}")
+# Marks the end of a batch between the compute and index stages
+BATCH_DONE = object()
 
-    if nifty_data is None or nifty_data.empty:
-        print("Nifty data not fetched.")
-        return None
 
-    if isinstance(nifty_data.columns, pd.MultiIndex):
-        try:
-            nifty_df = nifty_data.xs(nifty_symbol, axis=1, level=1).copy()
-        except KeyError:
-            print("Nifty symbol not found in fetched data.")
-            return None
-    else:
-        nifty_cols = [col for col in nifty_data.columns if col.endswith(f"/{nifty_symbol}")]
-        if not nifty_cols:
-            print("Nifty columns not found.")
-            return None
-        nifty_df = nifty_data[nifty_cols].copy()
-        nifty_df.columns = [col.split("/")[0] for col in nifty_cols]
-
-    nifty_df = nifty_df.reset_index(drop=True)
-    nifty_df["Date"] = nifty_data["Date"].values
-    nifty_df["Date"] = pd.to_datetime(nifty_df["Date"])
-    nifty_df = nifty_df[["Date", "Close"]].copy()
-    return nifty_df
-
-
-def full_index():
-    batch_size = Constant.batch_size
+def build_universe():
+    """
+    Returns (tickers, tickerDictionary, indexDictionary): every constituent
+    and index known to the "indices" index, the ticker -> indices mapping
+    and the index -> isCustom flags.
+    """
     tickerDictionary = build_reverse_dict()
     indexDictionary = get_tickers_with_custom_flag()
 
@@ -49,61 +46,305 @@ def full_index():
         set(tickerDictionary.keys()) |
         {idx for indices in tickerDictionary.values() for idx in indices}
     )
+    return tickers, tickerDictionary, indexDictionary
 
-    nifty_df = get_nifty_df()
-    if nifty_df is None or nifty_df.empty:
-        print("Nifty data unavailable. Skipping indexing.")
+
+def add_metadata(ticker_data, ticker, tickerDictionary, indexDictionary):
+    indices = tickerDictionary.get(ticker, [])
+
+    type_ = "stock"
+    isCustom = False
+    if ticker in indexDictionary:
+        type_ = "index"
+        isCustom = indexDictionary[ticker]
+
+    rows = len(ticker_data)
+    ticker_data["type"] = pd.Categorical.from_codes(np.zeros(rows, np.int8), [type_])
+    ticker_data["isCustom"] = np.full(rows, bool(isCustom))
+    ticker_data["indices"] = [indices] * rows
+    return ticker_data
+
+
+def full_index_checkpoint(shard=None, selection=None):
+    path = shard_path(os.path.join(Constant.checkpoint_dir, "full_index.json"), shard)
+    return Checkpoint(partial_path(path, selection))
+
+
+def shard_plan_checkpoint():
+    return Checkpoint(os.path.join(Constant.checkpoint_dir, "full_index.plan.json"))
+
+
+def plan_shards(shards, resume=False):
+    """
+    Coordinator step before a sharded full index: creates the indices every
+    shard writes into (new versions with Constant.versioned_rebuilds) and
+    records them, with the run's end date, in the shard plan that
+    ``full_index(shard=...)`` reads. With ``resume`` the unfinished plan
+    on disk is kept; otherwise its versions and the shards' checkpoints are
+    discarded. With Constant.bulk_load the indices go into bulk-load mode
+    here, for all shards, until the publish step. Returns the plan's
+    parameters.
+    """
+    es = get_es_client()
+    plan = shard_plan_checkpoint()
+    end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    plan.start(resume, id=datetime.now().strftime("%Y%m%d%H%M%S"), end_date=end_date, shards=shards)
+    if _resume_targets(es, plan) is not None:
+        logger.info(f"Resuming shard plan {plan.params['id']}: {plan.params['targets']}")
+        return plan.params
+
+    _discard_unfinished(es, plan.previous)
+    clear_shards(Constant.checkpoint_dir, "full_index")
+    for stale in glob.glob(os.path.join(Constant.checkpoint_dir, "full_index.shard-*")):
+        os.remove(stale)
+    if Constant.versioned_rebuilds:
+        targets = {timeframe: create_version(es, alias) for timeframe, alias in Constant.timeframes.items()}
+    else:
+        targets = dict(Constant.timeframes)
+    plan.update(targets=targets)
+    if Constant.bulk_load:
+        # on for every shard at once; publish turns it off
+        start_bulk_load(es, list(targets.values()))
+    logger.info(f"Shard plan {plan.params['id']}: {shards} shards into {targets}")
+    return plan.params
+
+
+def _resume_targets(es, checkpoint):
+    """The indices of the resumed run, or None when there is none or they are gone."""
+    targets = checkpoint.params.get("targets")
+    if not targets or not all(es.indices.exists(index=name) for name in targets.values()):
+        return None
+    return targets
+
+
+def _discard_unfinished(es, previous):
+    """Deletes the versions an abandoned run was building (never a live one)."""
+    if not previous or not previous.get("targets") or not Constant.versioned_rebuilds:
         return
+    for timeframe, index_name in previous["targets"].items():
+        alias = Constant.timeframes.get(timeframe)
+        if index_name != alias and index_name not in live_indices(es, alias):
+            discard(es, index_name)
+
+
+def full_index(checkpoint=None, resume=False, shard=None, selection=None):
+    """
+    Rebuilds every timeframe index of Constant.timeframes from one daily
+    download per batch and returns {timeframe: index written}, or None
+    when nothing was indexed.
 
+    With Constant.versioned_rebuilds every timeframe is built into a new
+    versioned index that the caller makes live with ``publish`` (see
+    index_versions.py); readers keep the old version until then. Otherwise
+    the live indices are updated in place, skipping unchanged documents.
+
+    Progress is recorded in ``checkpoint`` (default full_index_checkpoint()):
+    tickers are marked done with their last candle date once all their
+    documents were sent, and tickers that could not be downloaded or
+    computed go to its retry list instead of stopping the run. With
+    ``resume`` an unfinished run carries on into the same indices with the
+    tickers not done yet; an unfinished version is kept for that when the
+    run fails, and discarded by the next run that does not resume. The
+    caller calls ``checkpoint.finish()`` once the indices are live.
+
+    With a ``shard`` (see common/sharding.py) only that shard's tickers
+    are indexed, into the indices and up to the end date of the shard plan
+    written by ``plan_shards``; the shard has its own checkpoint.
+
+    A partial ``selection`` (see common/selection.py) re-indexes only the
+    selected tickers, from their full history up to ``selection.until``,
+    and upserts only the candles from ``selection.since`` on and, when
+    ``selection.until`` falls inside a week or month, leaves out that
+    unfinished candle; it always writes into the live indices, never a new
+    version.
+    """
+    tickers, tickerDictionary, indexDictionary = build_universe()
+    timeframes = Constant.timeframes
+    partial = selection is not None and selection.partial
+    checkpoint = checkpoint or full_index_checkpoint(shard, selection)
+
+    es = get_es_client()
     end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    if partial:
+        tickers = selection.select(tickers)
+        if selection.until is not None:
+            end_date = (pd.Timestamp(selection.until) + timedelta(days=1)).strftime("%Y-%m-%d")
+        checkpoint.start(resume, end_date=end_date, targets=dict(timeframes))
+        targets = checkpoint.params["targets"]
+        logger.info(f"Partial full index of {selection}: {len(tickers)} tickers")
+    elif shard is not None:
+        plan = Checkpoint.peek(shard_plan_checkpoint().path)
+        if plan is None or not plan.get("targets"):
+            raise RuntimeError("No shard plan, run fullIndexing.py --mode plan first")
+        tickers = shard.select(tickers)
+        checkpoint.start(resume, end_date=plan["end_date"], targets=plan["targets"], plan=plan["id"])
+        if checkpoint.params.get("plan") != plan["id"]:
+            logger.warning(f"Checkpoint of shard {shard} belongs to another plan, starting the shard over")
+            checkpoint.start(False, end_date=plan["end_date"], targets=plan["targets"], plan=plan["id"])
+        targets = plan["targets"]
+        logger.info(f"Shard {shard} of plan {plan['id']}: {len(tickers)} tickers")
+    else:
+        checkpoint.start(resume, end_date=end_date)
+        targets = _resume_targets(es, checkpoint)
+        if resume and targets is None and checkpoint.completed:
+            logger.warning("Checkpointed indices are gone, starting the full index from the beginning")
+            checkpoint.start(False, end_date=end_date)
+    end_date = checkpoint.params["end_date"]
+
+    # Benchmark series once per run, looked up by date for every ticker
+    benchmarks = load_benchmarks(Constant.startDate, end_date, list(timeframes))
+    if any(Constant.nifty_symbol not in cache for cache in benchmarks.values()):
+        print("Nifty data unavailable. Skipping indexing.")
+        return
     print(f"data fetched from {Constant.startDate} to {end_date}")
 
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i + batch_size]
-        data_df = fetch_data(batch, Constant.startDate, end_date)
+    if targets is None:
+        _discard_unfinished(es, checkpoint.previous)
+        if Constant.versioned_rebuilds:
+            targets = {timeframe: create_version(es, alias) for timeframe, alias in timeframes.items()}
+        else:
+            targets = dict(timeframes)
+        checkpoint.update(targets=targets)
+    if Constant.versioned_rebuilds and not partial:
+        # every document of a new version is new, nothing to skip
+        digests = None
+    else:
+        digests = DigestStore() if Constant.skip_unchanged else None
+        for index_name in targets.values():
+            ensure_index(es, index_name)
+            if digests is not None:
+                digests.bind(es, index_name)
+    # The state is only seeded from a history reaching the current week
+    # (not one cut short by a selection's until), or it would go back in time
+    seeds_state = Constant.persist_state and "W" in timeframes and not (partial and selection.until is not None)
+    state_store = IndicatorStateStore() if seeds_state else None
 
-        if data_df is None or data_df.empty:
-            continue
+    upsert = Constant.indicators is not None
+    tickers = checkpoint.remaining(tickers)
+    logger.info(f"Full indexing {len(tickers)} tickers into {targets} "
+                f"({len(checkpoint.completed)} already done)")
 
-        if isinstance(data_df.columns, pd.MultiIndex):
-            try:
-                date_series = data_df[("Date", "")].copy()
-            except KeyError:
-                print("Date column not found in MultiIndex DataFrame")
+    health = yfinance_health()
+
+    # Download batches are sized to keep the batches in flight in the RSS budget
+    memory = MemoryBudget(in_flight=Constant.pipeline_depth + 2 if Constant.pipeline_depth > 0 else 1)
+
+    def fetch_batches():
+        i = 0
+        while i < len(tickers):
+            batch = tickers[i:i + memory.batch_size()]
+            i += len(batch)
+            daily = fetch_data(batch, Constant.startDate, end_date, to_weekly=False)
+
+            if daily is None or daily.empty:
+                checkpoint.fail(batch, "no data downloaded")
                 continue
-        else:
-            date_series = data_df["Date"].copy() if "Date" in data_df.columns else None
 
-        if date_series is None:
-            print("Date column is missing, skipping batch")
-            continue
+            if "Date" not in daily.columns:
+                print("Date column is missing, skipping batch")
+                checkpoint.fail(batch, "Date column missing from the download")
+                continue
+
+            yield batch, daily
+            # not kept alive while the next batch downloads
+            daily = None
+
+    def compute_batch(item):
+        batch, daily = item
+        del item  # the pipeline keeps no reference, so frames go as soon as they are done with
+        high_water = pd.to_datetime(daily["Date"]).max().date()
+        daily_bytes = int(daily.memory_usage(index=False).sum())
+        last_timeframe = list(targets)[-1]
+        panel_bytes = 0
+        present, failed = set(), {}
 
-        for ticker in batch:
-            if isinstance(data_df.columns, pd.MultiIndex):
+        for timeframe, index_name in targets.items():
+            dates, prices = split_panel(to_timeframe(daily, timeframe), batch)
+            if timeframe == last_timeframe:
+                daily = None
+            indicators = compute(prices, Constant.indicators, pool, timeframe)
+            panel_bytes = max(panel_bytes, panel_nbytes(prices) + panel_nbytes(indicators))
+            logger.info(f"{index_name} panels of {len(batch)} tickers: "
+                        f"prices {panel_nbytes(prices) / 2**20:.1f} MiB, "
+                        f"indicators {panel_nbytes(indicators) / 2**20:.1f} MiB")
+
+            # The running indicator state follows weekly candles
+            if state_store is not None and timeframe == "W":
+                seed_states(state_store, dates, prices, prices["Close"].columns)
+
+            present.update(prices["Close"].columns)
+            for ticker in prices["Close"].columns:
                 try:
-                    ticker_data = data_df.xs(ticker, axis=1, level=1).copy()
-                except KeyError:
-                    continue
-            else:
-                ticker_cols = [col for col in data_df.columns if col.startswith(ticker)]
-                if not ticker_cols:
+                    ticker_data = ticker_frame(dates, prices, indicators, ticker)
+                    if partial:
+                        ticker_data = selection.clip(ticker_data)
+                        if selection.until is not None:
+                            # a candle cut short by until would replace the finished one in the index
+                            complete = period_ends(ticker_data["Date"], timeframe) <= pd.Timestamp(selection.until)
+                            ticker_data = ticker_data[complete].reset_index(drop=True)
+                    benchmarks[timeframe].add_columns(ticker_data, sector_index(tickerDictionary.get(ticker)))
+                    add_metadata(ticker_data, ticker, tickerDictionary, indexDictionary)
+                    ids, sources = serialize(ticker_data, ticker)
+                    del ticker_data
+                except Exception as e:
+                    logger.error(f"Failed to build the {index_name} documents of {ticker}: {e}", exc_info=True)
+                    failed[ticker] = e
                     continue
-                ticker_data = data_df[ticker_cols].copy()
-                ticker_data.columns = [col.split("/")[1] for col in ticker_cols]
+                yield index_name, ticker, (ids, sources)
+            del dates, prices, indicators
 
-            ticker_data = ticker_data.reset_index(drop=True)
-            ticker_data["Date"] = date_series.values
-            ticker_data["Ticker"] = ticker
-            indices = tickerDictionary.get(ticker, [])
+        memory.observe(len(batch), daily_bytes + panel_bytes)
+        # tickers skipped while backing off are in the ticker health summary instead
+        missing = [ticker for ticker in batch if ticker not in present and ticker not in health.skipped]
+        checkpoint.fail(missing, "missing from the download")
+        for ticker, error in failed.items():
+            checkpoint.fail([ticker], error)
+        done = [ticker for ticker in batch if ticker in present and ticker not in failed]
+        yield BATCH_DONE, done, high_water
 
-            type_ = "stock"
-            isCustom = False
-            if ticker in indexDictionary:
-                type_ = "index"
-                isCustom = indexDictionary[ticker]
+    # Bulk-load mode batches documents across tickers into large requests
+    writer = BulkWriter(es, upsert, digests) if Constant.bulk_load else None
 
-            ticker_data["type"] = [type_] * len(ticker_data)
-            ticker_data["isCustom"] = [isCustom] * len(ticker_data)
-            ticker_data["indices"] = [indices] * len(ticker_data)
+    def index(item):
+        if item[0] is BATCH_DONE:
+            _, done, high_water = item
+            complete = lambda: checkpoint.complete(done, high_water)
+            if writer is not None:
+                writer.defer(complete)
+            else:
+                complete()
+            return
+
+        index_name, ticker, (ids, sources) = item
+        logger.info(f"Indexing stock = {ticker} into {index_name}")
+        if writer is not None:
+            writer.add(index_name, ticker, ids, sources)
+        else:
+            send_changed(es, index_name, ticker, ids, sources, upsert, digests)
 
-            index_data(Constant.index_name, ticker_data, ticker, nifty_df)
+    # Downloads, indicator computation and bulk requests overlap; the
+    # bounded queues between them keep at most pipeline_depth items waiting
+    pipeline = Pipeline("fetch", fetch_batches(), [("compute", compute_batch), ("index", index)],
+                        depth=Constant.pipeline_depth)
+    pool = open_pool()
+    try:
+        # the index settings of a shard are the plan's business (see plan_shards)
+        with bulk_load(es, list(targets.values())) if writer is not None and shard is None else nullcontext():
+            pipeline.run()
+            if writer is not None:
+                writer.flush()
+    except Exception:
+        logger.error(f"Full indexing failed, {checkpoint.report()}; "
+                     f"run again with --resume to carry on into {list(targets.values())}")
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+    print(f"Full indexing finished in {pipeline.wall:.1f}s, bottleneck: {pipeline.bottleneck()}")
+    print(f"Full indexing progress: {checkpoint.report()}")
+    print(f"Full indexing memory: {memory.report()}")
+    if writer is not None:
+        print(f"Full indexing ingest: {writer.report(pipeline.wall)}")
+    if digests is not None:
+        print(f"Full indexing: {digests.report()}")
+    return targets
@@ -1,8 +1,8 @@
-# from incremental_indexing import incremental_index
-#
-#
-# def main():
-#     incremental_index()
-#
-# if __name__ == "__main__":
-#     main()
\ No newline at end of file
+from incremental_indexing import incremental_index
+
+
+def main():
+    incremental_index()
+
+if __name__ == "__main__":
+    main()
@@ -1,113 +1,263 @@
-# from datetime import datetime, timedelta
-# import pandas as pd
-# import Constant
-# from Constant import roc_period
-# from data_fetcher import fetch_data
-# from indexer import index_data
-# from logging_config import get_logger
-#
-# logger = get_logger(__name__)
-#
-#
-# # ✅ Added this function (same as in full_indexing) to fetch Nifty data
-# def get_nifty_df():
-#     """
-#     Fetches and returns Nifty 50 data with columns [Date, Close].
-#     """
-#     nifty_symbol = "^NSEI"  # Adjust if your data source uses a different symbol
-#
-#     nifty_data = fetch_data([nifty_symbol], Constant.startDate, datetime.now().strftime("%Y-%m-%d"))
-#     if nifty_data is None or nifty_data.empty:
-#         logger.error("Nifty data not fetched.")
-#         return None
-#
-#     if isinstance(nifty_data.columns, pd.MultiIndex):
-#         try:
-#             nifty_df = nifty_data.xs(nifty_symbol, axis=1, level=1).copy()
-#         except KeyError:
-#             logger.error("Nifty symbol not found in fetched data.")
-#             return None
-#     else:
-#         nifty_cols = [col for col in nifty_data.columns if col.endswith(f"/{nifty_symbol}")]
-#         if not nifty_cols:
-#             logger.error("Nifty columns not found.")
-#             return None
-#         nifty_df = nifty_data[nifty_cols].copy()
-#         nifty_df.columns = [col.split("/")[0] for col in nifty_cols]
-#
-#     nifty_df = nifty_df.reset_index(drop=True)
-#     if isinstance(nifty_data.columns, pd.MultiIndex):
-#         nifty_df["Date"] = nifty_data[("Date", "")].values
-#     else:
-#         nifty_df["Date"] = nifty_data["Date"].values
-#
-#     nifty_df["Date"] = pd.to_datetime(nifty_df["Date"])
-#     nifty_df = nifty_df[["Date", "Close"]].copy()
-#     return nifty_df
-#
-#
-# def incremental_index(batch_size=50):
-#     today = datetime.now()
-#     date_from_index = (today - timedelta(days=(2*roc_period+3))).strftime("%Y-%m-%d")
-#     date_to_index = (today + timedelta(days=1)).strftime("%Y-%m-%d")
-#
-#     logger.info(f"Starting incremental indexing from {date_from_index} to {date_to_index}")
-#
-#     nifty_df = get_nifty_df()  # ✅ Added: Fetch Nifty data once
-#
-#     if nifty_df is None or nifty_df.empty:
-#         logger.warning("Nifty data unavailable. Skipping indexing.")
-#         return
-#
-#     nifty500 = Constant.nifty500 + Constant.indices
-#     for i in range(0, len(nifty500), batch_size):
-#         batch = nifty500[i:i + batch_size]
-#         logger.info(f"Processing batch {i // batch_size + 1} with {len(batch)} tickers")
-#
-#         data_df = fetch_data(batch, date_from_index, date_to_index)
-#
-#         if data_df is None or data_df.empty:
-#             logger.warning("No data returned for batch, skipping...")
-#             continue
-#
-#         # Extract Date column from MultiIndex or flat structure
-#         if isinstance(data_df.columns, pd.MultiIndex):
-#             try:
-#                 date_series = data_df[("Date", "")].copy()
-#             except KeyError:
-#                 logger.error("Date column missing in MultiIndex DataFrame, skipping batch")
-#                 continue
-#         else:
-#             date_series = data_df["Date"].copy() if "Date" in data_df.columns else None
-#
-#         if date_series is None:
-#             logger.error("Date column missing, skipping batch")
-#             continue
-#
-#         for ticker in batch:
-#             logger.info(f"Indexing data for {ticker}")
-#
-#             # Extract ticker-specific data
-#             if isinstance(data_df.columns, pd.MultiIndex):
-#                 try:
-#                     ticker_data = data_df.xs(ticker, axis=1, level=1).copy()
-#                 except KeyError:
-#                     logger.warning(f"No data found for {ticker}, skipping...")
-#                     continue
-#             else:
-#                 ticker_cols = [col for col in data_df.columns if col.endswith(f"/{ticker}")]
-#                 if not ticker_cols:
-#                     logger.warning(f"No relevant columns found for {ticker}, skipping...")
-#                     continue
-#                 ticker_data = data_df[ticker_cols].copy()
-#                 ticker_data.columns = [col.split("/")[0] for col in ticker_cols]
-#
-#             # Add Date & Ticker columns
-#             ticker_data = ticker_data.reset_index(drop=True)
-#             ticker_data["Date"] = date_series.values
-#             ticker_data["Ticker"] = ticker
-#
-#             # ✅ Updated: Pass nifty_df so index_data can calculate and merge Nifty ROC
-#             index_data_incremental("nifty_data_weekly", ticker_data, ticker, nifty_df)
-#
-#     logger.info("Incremental indexing completed successfully.")
+import math
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import Constant
+from Constant import roc_period
+from benchmark_cache import load_benchmarks, sector_index
+from data_fetcher import fetch_data, to_timeframe
+from doc_digest import DigestStore
+from elastic_client import get_es_client
+from full_indexing import add_metadata, build_universe
+from indexer import bulk_index_frame, ensure_index
+from indicator_registry import max_lookback
+from indicator_state import IndicatorStateStore, current_week_start, seed_states
+from logging_config import get_logger
+from panel_indicators import TREND_LABELS, float_dtype, split_panel, ticker_frame, timeframe_params
+from parallel_compute import compute, open_pool
+
+logger = get_logger(__name__)
+
+# How a ticker is brought up to date
+STATE = "state"  # append new candles to its persisted indicator state
+TAIL = "tail"    # recompute the last candles over a warm-up window
+FULL = "full"    # never indexed: full history
+
+
+def last_indexed_dates(es, index_name, tickers):
+    """
+    Last indexed candle date per ticker, and the (date, close) of the
+    candle before it (the latest one certainly closed), from a single terms
+    aggregation. Tickers with no documents are absent from both results,
+    tickers with a single one from the second.
+    """
+    body = {
+        "size": 0,
+        "query": {"terms": {"ticker": tickers}},
+        "aggs": {
+            "tickers": {
+                "terms": {"field": "ticker", "size": len(tickers)},
+                "aggs": {
+                    "last_date": {"max": {"field": "date", "format": "yyyy-MM-dd"}},
+                    "last_candles": {"top_hits": {"size": 2, "sort": [{"date": "desc"}],
+                                                  "_source": ["date", "close"]}}
+                }
+            }
+        }
+    }
+    res = es.search(index=index_name, body=body)
+    last_dates, closed = {}, {}
+    for bucket in res["aggregations"]["tickers"]["buckets"]:
+        last_dates[bucket["key"]] = pd.Timestamp(bucket["last_date"]["value_as_string"])
+        hits = bucket["last_candles"]["hits"]["hits"]
+        if len(hits) == 2:
+            closed[bucket["key"]] = (pd.Timestamp(hits[1]["_source"]["date"]), hits[1]["_source"].get("close"))
+    return last_dates, closed
+
+
+def candles_before(date, candles, timeframe="W"):
+    """A date at least ``candles`` candles of ``timeframe`` before ``date``."""
+    if timeframe == "D":
+        # ~5 trading days a week; the slack covers exchange holidays
+        return date - timedelta(days=candles * 7 // 5 + 30)
+    if timeframe == "M":
+        return date - pd.DateOffset(months=candles)
+    return date - timedelta(weeks=candles)
+
+
+def plan_tickers(tickers, last_dates, states, warmup_candles, timeframe="W"):
+    """
+    Returns {ticker: (mode, fetch_start)}.
+
+    Tickers whose state is not ahead of the index only need the candles
+    from the state's last one on; the others already in the index are
+    recomputed from a warm-up window before their last indexed candle, and
+    new tickers get their full history.
+    """
+    plan = {}
+    for ticker in tickers:
+        state = states.get(ticker)
+        last = last_dates.get(ticker)
+
+        if last is None:
+            plan[ticker] = (FULL, pd.Timestamp(Constant.startDate))
+        elif state is not None and pd.Timestamp(state.last_date) <= last:
+            # from the state's own last candle, to check it was not re-adjusted since
+            plan[ticker] = (STATE, pd.Timestamp(state.last_date))
+        else:
+            plan[ticker] = (TAIL, candles_before(last, warmup_candles, timeframe))
+    return plan
+
+
+def _state_is_current(state, dates, prices, ticker):
+    """Whether the downloaded candle at ``state.last_date`` still has the state's close."""
+    row = (dates == pd.Timestamp(state.last_date)).to_numpy().nonzero()[0]
+    return len(row) > 0 and state.agrees_with(prices["Close"][ticker].iat[row[0]])
+
+
+def _index_is_current(candle, dates, prices, ticker):
+    """
+    Whether the downloaded close at an indexed (date, close) candle is still
+    its indexed close; a moved one means the history was re-adjusted (split
+    or dividend) since it was indexed. Nothing to check against is current.
+    """
+    if candle is None:
+        return True
+    date, indexed = candle
+    row = (dates == date).to_numpy().nonzero()[0]
+    if not len(row):
+        return False
+    close = prices["Close"][ticker].iat[row[0]]
+    if indexed is None or pd.isna(close):
+        return indexed is None and pd.isna(close)
+    return math.isclose(float(close), indexed, rel_tol=1e-6)
+
+
+def _state_frame(state, dates, prices, ticker, until):
+    """
+    Feeds the candles after ``state.last_date`` into the state: closed
+    weeks are committed, the week in progress is only peeked at.
+    """
+    after = (dates > pd.Timestamp(state.last_date)).to_numpy()
+    rows = []
+    for i in after.nonzero()[0]:
+        candle = {
+            "Date": dates[i].strftime("%Y-%m-%d"),
+            "High": prices["High"][ticker].iat[i],
+            "Low": prices["Low"][ticker].iat[i],
+            "Close": prices["Close"][ticker].iat[i],
+        }
+        rows.append(state.update(candle) if dates[i] < until else state.peek(candle))
+
+    frame = pd.DataFrame(rows)
+    # the panel dtypes, as a recompute would give
+    for column in frame.columns[frame.dtypes == "float64"]:
+        frame[column] = frame[column].astype(float_dtype())
+    if "trend" in frame:
+        frame["trend"] = pd.Categorical(frame["trend"], categories=TREND_LABELS)
+    frame.insert(0, "Date", dates[after].to_numpy())
+    for field, panel in prices.items():
+        frame[field] = panel[ticker].to_numpy()[after]
+    return frame
+
+
+def incremental_index(timeframe="W", selection=None):
+    """
+    Brings every ticker of the ``timeframe`` index (or the tickers of
+    ``selection``) up to date (see plan_tickers) and returns the set of
+    dates ("YYYY-MM-DD") of the candles sent, empty when nothing changed.
+    Only weekly candles have a persisted indicator state; the other
+    timeframes are always recomputed over their warm-up window. A ticker
+    whose close at its state's last candle, or at its last closed indexed
+    candle, moved (history re-adjusted for a split or dividend) loses its
+    state and is re-indexed in full.
+    """
+    batch_size = Constant.batch_size
+    index_name = Constant.timeframes[timeframe]
+    tickers, tickerDictionary, indexDictionary = build_universe()
+    if selection is not None:
+        tickers = selection.select(tickers)
+        if not tickers:
+            logger.warning(f"No tickers of {index_name} selected, nothing to index")
+            return set()
+
+    es = get_es_client()
+    ensure_index(es, index_name)
+    digests = DigestStore().bind(es, index_name) if Constant.skip_unchanged else None
+    store = IndicatorStateStore()
+
+    last_dates, closed = last_indexed_dates(es, index_name, tickers)
+    states = {t: s for t in tickers if (s := store.load(t)) is not None} if timeframe == "W" else {}
+    warmup = max_lookback(Constant.indicators, timeframe_params(timeframe))
+    plan = plan_tickers(tickers, last_dates, states, warmup, timeframe)
+
+    counts = pd.Series([mode for mode, _ in plan.values()]).value_counts().to_dict()
+    logger.info(f"Incremental plan for {len(tickers)} tickers of {index_name}: {counts}, "
+                f"warm-up {warmup} candles")
+
+    until = current_week_start()
+    end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    # Tickers with the same fetch start share a download; tickers whose
+    # history was re-adjusted since their state or their last indexed
+    # candles go round again in full
+    pending = sorted(tickers, key=lambda t: plan[t][1])
+    indexed = 0
+    written = set()
+    pool = open_pool()
+    try:
+        while pending:
+            earliest = min(plan[t][1] for t in pending)
+            benchmarks = load_benchmarks(candles_before(earliest, roc_period + 1, timeframe).strftime("%Y-%m-%d"),
+                                         end_date, [timeframe])[timeframe]
+            if Constant.nifty_symbol not in benchmarks:
+                logger.warning("Nifty data unavailable. Skipping indexing.")
+                return written
+
+            readjusted = []
+            for i in range(0, len(pending), batch_size):
+                batch = pending[i:i + batch_size]
+                start = min(plan[t][1] for t in batch).strftime("%Y-%m-%d")
+                daily = fetch_data(batch, start, end_date, to_weekly=False)
+                data_df = to_timeframe(daily, timeframe) if daily is not None else None
+
+                if data_df is None or data_df.empty or "Date" not in data_df.columns:
+                    logger.warning(f"No data returned for batch starting {batch[0]}, skipping...")
+                    continue
+
+                dates, prices = split_panel(data_df, batch)
+                present = list(prices["Close"].columns)
+
+                for ticker in present:
+                    if plan[ticker][0] == TAIL and not _index_is_current(closed.get(ticker), dates, prices, ticker):
+                        logger.info(f"History of {ticker} re-adjusted since it was indexed, re-indexing it in full")
+                        plan[ticker] = (FULL, pd.Timestamp(Constant.startDate))
+                        readjusted.append(ticker)
+                present = [t for t in present if t not in readjusted]
+
+                recompute = [t for t in present if plan[t][0] != STATE]
+                indicators = compute({f: p[recompute] for f, p in prices.items()}, Constant.indicators, pool,
+                                     timeframe) \
+                    if recompute else {}
+
+                for ticker in present:
+                    mode = plan[ticker][0]
+
+                    if mode == STATE:
+                        state = states[ticker]
+                        if not _state_is_current(state, dates, prices, ticker):
+                            logger.info(f"History of {ticker} re-adjusted since its indicator state, "
+                                        f"re-indexing it in full")
+                            store.drop(ticker)
+                            plan[ticker] = (FULL, pd.Timestamp(Constant.startDate))
+                            readjusted.append(ticker)
+                            continue
+                        ticker_data = _state_frame(state, dates, prices, ticker, until)
+                        store.save(state)
+                    else:
+                        ticker_data = ticker_frame(dates, prices, indicators, ticker)
+                        if mode == TAIL:
+                            ticker_data = ticker_data[ticker_data["Date"] >= last_dates[ticker]] \
+                                .reset_index(drop=True)
+                        elif Constant.persist_state and timeframe == "W":
+                            seed_states(store, dates, prices, [ticker], until)
+
+                    if ticker_data.empty:
+                        continue
+
+                    logger.info(f"Upserting {len(ticker_data)} candles for {ticker} ({mode})")
+                    benchmarks.add_columns(ticker_data, sector_index(tickerDictionary.get(ticker)))
+                    add_metadata(ticker_data, ticker, tickerDictionary, indexDictionary)
+                    sent = bulk_index_frame(es, index_name, ticker_data, ticker, upsert=True, digests=digests)
+                    indexed += len(ticker_data)
+                    written.update(sent)
+            pending = readjusted
+    finally:
+        if pool is not None:
+            pool.close()
+
+    logger.info(f"Incremental indexing completed: {indexed} candles upserted")
+    if digests is not None:
+        logger.info(f"Incremental indexing of {index_name}: {digests.report()}")
+    return written
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import Constant
+from indexer import ensure_index
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def version_name(alias, now=None):
+    """A new versioned index name for ``alias``; versions sort by build time."""
+    return f"{alias}_v{(now or datetime.now()):%Y%m%d%H%M%S}"
+
+
+def versions(es, alias):
+    """Every versioned index of ``alias``, oldest first."""
+    return sorted(es.indices.get_alias(index=f"{alias}_v*"))
+
+
+def live_indices(es, alias):
+    """The indices ``alias`` points to (none when it is not an alias)."""
+    if not es.indices.exists_alias(name=alias):
+        return []
+    return sorted(es.indices.get_alias(name=alias))
+
+
+def create_version(es, alias):
+    """Creates an empty versioned index for a rebuild of ``alias``."""
+    name = version_name(alias)
+    ensure_index(es, name)
+    logger.info(f"Rebuilding {alias} into {name}")
+    return name
+
+
+def point_alias(es, alias, index):
+    """
+    Moves ``alias`` to ``index`` in one atomic update_aliases call. A
+    concrete index still named like the alias (from before versioned
+    rebuilds) is deleted in the same call.
+    """
+    live = live_indices(es, alias)
+    actions = [{"remove": {"index": name, "alias": alias}} for name in live if name != index]
+    actions.append({"add": {"index": index, "alias": alias}})
+    if not live and es.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+    es.indices.update_aliases(actions=actions)
+    logger.info(f"{alias} -> {index} (was {live or 'a concrete index or nothing'})")
+
+
+def prune_versions(es, alias, keep=None):
+    """
+    Deletes all but the ``keep`` newest versions (Constant.index_versions_kept),
+    never one the alias points to. The versions kept besides the live one
+    are what ``rollback`` can return to.
+    """
+    keep = Constant.index_versions_kept if keep is None else keep
+    live = set(live_indices(es, alias))
+    for name in versions(es, alias)[:-keep or None]:
+        if name not in live:
+            es.indices.delete(index=name)
+            logger.info(f"Pruned {name}")
+
+
+def publish(es, alias, index):
+    """Makes a finished rebuild live and prunes the old versions."""
+    es.indices.refresh(index=index)
+    point_alias(es, alias, index)
+    prune_versions(es, alias)
+
+
+def discard(es, index):
+    """Deletes a rebuild that did not finish; the alias never pointed to it."""
+    es.indices.delete(index=index, ignore_unavailable=True)
+    logger.info(f"Discarded unfinished rebuild {index}")
+
+
+def rollback(es, alias):
+    """Points ``alias`` back at the version built before the live one."""
+    live = live_indices(es, alias)
+    older = [name for name in versions(es, alias) if live and name < min(live)]
+    if not older:
+        logger.warning(f"No earlier version of {alias} to roll back to")
+        print(f"No earlier version of {alias} to roll back to")
+        return None
+    point_alias(es, alias, older[-1])
+    return older[-1]
@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+@dataclass(frozen=True)
+class Indicator:
+    """
+    One registered indicator.
+
+    - inputs: price fields or other indicator names, passed to ``func``
+      positionally as dates x tickers frames
+    - lookback: candles of history a value depends on (used to size
+      warm-up windows), or the name of the parameter holding it
+    - dtype: dtype the output is stored in; "float" is the panel float
+      dtype evaluate is given (float32 or float64)
+    - scratch: intermediate only, never written to a document
+    - params: evaluation parameters passed to ``func`` as keywords
+      (e.g. windows that depend on the candle timeframe)
+    - categories: labels of an int8 coded output; ``func`` returns the
+      codes (positions in ``categories``)
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    func: Callable
+    lookback: Union[int, str] = 0
+    dtype: str = "float"
+    scratch: bool = False
+    params: Tuple[str, ...] = ()
+    categories: Tuple[str, ...] = ()
+
+
+REGISTRY: Dict[str, Indicator] = {}
+
+
+def register(name, inputs, lookback=0, dtype="float", scratch=False, params=(), categories=()):
+    """Decorator registering an indicator kernel under ``name``."""
+    def decorator(func):
+        if name in REGISTRY:
+            raise ValueError(f"Indicator {name} is already registered")
+        REGISTRY[name] = Indicator(name, tuple(inputs), func, lookback, dtype, scratch, tuple(params),
+                                   tuple(categories))
+        return func
+    return decorator
+
+
+def output_names():
+    """Every registered indicator that ends up in a document."""
+    return [name for name, ind in REGISTRY.items() if not ind.scratch]
+
+
+def plan(names: Optional[List[str]] = None) -> List[str]:
+    """
+    Minimal evaluation order for ``names`` (all document outputs when
+    None): the requested indicators plus everything they depend on,
+    dependencies first.
+    """
+    wanted = output_names() if names is None else list(names)
+
+    order, state = [], {}
+
+    def visit(name, path):
+        if name in PRICE_FIELDS:
+            return
+        if name not in REGISTRY:
+            raise KeyError(f"Unknown indicator {name}")
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Indicator dependency cycle: {' -> '.join(path + [name])}")
+
+        state[name] = "visiting"
+        for dep in REGISTRY[name].inputs:
+            visit(dep, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in wanted:
+        visit(name, [])
+    return order
+
+
+def price_inputs(names: Optional[List[str]] = None) -> List[str]:
+    """The price fields evaluating ``names`` reads, plus Close (the frame shape reference)."""
+    used = {dep for name in plan(names) for dep in REGISTRY[name].inputs} | {"Close"}
+    return [field for field in PRICE_FIELDS if field in used]
+
+
+def max_lookback(names: Optional[List[str]] = None, params: Optional[dict] = None) -> int:
+    """Longest chain of lookbacks behind ``names``, in candles."""
+    params = params or {}
+    depth = {}
+    for name in plan(names):
+        ind = REGISTRY[name]
+        lookback = params[ind.lookback] if isinstance(ind.lookback, str) else ind.lookback
+        upstream = [depth[dep] for dep in ind.inputs if dep in depth]
+        depth[name] = lookback + (max(upstream) if upstream else 0)
+    return max(depth.values(), default=0)
+
+
+def evaluate(prices, names: Optional[List[str]] = None, params: Optional[dict] = None,
+             float_dtype="float64"):
+    """
+    Evaluates ``names`` (all document outputs when None) on a panel of
+    dates x tickers price frames, with ``params`` for the kernels that
+    declare any. Outputs declared as "float" are stored as ``float_dtype``.
+
+    Each result is cast to its declared dtype once, and scratch results
+    are released as soon as their last consumer has run, so only the
+    requested outputs are returned.
+    """
+    order = plan(names)
+    wanted = set(output_names() if names is None else names)
+    params = params or {}
+
+    remaining_uses = {}
+    for name in order:
+        for dep in REGISTRY[name].inputs:
+            remaining_uses[dep] = remaining_uses.get(dep, 0) + 1
+
+    values = dict(prices)
+    out = {}
+    for name in order:
+        ind = REGISTRY[name]
+        result = ind.func(*(values[dep] for dep in ind.inputs), **{p: params[p] for p in ind.params})
+        if not isinstance(result, pd.DataFrame):
+            ref = prices["Close"]
+            result = pd.DataFrame(result, index=ref.index, columns=ref.columns)
+        values[name] = result.astype(float_dtype if ind.dtype == "float" else ind.dtype, copy=False)
+
+        for dep in ind.inputs:
+            remaining_uses[dep] -= 1
+            if remaining_uses[dep] == 0 and dep not in wanted and dep not in prices:
+                del values[dep]
+
+        if name in wanted:
+            out[name] = values[name]
+
+    return out
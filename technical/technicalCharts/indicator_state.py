@@ -0,0 +1,343 @@
+import copy
+import json
+import math
+import os
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+import Constant
+from Constant import rsi_window, roc_period, atr_period
+from logging_config import get_logger
+from panel_indicators import MA_PERIODS, HIGH_LOW_WINDOW, HIGH_LOW_WINDOWS
+
+logger = get_logger(__name__)
+
+NAN = float("nan")
+
+
+def _is_nan(x):
+    return x is None or x != x
+
+
+def _div(a, b):
+    """a / b with NumPy's float semantics (inf/nan instead of raising)."""
+    if b == 0:
+        if a == 0 or _is_nan(a):
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+def _fmax(*values):
+    """Largest non-NaN value, NaN only when all are NaN (np.fmax)."""
+    present = [v for v in values if not _is_nan(v)]
+    return max(present) if present else NAN
+
+
+def _fill(x, default=0.0):
+    return default if _is_nan(x) else x
+
+
+def _window_mean(window):
+    """Mean summed oldest value first, as panel_indicators.window_mean does."""
+    total = window[0]
+    for value in window[1:]:
+        total += value
+    return total / len(window)
+
+
+class TickerIndicatorState:
+    """
+    Running indicator state of one ticker, updated one candle at a time.
+
+    Holds exactly what the next value of each registered indicator depends
+    on: the Wilder averages (or the seed sums while fewer than rsi_window
+    changes have been seen), ring buffers of the last true ranges and
+    closes for ATR, ROC and the MAs, and monotonic deques of the highs and
+    lows of the last ``high_low_window`` candles (the timeframe's entry of
+    HIGH_LOW_WINDOWS, 52 for weekly candles). ``update`` is O(1) per candle
+    (amortised for the deques) and returns the same values a full panel
+    recompute gives for that candle, NaN rows included.
+    """
+
+    def __init__(self, ticker, high_low_window=HIGH_LOW_WINDOW):
+        self.ticker = ticker
+        self.high_low_window = high_low_window
+        self.last_date = None
+        self.rows = 0
+
+        # RSI
+        self.valid_closes = 0
+        self.prev_valid_close = NAN
+        self.seed_gains = []
+        self.seed_losses = []
+        self.avg_gain = NAN
+        self.avg_loss = NAN
+
+        # ATR / ROC / MA
+        self.prev_close = NAN
+        self.tr_buffer = deque(maxlen=atr_period)
+        self.close_buffer = deque(maxlen=max(MA_PERIODS + [roc_period + 1]))
+
+        # high / low of the last high_low_window candles: (row, value) pairs, values monotonic
+        self.high_deque = deque()
+        self.low_deque = deque()
+
+    # ---------------- updates ---------------- #
+
+    def update(self, candle):
+        """
+        Appends one candle ({"Date", "Open", "High", "Low", "Close", ...})
+        and returns its indicator values keyed by registry name.
+        """
+        date = candle["Date"]
+        high, low, close = candle["High"], candle["Low"], candle["Close"]
+        high = NAN if _is_nan(high) else float(high)
+        low = NAN if _is_nan(low) else float(low)
+        close = NAN if _is_nan(close) else float(close)
+
+        out = {}
+        out["rsi"] = self._update_rsi(close)
+        out["atr"] = self._update_atr(high, low, close)
+
+        self.close_buffer.append(close)
+        out["roc"] = self._roc(close)
+        for p in MA_PERIODS:
+            out[f"ma_{p}"] = self._ma(p)
+
+        out["ma_10_above_30"] = out["ma_10"] > out["ma_30"]
+        out["ma_30_above_40"] = out["ma_30"] > out["ma_40"]
+        out["ma_10_above_40"] = out["ma_10"] > out["ma_40"]
+        if out["ma_10_above_30"] and out["ma_30_above_40"]:
+            out["trend"] = "bullish"
+        elif not out["ma_10_above_30"] and not out["ma_30_above_40"]:
+            out["trend"] = "bearish"
+        else:
+            out["trend"] = "sideways"
+
+        high_52w = self._push_extreme(self.high_deque, high, lambda old, new: old <= new)
+        low_52w = self._push_extreme(self.low_deque, low, lambda old, new: old >= new)
+        out["high_52w"] = _fill(high_52w)
+        out["low_52w"] = _fill(low_52w)
+        out["dist_from_52w_high_pct"] = self._dist(close, high_52w)
+        out["dist_from_52w_low_pct"] = self._dist(close, low_52w)
+
+        out["vcp_trend_template"] = (
+            out["dist_from_52w_low_pct"] >= 30 and
+            out["dist_from_52w_high_pct"] >= -25 and
+            out["trend"] == "bullish" and
+            close > out["ma_30"] and
+            close > out["ma_40"]
+        )
+
+        self.rows += 1
+        self.last_date = date
+        return out
+
+    def peek(self, candle):
+        """Indicator values for ``candle`` without committing it."""
+        return copy.deepcopy(self).update(candle)
+
+    def agrees_with(self, close):
+        """
+        Whether ``close``, the candle at ``last_date`` as downloaded now, is
+        the close the state last took. A moved close means the history was
+        re-adjusted (split/dividend) since, so the state no longer matches it.
+        """
+        close = NAN if _is_nan(close) else float(close)
+        if _is_nan(close) or _is_nan(self.prev_close):
+            return _is_nan(close) and _is_nan(self.prev_close)
+        return math.isclose(close, self.prev_close, rel_tol=1e-6)
+
+    def _update_rsi(self, close):
+        if _is_nan(close):
+            return NAN
+
+        self.valid_closes += 1
+        if self.valid_closes == 1:
+            self.prev_valid_close = close
+            return NAN
+
+        change = close - self.prev_valid_close
+        self.prev_valid_close = close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+
+        if self.valid_closes <= rsi_window + 1:
+            self.seed_gains.append(gain)
+            self.seed_losses.append(loss)
+            if self.valid_closes < rsi_window + 1:
+                return NAN
+            self.avg_gain = math.fsum(self.seed_gains) / rsi_window
+            self.avg_loss = math.fsum(self.seed_losses) / rsi_window
+            self.seed_gains, self.seed_losses = [], []
+        else:
+            self.avg_gain = self._wilder(self.avg_gain, gain)
+            self.avg_loss = self._wilder(self.avg_loss, loss)
+
+        rs = _div(self.avg_gain, self.avg_loss)
+        return 100 - _div(100, 1 + rs)
+
+    @staticmethod
+    def _wilder(avg, value):
+        # Same operation order as pandas' ewm(adjust=False) kernel
+        alpha = 1 / rsi_window
+        old_wt, new_wt = 1.0 - alpha, alpha
+        if avg != value:
+            avg = (old_wt * avg + new_wt * value) / (old_wt + new_wt)
+        return avg
+
+    def _update_atr(self, high, low, close):
+        prev_close = self.prev_close
+        tr = _fmax(high - low, abs(high - prev_close), abs(low - prev_close))
+        self.tr_buffer.append(tr)
+        self.prev_close = close
+
+        if len(self.tr_buffer) < atr_period or any(_is_nan(v) for v in self.tr_buffer):
+            return 0.0
+        return _window_mean(list(self.tr_buffer))
+
+    def _roc(self, close):
+        if len(self.close_buffer) < roc_period + 1:
+            return 0.0
+        prev = self.close_buffer[-(roc_period + 1)]
+        return _fill((_div(close, prev) - 1) * 100)
+
+    def _ma(self, period):
+        if len(self.close_buffer) < period:
+            return 0.0
+        window = list(self.close_buffer)[-period:]
+        if any(_is_nan(v) for v in window):
+            return 0.0
+        return _window_mean(window)
+
+    def _push_extreme(self, window, value, dominated):
+        row = self.rows
+        while window and window[0][0] <= row - self.high_low_window:
+            window.popleft()
+        if not _is_nan(value):
+            while window and dominated(window[-1][1], value):
+                window.pop()
+            window.append((row, value))
+        return window[0][1] if window else NAN
+
+    @staticmethod
+    def _dist(close, extreme):
+        if _is_nan(extreme) or extreme == 0:
+            return 0.0
+        return _fill((close - extreme) / extreme * 100)
+
+    # ---------------- persistence ---------------- #
+
+    def to_dict(self):
+        def clean(x):
+            return None if _is_nan(x) else x
+
+        return {
+            "ticker": self.ticker,
+            "high_low_window": self.high_low_window,
+            "last_date": self.last_date,
+            "rows": self.rows,
+            "valid_closes": self.valid_closes,
+            "prev_valid_close": clean(self.prev_valid_close),
+            "seed_gains": self.seed_gains,
+            "seed_losses": self.seed_losses,
+            "avg_gain": clean(self.avg_gain),
+            "avg_loss": clean(self.avg_loss),
+            "prev_close": clean(self.prev_close),
+            "tr_buffer": [clean(v) for v in self.tr_buffer],
+            "close_buffer": [clean(v) for v in self.close_buffer],
+            "high_deque": list(self.high_deque),
+            "low_deque": list(self.low_deque),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        def nan(x):
+            return NAN if x is None else x
+
+        state = cls(d["ticker"], d.get("high_low_window", HIGH_LOW_WINDOW))
+        state.last_date = d["last_date"]
+        state.rows = d["rows"]
+        state.valid_closes = d["valid_closes"]
+        state.prev_valid_close = nan(d["prev_valid_close"])
+        state.seed_gains = d["seed_gains"]
+        state.seed_losses = d["seed_losses"]
+        state.avg_gain = nan(d["avg_gain"])
+        state.avg_loss = nan(d["avg_loss"])
+        state.prev_close = nan(d["prev_close"])
+        state.tr_buffer.extend(nan(v) for v in d["tr_buffer"])
+        state.close_buffer.extend(nan(v) for v in d["close_buffer"])
+        state.high_deque.extend(tuple(p) for p in d["high_deque"])
+        state.low_deque.extend(tuple(p) for p in d["low_deque"])
+        return state
+
+    @classmethod
+    def from_history(cls, ticker, dates, high, low, close, high_low_window=HIGH_LOW_WINDOW):
+        """Replays a full candle history into a fresh state."""
+        state = cls(ticker, high_low_window)
+        for date, h, l, c in zip(dates, high, low, close):
+            state.update({"Date": date, "High": h, "Low": l, "Close": c})
+        return state
+
+
+class IndicatorStateStore:
+    """One JSON file of TickerIndicatorState per ticker under ``path``."""
+
+    def __init__(self, path=None):
+        self.path = path or Constant.state_dir
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, ticker):
+        return os.path.join(self.path, f"{ticker}.json")
+
+    def load(self, ticker):
+        try:
+            with open(self._file(ticker), "r") as f:
+                return TickerIndicatorState.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Discarding unreadable indicator state for {ticker}: {e}")
+            return None
+
+    def save(self, state):
+        tmp = self._file(state.ticker) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp, self._file(state.ticker))
+
+    def drop(self, ticker):
+        try:
+            os.remove(self._file(ticker))
+        except FileNotFoundError:
+            pass
+
+
+def current_week_start(today=None):
+    """Monday of the week still in progress; candles before it are closed."""
+    today = pd.Timestamp(today or datetime.now()).normalize()
+    return today - pd.Timedelta(days=today.weekday())
+
+
+def seed_states(store, dates, prices, tickers, until=None, timeframe="W"):
+    """
+    Replays the closed candles (before ``until``, default the current
+    week) of every ticker in a price panel of ``timeframe`` candles into a
+    fresh state and saves it.
+    """
+    until = current_week_start() if until is None else until
+    closed = (dates < until).to_numpy()
+    iso_dates = dates[closed].dt.strftime("%Y-%m-%d").tolist()
+
+    for ticker in tickers:
+        state = TickerIndicatorState.from_history(
+            ticker, iso_dates,
+            prices["High"][ticker].to_numpy()[closed].tolist(),
+            prices["Low"][ticker].to_numpy()[closed].tolist(),
+            prices["Close"][ticker].to_numpy()[closed].tolist(),
+            HIGH_LOW_WINDOWS[timeframe],
+        )
+        store.save(state)
@@ -22,6 +22,29 @@ index_mapping = {
             "roc_nifty": {"type": "float"},
             "atr": {"type": "float"},
 
+            # Relative strength lines (close / benchmark close)
+            "rs_nifty": {"type": "float"},
+            "rs_nifty500": {"type": "float"},
+            "rs_sector": {"type": "float"},
+            "sector_index": {"type": "keyword"},
+
+            # Cross-sectional momentum ranks (percentile per date, see momentum_rank.py)
+            "roc_rank_pct": {"type": "float"},
+            "rsi_rank_pct": {"type": "float"},
+            "high_52w_rank_pct": {"type": "float"},
+            "rs_rank_pct": {"type": "float"},
+            "rs_rank_in_index": {"type": "float"},
+            "index_ranks": {
+                "type": "nested",
+                "properties": {
+                    "index": {"type": "keyword"},
+                    "roc_rank_pct": {"type": "float"},
+                    "rsi_rank_pct": {"type": "float"},
+                    "high_52w_rank_pct": {"type": "float"},
+                    "rs_rank_pct": {"type": "float"}
+                }
+            },
+
             # Moving Averages
             "ma_10": {"type": "float"},
             "ma_30": {"type": "float"},
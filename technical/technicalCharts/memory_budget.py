@@ -0,0 +1,95 @@
+import os
+import resource
+import threading
+
+import Constant
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MiB = 2 ** 20
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return peak_rss()
+
+
+def peak_rss():
+    """High-water mark of this process's resident set size in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryBudget:
+    """
+    Sizes full-index download batches to keep the process under a peak
+    RSS budget (Constant.memory_budget_mb).
+
+    ``observe`` is told how many bytes of frames (the daily download and
+    the price and indicator panels derived from it) one batch of tickers
+    needed. The cost of a ticker is the larger of those bytes and the RSS
+    growth since the run started spread over the ``in_flight`` batches
+    (the one downloading, the ones queued and the one computing), which
+    also covers allocator overhead and documents waiting to be sent. That
+    cost (with the frame bytes of the largest batch seen so far) sets the
+    next batch size, so that ``in_flight`` batches fit in what the budget
+    leaves above the RSS at the start. Whenever the RSS is found over the
+    budget anyway, the batch size is halved.
+
+    Batches handed out before the first one has been measured (the
+    pipeline downloads ahead) are only Constant.min_batch_size tickers.
+    Without a budget the batch size stays at ``start``.
+    """
+
+    def __init__(self, budget_mb=None, start=None, in_flight=1):
+        budget_mb = Constant.memory_budget_mb if budget_mb is None else budget_mb
+        self.budget = budget_mb * MiB if budget_mb else None
+        self.size = start or Constant.batch_size
+        self.in_flight = max(1, in_flight)
+        self.baseline = rss()
+        self.frame_cost = 0
+        self.per_ticker = 0
+        self.over_budget = 0
+        self.measured = False
+        self._lock = threading.Lock()
+
+    def batch_size(self):
+        with self._lock:
+            if self.budget is not None and not self.measured:
+                return min(self.size, Constant.min_batch_size)
+            return self.size
+
+    def observe(self, tickers, nbytes):
+        """Records the frames of one batch of ``tickers`` and logs the RSS high-water mark."""
+        current, peak = rss(), peak_rss()
+        with self._lock:
+            self.measured = True
+            tickers = max(1, tickers)
+            grown = max(0, current - self.baseline) / (tickers * self.in_flight)
+            self.frame_cost = max(self.frame_cost, nbytes / tickers)
+            self.per_ticker = max(self.frame_cost, grown)
+            if self.budget is not None:
+                if current > self.budget:
+                    self.over_budget += 1
+                    self.size = max(Constant.min_batch_size, self.size // 2)
+                else:
+                    headroom = max(0, self.budget - self.baseline)
+                    fits = int(headroom / (self.per_ticker * self.in_flight or 1))
+                    self.size = min(Constant.max_batch_size, max(Constant.min_batch_size, fits))
+            size = self.size
+
+        logger.info(f"Batch of {tickers} tickers: frames {nbytes / MiB:.1f} MiB "
+                    f"({self.per_ticker / MiB:.2f} MiB per ticker), rss {current / MiB:.0f} MiB, "
+                    f"high-water {peak / MiB:.0f} MiB, next batch {size} tickers")
+
+    def report(self):
+        budget = f"{self.budget / MiB:.0f} MiB" if self.budget else "none"
+        return (f"peak rss {peak_rss() / MiB:.0f} MiB (budget {budget}, "
+                f"{self.baseline / MiB:.0f} MiB at start), "
+                f"{self.per_ticker / MiB:.2f} MiB per ticker, last batch size {self.batch_size()}, "
+                f"{self.over_budget} batch(es) over budget")
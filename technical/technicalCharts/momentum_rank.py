@@ -0,0 +1,191 @@
+from array import array
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from elasticsearch import helpers
+
+import Constant
+from indexer import bulk_controller
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# (document field, rank field, field whose 0.0 marks a candle without a
+# value): the serializer writes 0.0 for NaN, so roc and rsi of the first
+# candles and the 52w distance of a candle without any high are 0.0 and
+# must not be ranked as real values.
+RANK_SOURCES = [
+    ("roc", "roc_rank_pct", "roc"),
+    ("rsi", "rsi_rank_pct", "rsi"),
+    ("dist_from_52w_high_pct", "high_52w_rank_pct", "high_52w"),
+]
+COMPOSITE_RANK = "rs_rank_pct"
+SECTOR_RANK = "rs_rank_in_index"
+
+# Rank updates handed to the bulk controller at a time (it encodes what it is given up front)
+RANK_BATCH = 50_000
+
+
+def percentile_rank(panel):
+    """Per-date (row-wise) percentile rank in (0, 100], NaN stays NaN."""
+    return panel.rank(axis=1, pct=True) * 100
+
+
+def load_panels(es, index_name, since=None, dates=None):
+    """
+    Scans the stock candles (on or after ``since``, and only those dated
+    in ``dates`` when given) and lays them out as one dates x tickers
+    frame per RANK_SOURCES field, with the candles that have no value set
+    to NaN. The scan fills flat row/column/value arrays that are scattered
+    into the panels in one step, without per-document frames.
+
+    Returns (panels, memberships, sectors): memberships maps each ticker
+    to its ``indices`` and sectors to its ``sector_index``.
+    """
+    fields = sorted({field for field, _, _ in RANK_SOURCES} | {valid for _, _, valid in RANK_SOURCES})
+    query = {"bool": {"filter": [{"term": {"type": "stock"}}]}}
+    if since is not None:
+        query["bool"]["filter"].append({"range": {"date": {"gte": pd.Timestamp(since).strftime("%Y-%m-%d")}}})
+    if dates is not None:
+        query["bool"]["filter"].append({"terms": {"date": sorted(dates)}})
+
+    tickers, days = {}, {}
+    rows, cols = array("q"), array("q")
+    values = {field: array("d") for field in fields}
+    memberships, sectors = {}, {}
+    for hit in helpers.scan(es, index=index_name, query={"query": query},
+                            _source=["ticker", "date", "indices", "sector_index"] + fields, size=5000):
+        source = hit["_source"]
+        ticker = source["ticker"]
+        if ticker not in tickers:
+            tickers[ticker] = len(tickers)
+            memberships[ticker] = source.get("indices") or []
+            sectors[ticker] = source.get("sector_index")
+        cols.append(tickers[ticker])
+        rows.append(days.setdefault(source["date"], len(days)))
+        for field, column in values.items():
+            value = source.get(field)
+            column.append(np.nan if value is None else value)
+
+    if not tickers:
+        return {}, memberships, sectors
+
+    # rows and columns in date and ticker order
+    day_order, ticker_order = sorted(days), sorted(tickers)
+    row_of = np.empty(len(days), dtype=np.int64)
+    row_of[[days[day] for day in day_order]] = np.arange(len(days))
+    col_of = np.empty(len(tickers), dtype=np.int64)
+    col_of[[tickers[ticker] for ticker in ticker_order]] = np.arange(len(tickers))
+    rows = row_of[np.frombuffer(rows, dtype=np.int64)]
+    cols = col_of[np.frombuffer(cols, dtype=np.int64)]
+    index = pd.DatetimeIndex(pd.to_datetime(day_order), name="date")
+    columns = pd.Index(ticker_order, name="ticker")
+
+    panels = {}
+    for field, _, valid in RANK_SOURCES:
+        present = np.frombuffer(values[valid]) != 0
+        panel = np.full((len(index), len(columns)), np.nan)
+        panel[rows[present], cols[present]] = np.frombuffer(values[field])[present]
+        panels[field] = pd.DataFrame(panel, index=index, columns=columns)
+    return panels, memberships, sectors
+
+
+def compute_ranks(panels, memberships):
+    """
+    Vectorized percentile ranks for every date at once.
+
+    Returns (universe, composite, in_index): universe maps each rank field
+    to a dates x tickers frame ranked across every stock; composite is the
+    percentile of the mean of those ranks (rs_rank_pct); in_index maps each
+    index to the same ranks computed among its member stocks only.
+    """
+    universe = {rank: percentile_rank(panels[field]) for field, rank, _ in RANK_SOURCES}
+    score = pd.concat(universe.values()).groupby(level=0).mean()
+    composite = percentile_rank(score)
+
+    members = {}
+    for ticker, indices in memberships.items():
+        for index in indices:
+            members.setdefault(index, []).append(ticker)
+
+    in_index = {}
+    for index, tickers in members.items():
+        tickers = [t for t in tickers if t in score.columns]
+        if not tickers:
+            continue
+        ranks = {rank: percentile_rank(panels[field][tickers]) for field, rank, _ in RANK_SOURCES}
+        ranks[COMPOSITE_RANK] = percentile_rank(score[tickers])
+        in_index[index] = ranks
+    return universe, composite, in_index
+
+
+def _clean(values):
+    return [None if v != v else v for v in values.tolist()]
+
+
+def rank_actions(index_name, panels, memberships, sectors):
+    """Partial-update actions with the rank fields of every ranked candle."""
+    universe, composite, in_index = compute_ranks(panels, memberships)
+    dates = composite.index.strftime("%Y-%m-%d").tolist()
+    ranked = composite.notna().to_numpy()
+
+    for col, ticker in enumerate(composite.columns):
+        rows = ranked[:, col].nonzero()[0]
+        if not len(rows):
+            continue
+
+        names = [rank for _, rank, _ in RANK_SOURCES] + [COMPOSITE_RANK]
+        columns = [_clean(universe[rank][ticker].to_numpy()[rows]) for rank in names[:-1]]
+        columns.append(_clean(composite[ticker].to_numpy()[rows]))
+
+        sector = sectors.get(ticker)
+        if sector in in_index:
+            names.append(SECTOR_RANK)
+            columns.append(_clean(in_index[sector][COMPOSITE_RANK][ticker].to_numpy()[rows]))
+
+        indices = [index for index in memberships.get(ticker, []) if index in in_index]
+        per_index = [
+            {rank: _clean(frame[ticker].to_numpy()[rows]) for rank, frame in in_index[index].items()}
+            for index in indices
+        ]
+
+        for i, row in enumerate(rows):
+            doc = {name: values[i] for name, values in zip(names, columns)}
+            doc["index_ranks"] = [
+                dict(index=index, **{rank: values[i] for rank, values in ranks.items()})
+                for index, ranks in zip(indices, per_index)
+            ]
+            yield {
+                "_op_type": "update",
+                "_index": index_name,
+                "_id": f"{ticker}_{dates[row]}",
+                "doc": doc,
+            }
+
+
+def rank_momentum(es, index_name=None, since=None, dates=None):
+    """
+    Post-indexing stage: ranks every stock candle (on or after ``since``)
+    against the whole universe and within each of its indices, and writes
+    the ranks back as partial updates. Ranks only compare candles of the
+    same date, so a run that changed a few dates passes them as ``dates``
+    and only those cross-sections are ranked again. Returns the number of
+    candles ranked.
+    """
+    index_name = index_name or Constant.index_name
+    es.indices.refresh(index=index_name)
+
+    panels, memberships, sectors = load_panels(es, index_name, since, dates)
+    if not panels:
+        logger.warning(f"No stock candles to rank in {index_name} since {since}")
+        return 0
+
+    logger.info(f"Ranking {panels['roc'].shape[1]} stocks over {panels['roc'].shape[0]} dates")
+    controller = bulk_controller(es)
+    actions = rank_actions(index_name, panels, memberships, sectors)
+    success = 0
+    while batch := list(islice(actions, RANK_BATCH)):
+        success += controller.submit(batch)
+    logger.info(f"Momentum ranks written for {success} candles")
+    return success
@@ -0,0 +1,305 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+import Constant
+from Constant import rsi_window, roc_period, atr_period
+from indicator_registry import PRICE_FIELDS, REGISTRY, evaluate, register
+
+MA_PERIODS = [10, 30, 40]
+HIGH_LOW_WINDOW = 52
+
+# Indicator periods are in candles of the timeframe being indexed, except
+# the 52 week high/low, which keeps its calendar span: 52 weekly, ~252
+# daily or 12 monthly candles.
+HIGH_LOW_WINDOWS = {"D": 252, "W": HIGH_LOW_WINDOW, "M": 12}
+
+# trend is stored as int8 codes into these labels
+TREND_LABELS = ("bearish", "sideways", "bullish")
+BEARISH, SIDEWAYS, BULLISH = range(len(TREND_LABELS))
+
+# Wilder smoothing never fully forgets its seed: n candles after it the
+# seed still weighs (13/14)^n. After 30 periods (~3e-14) an RSI recomputed
+# over the warm-up window is within ~1e-11 of the full-history value, far
+# below float32 resolution (~4e-6 at RSI 50).
+RSI_CONVERGENCE_PERIODS = 30
+
+
+# ================= DTYPES ================= #
+
+def float_dtype():
+    """Float dtype of price and indicator panels (see Constant.compact_dtypes)."""
+    return np.float32 if Constant.compact_dtypes else np.float64
+
+
+def price_dtype(field):
+    """Volume stays float64: float32 would round volumes above 2**24."""
+    return np.float64 if field == "Volume" else float_dtype()
+
+
+def panel_nbytes(panels):
+    """Bytes held by a {name: dates x tickers frame} dict."""
+    return sum(int(frame.memory_usage(index=False, deep=True).sum()) for frame in panels.values())
+
+
+# ================= PANEL SPLIT ================= #
+
+def _ticker_field(col, tickers):
+    """(ticker, field) of a fetch_data column, or None for other columns."""
+    if not isinstance(col, str):
+        return None
+    if "/" not in col:
+        # a flat single-ticker download
+        return (tickers[0], col) if len(tickers) == 1 and col in PRICE_FIELDS else None
+    first, second = col.split("/", 1)
+    if first in tickers:
+        return first, second
+    if second in tickers and first in PRICE_FIELDS:
+        # fetch_data names the columns of a single ticker "Field/TICKER"
+        return second, first
+    return None
+
+
+def split_panel(data_df, tickers):
+    """
+    Turns the flattened frame from fetch_data ("TICKER/Field" columns, or
+    "Field/TICKER" when one ticker was fetched) into one dates x tickers
+    frame per OHLCV field, in the field's price_dtype.
+
+    Returns (dates, {field: frame}); tickers without any column in the
+    download are left out of the frames.
+    """
+    tickers = list(tickers)
+    pairs = {col: pair for col in data_df.columns if (pair := _ticker_field(col, tickers)) is not None}
+    present = [t for t in tickers if any(ticker == t for ticker, _ in pairs.values())]
+    prices = {}
+    for field in PRICE_FIELDS:
+        columns = {ticker: col for col, (ticker, f) in pairs.items() if f == field}
+        frame = pd.DataFrame({ticker: data_df[columns[ticker]].to_numpy() for ticker in present if ticker in columns},
+                             index=range(len(data_df)))
+        prices[field] = frame.reindex(columns=present).astype(price_dtype(field), copy=False)
+
+    dates = pd.to_datetime(data_df["Date"], errors="coerce").reset_index(drop=True)
+    return dates, prices
+
+
+# ================= RSI KERNEL ================= #
+
+def wilder_rsi(close, periods):
+    """
+    Wilder RSI for one or more look-back periods in a single pass.
+
+    ``close`` is a Series (one ticker) or a DataFrame (dates x tickers).
+    NaN closes are skipped the same way the old row loop dropped them:
+    the change is taken against the previous valid close and the smoothing
+    carries straight over the gap, while the NaN rows themselves get NaN.
+
+    Wilder smoothing ``avg[i] = (avg[i-1] * (p - 1) + x[i]) / p`` is an EWM
+    with ``alpha = 1 / p``, so it is seeded with the SMA of the first ``p``
+    changes and handed to pandas' compiled ``ewm`` instead of a Python loop.
+
+    Returns {period: rsi} with rsi shaped like ``close``.
+    """
+    frame = close.to_frame() if isinstance(close, pd.Series) else close
+    frame = frame.astype(float)
+
+    valid = frame.notna()
+    # 1-based position of each row among the valid closes of its column
+    rank = valid.cumsum().where(valid).to_numpy()
+
+    change = (frame - frame.ffill().shift()).where(valid)
+    gain = change.clip(lower=0).to_numpy()
+    loss = -change.clip(upper=0).to_numpy()
+
+    result = {}
+    for period in periods:
+        seeded = rank == period + 1
+        smoothed = rank > period + 1
+        seed_rows = (rank >= 2) & (rank <= period + 1)
+
+        averages = []
+        for values in (gain, loss):
+            # fsum so the per-ticker running state reproduces the seed exactly
+            seed = np.array([math.fsum(col) for col in np.where(seed_rows, values, 0.0).T]) / period
+            series = np.where(seeded, seed, np.where(smoothed, values, np.nan))
+            avg = pd.DataFrame(series, index=frame.index, columns=frame.columns) \
+                .ewm(alpha=1 / period, adjust=False, ignore_na=True).mean()
+            averages.append(avg.where(seeded | smoothed))
+
+        avg_gain, avg_loss = averages
+        rs = avg_gain / avg_loss
+        rsi = 100 - (100 / (1 + rs))
+
+        result[period] = rsi.iloc[:, 0] if isinstance(close, pd.Series) else rsi
+
+    return result
+
+
+def window_mean(frame, period):
+    """
+    Mean of the last ``period`` rows at every row of a dates x tickers
+    frame, in float64; NaN where the window is not full or holds a NaN.
+
+    Each window is summed oldest candle first instead of with pandas'
+    running compensated sum, the order TickerIndicatorState sums its ring
+    buffers in, so the running state reproduces every mean bit for bit.
+    """
+    values = frame.to_numpy(dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    n = len(values)
+    if n >= period:
+        total = values[:n - period + 1].copy()
+        for k in range(1, period):
+            total += values[k:n - period + 1 + k]
+        out[period - 1:] = total / period
+    return pd.DataFrame(out, index=frame.index, columns=frame.columns)
+
+
+# ================= REGISTERED INDICATORS ================= #
+
+@register("tr", ["High", "Low", "Close"], lookback=1, dtype="float64", scratch=True)
+def true_range(high, low, close):
+    # float64 throughout, as the running state takes it
+    high, low, close = (frame.astype(np.float64) for frame in (high, low, close))
+    prev_close = close.shift()
+    return np.fmax(
+        np.fmax((high - low).to_numpy(), (high - prev_close).abs().to_numpy()),
+        (low - prev_close).abs().to_numpy()
+    )
+
+
+@register("atr", ["tr"], lookback=atr_period)
+def atr(tr):
+    return window_mean(tr, atr_period).fillna(0.0)
+
+
+@register("rsi", ["Close"], lookback=rsi_window * RSI_CONVERGENCE_PERIODS)
+def rsi(close):
+    return wilder_rsi(close, [rsi_window])[rsi_window]
+
+
+@register("roc", ["Close"], lookback=roc_period)
+def roc(close):
+    # Ratios of prices are taken in float64, as the running state does
+    close = close.astype(np.float64)
+    return (close.pct_change(periods=roc_period, fill_method=None) * 100).fillna(0.0)
+
+
+def _register_ma(period):
+    @register(f"ma_{period}", ["Close"], lookback=period)
+    def ma(close):
+        return window_mean(close, period).fillna(0.0)
+
+
+for _period in MA_PERIODS:
+    _register_ma(_period)
+
+
+@register("ma_10_above_30", ["ma_10", "ma_30"], dtype="bool")
+def ma_10_above_30(ma_10, ma_30):
+    return ma_10 > ma_30
+
+
+@register("ma_30_above_40", ["ma_30", "ma_40"], dtype="bool")
+def ma_30_above_40(ma_30, ma_40):
+    return ma_30 > ma_40
+
+
+@register("ma_10_above_40", ["ma_10", "ma_40"], dtype="bool")
+def ma_10_above_40(ma_10, ma_40):
+    return ma_10 > ma_40
+
+
+@register("trend", ["ma_10_above_30", "ma_30_above_40"], dtype="int8", categories=TREND_LABELS)
+def trend(above_10_30, above_30_40):
+    bullish = above_10_30 & above_30_40
+    bearish = ~above_10_30 & ~above_30_40
+    return np.where(bullish, BULLISH, np.where(bearish, BEARISH, SIDEWAYS)).astype(np.int8)
+
+
+@register("high_52w", ["High"], lookback="high_low_window", params=["high_low_window"])
+def high_52w(high, high_low_window):
+    return high.rolling(window=high_low_window, min_periods=1).max().fillna(0.0)
+
+
+@register("low_52w", ["Low"], lookback="high_low_window", params=["high_low_window"])
+def low_52w(low, high_low_window):
+    return low.rolling(window=high_low_window, min_periods=1).min().fillna(0.0)
+
+
+@register("dist_from_52w_high_pct", ["Close", "high_52w"])
+def dist_from_52w_high_pct(close, high):
+    close, high = close.astype(np.float64), high.astype(np.float64)
+    return (((close - high) / high.where(high != 0)) * 100).fillna(0.0)
+
+
+@register("dist_from_52w_low_pct", ["Close", "low_52w"])
+def dist_from_52w_low_pct(close, low):
+    close, low = close.astype(np.float64), low.astype(np.float64)
+    return (((close - low) / low.where(low != 0)) * 100).fillna(0.0)
+
+
+@register("price_above_ma_30", ["Close", "ma_30"], dtype="bool", scratch=True)
+def price_above_ma_30(close, ma_30):
+    return close > ma_30
+
+
+@register("price_above_ma_40", ["Close", "ma_40"], dtype="bool", scratch=True)
+def price_above_ma_40(close, ma_40):
+    return close > ma_40
+
+
+@register("vcp_trend_template",
+          ["dist_from_52w_low_pct", "dist_from_52w_high_pct", "trend", "price_above_ma_30", "price_above_ma_40"],
+          dtype="bool")
+def vcp_trend_template(dist_low, dist_high, trend_, above_30, above_40):
+    """
+    VCP Trend Template:
+    - At least 30% above 52W low
+    - At most 25% below 52W high
+    - MA trend bullish (10 > 30 > 40)
+    - Price above 30W and 40W MA
+    """
+    return (dist_low >= 30) & (dist_high >= -25) & (trend_ == BULLISH) & above_30 & above_40
+
+
+# ================= PANEL EVALUATION ================= #
+
+def timeframe_params(timeframe="W"):
+    """Registry parameters for candles of ``timeframe`` ("D", "W" or "M")."""
+    return {"high_low_window": HIGH_LOW_WINDOWS[timeframe]}
+
+
+def compute_panel(prices, names=None, timeframe="W"):
+    """
+    Computes the requested indicators (every document indicator when
+    ``names`` is None) on a whole dates x tickers panel of ``timeframe``
+    candles at once. Returns {column: frame} using the document column names.
+    """
+    return evaluate(prices, names, timeframe_params(timeframe), float_dtype())
+
+
+def ticker_indicators(indicators, ticker):
+    """
+    {name: column} of one ticker out of the indicator panels, with coded
+    indicators (e.g. trend) as categoricals of their labels.
+    """
+    columns = {}
+    for name, panel in indicators.items():
+        values = panel[ticker].to_numpy()
+        categories = REGISTRY[name].categories if name in REGISTRY else ()
+        columns[name] = pd.Categorical.from_codes(values, categories) if categories else values
+    return columns
+
+
+def ticker_frame(dates, prices, indicators, ticker):
+    """
+    Column slices of one ticker out of the price and indicator panels,
+    in the frame layout bulk_index_frame expects.
+    """
+    columns = {"Date": dates.to_numpy()}
+    for field, panel in prices.items():
+        columns[field] = panel[ticker].to_numpy()
+    columns.update(ticker_indicators(indicators, ticker))
+    return pd.DataFrame(columns)
@@ -0,0 +1,111 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import Constant
+from indicator_registry import price_inputs
+from logging_config import get_logger
+from panel_indicators import compute_panel, price_dtype
+
+logger = get_logger(__name__)
+
+
+def _compute_range(shm_name, shape, dtype, fields, lo, hi, tickers, names, timeframe):
+    """
+    Worker: indicators of tickers[lo:hi] computed on views into the shared
+    price block, returned as {name: ndarray}.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        block = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        prices = {
+            field: pd.DataFrame(block[k, :, lo:hi], columns=tickers, copy=False)
+            for k, field in enumerate(fields)
+        }
+        result = {name: frame.to_numpy() for name, frame in compute_panel(prices, names, timeframe).items()}
+        del prices, block
+        return result
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # a lingering view; the parent unlinks the block regardless
+            pass
+
+
+class PanelPool:
+    """
+    Process pool for compute_panel.
+
+    Each batch's price panel (only the fields the indicators read) is
+    copied once into a ``multiprocessing.shared_memory`` block of shape
+    (field, date, ticker) in the panel dtype.
+    Every worker computes the indicators of one column range straight from
+    views into that block, so no price frames are pickled; only the
+    indicator arrays come back. Indicators are independent per ticker
+    column, so the result is identical to ``compute_panel`` on the whole
+    panel.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or Constant.compute_workers
+        # spawn: the pool is used from the pipeline's threads
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=mp.get_context("spawn"))
+        logger.info(f"Indicator process pool with {self.workers} workers")
+
+    def compute(self, prices, names=None, timeframe="W"):
+        tickers = list(prices["Close"].columns)
+        index = prices["Close"].index
+        if not tickers:
+            return compute_panel(prices, names, timeframe)
+
+        fields = price_inputs(names)
+        dtype = np.result_type(*(price_dtype(field) for field in fields))
+        shape = (len(fields), len(index), len(tickers))
+        shm = shared_memory.SharedMemory(create=True, size=dtype.itemsize * int(np.prod(shape)))
+        try:
+            block = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            for k, field in enumerate(fields):
+                block[k] = prices[field][tickers].to_numpy(dtype=dtype)
+            del block
+
+            bounds = np.linspace(0, len(tickers), min(self.workers, len(tickers)) + 1).astype(int)
+            futures = [
+                self._executor.submit(_compute_range, shm.name, shape, dtype, fields, lo, hi, tickers[lo:hi],
+                                      names, timeframe)
+                for lo, hi in zip(bounds[:-1], bounds[1:])
+            ]
+            parts = [future.result() for future in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return {
+            name: pd.DataFrame(np.concatenate([part[name] for part in parts], axis=1),
+                               index=index, columns=tickers)
+            for name in parts[0]
+        }
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_pool():
+    """A PanelPool when Constant.compute_workers > 1, else None."""
+    return PanelPool() if Constant.compute_workers > 1 else None
+
+
+def compute(prices, names=None, pool=None, timeframe="W"):
+    """compute_panel, in ``pool`` when one is given."""
+    if pool is not None:
+        return pool.compute(prices, names, timeframe)
+    return compute_panel(prices, names, timeframe)
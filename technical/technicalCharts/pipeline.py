@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_DONE = object()
+
+
+class StageStats:
+    """Time one stage spent working, waiting for input and blocked on output."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+
+    def report(self, wall):
+        wall = wall or 1e-9
+        return (f"{self.name:<8} items={self.items:<6} busy={self.busy:8.2f}s ({100 * self.busy / wall:5.1f}%)"
+                f"  waiting for input={self.starved:8.2f}s  blocked on output={self.blocked:8.2f}s")
+
+
+class Pipeline:
+    """
+    Runs a source and a chain of stages in their own threads, connected by
+    bounded queues of ``depth`` items, so a slow stage applies backpressure
+    to the ones before it instead of letting work pile up in memory.
+
+    ``source`` is an iterable whose ``next`` is the first stage's work (e.g.
+    a download); every stage is ``(name, fn)`` with ``fn(item)`` returning
+    an iterable of items for the next stage, streamed on as a generator
+    produces them (the last stage's return value is ignored). ``depth=0``
+    runs everything serially in the caller's thread with the same
+    accounting. The first exception of any stage stops the pipeline and is
+    re-raised by ``run``.
+
+    In threaded mode the workers drop their reference to an item once it
+    is handed on, so a stage that deletes its input frees it right away.
+    """
+
+    def __init__(self, source_name, source, stages, depth=2):
+        self.source_name = source_name
+        self.source = source
+        self.stages = stages
+        self.depth = depth
+        self.stats = [StageStats(source_name)] + [StageStats(name) for name, _ in stages]
+        self.wall = 0.0
+        self._stop = threading.Event()
+        self._error = None
+
+    @staticmethod
+    def _produce(stats, fn, item):
+        """
+        Yields the outputs of ``fn(item)`` as they are produced (generators
+        are streamed, not materialized), timing only their production.
+        """
+        start = time.perf_counter()
+        out = fn(item)
+        del item
+        iterator = iter(out) if out is not None else iter(())
+        while True:
+            result = next(iterator, _DONE)
+            stats.busy += time.perf_counter() - start
+            if result is _DONE:
+                break
+            yield result
+            start = time.perf_counter()
+        stats.items += 1
+
+    # ---------------- serial ---------------- #
+
+    def _run_serial(self):
+        def push(level, item):
+            if level == len(self.stages):
+                return
+            for result in self._produce(self.stats[level + 1], self.stages[level][1], item):
+                push(level + 1, result)
+
+        iterator = iter(self.source)
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, _DONE)
+            if item is _DONE:
+                break
+            self.stats[0].busy += time.perf_counter() - start
+            self.stats[0].items += 1
+            push(0, item)
+
+    # ---------------- threaded ---------------- #
+
+    def _put(self, q, item, stats):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stats.blocked += time.perf_counter() - start
+
+    def _get(self, q, stats):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        else:
+            item = _DONE
+        stats.starved += time.perf_counter() - start
+        return item
+
+    def _fail(self, e):
+        if self._error is None:
+            self._error = e
+        self._stop.set()
+
+    def _source_worker(self, out_q):
+        stats = self.stats[0]
+        try:
+            iterator = iter(self.source)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                item = next(iterator, _DONE)
+                if item is _DONE:
+                    break
+                stats.busy += time.perf_counter() - start
+                stats.items += 1
+                self._put(out_q, item, stats)
+                del item
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(out_q, _DONE, stats)
+
+    def _stage_worker(self, fn, stats, in_q, out_q):
+        try:
+            while True:
+                item = self._get(in_q, stats)
+                if item is _DONE:
+                    break
+                results = self._produce(stats, fn, item)
+                del item
+                for result in results:
+                    if self._stop.is_set():
+                        break
+                    if out_q is not None:
+                        self._put(out_q, result, stats)
+                    del result
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if out_q is not None:
+                self._put(out_q, _DONE, stats)
+
+    def _run_threaded(self):
+        queues = [queue.Queue(maxsize=self.depth) for _ in self.stages]
+        threads = [threading.Thread(target=self._source_worker, args=(queues[0],),
+                                    name=self.source_name, daemon=True)]
+        for i, (name, fn) in enumerate(self.stages):
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(threading.Thread(target=self._stage_worker,
+                                            args=(fn, self.stats[i + 1], queues[i], out_q),
+                                            name=name, daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # ---------------- entry point ---------------- #
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            if self.depth > 0:
+                self._run_threaded()
+            else:
+                self._run_serial()
+        finally:
+            self.wall = time.perf_counter() - start
+            self.log_report()
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def bottleneck(self):
+        return max(self.stats, key=lambda s: s.busy).name
+
+    def log_report(self):
+        logger.info(f"Pipeline finished in {self.wall:.2f}s (depth {self.depth}), "
+                    f"bottleneck: {self.bottleneck()}")
+        for stats in self.stats:
+            logger.info(stats.report(self.wall))
@@ -0,0 +1,266 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import Constant
+from common.locked_json import update_json
+from common.ticker_health import get_health
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+MANIFEST = "manifest.json"
+
+# Days re-downloaded before the high-water mark: the last cached day may
+# have been an intraday candle, and comparing the closed days before it
+# tells whether yfinance has re-adjusted the history since (split/dividend).
+OVERLAP_DAYS = 7
+
+
+def yfinance_health():
+    """The TickerHealth of yfinance downloads (see common/ticker_health.py)."""
+    return get_health("yfinance")
+
+
+class PriceCache:
+    """
+    Raw daily OHLCV candles per ticker on disk, in front of yfinance.
+
+    Every ticker is one ``<ticker>.npz`` of date-sorted columns; the
+    manifest records per ticker the first date the cache covers and the
+    high-water mark (last cached candle). ``fetch`` downloads only what is
+    missing, merges it in and serves the requested range from disk.
+    """
+
+    def __init__(self, path=None, offline=None):
+        self.path = path or Constant.price_cache_dir
+        self.offline = Constant.price_cache_offline if offline is None else offline
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self._touched = set()
+
+    # ---------------- disk ---------------- #
+
+    def _file(self, ticker):
+        return os.path.join(self.path, f"{ticker}.npz")
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.path, MANIFEST), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning(f"Discarding unreadable price cache manifest: {e}")
+            return {}
+
+    def _save_manifest(self):
+        # only the entries changed here are merged in, so processes sharing the cache keep theirs
+        changes = {ticker: self.manifest.get(ticker) for ticker in self._touched}
+        self.manifest = update_json(os.path.join(self.path, MANIFEST), changes)
+        self._touched = set()
+
+    def load(self, ticker):
+        """{"Date": datetime64[D] array, field: float64 array} or None."""
+        if ticker not in self.manifest:
+            return None
+        try:
+            with np.load(self._file(ticker)) as npz:
+                return {name: npz[name] for name in ["Date"] + OHLCV}
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cached candles of {ticker}: {e}")
+            self.manifest.pop(ticker, None)
+            self._touched.add(ticker)
+            return None
+
+    def store(self, ticker, candles, covered_from):
+        tmp = self._file(ticker)[:-len(".npz")] + ".tmp.npz"
+        np.savez(tmp, **candles)
+        os.replace(tmp, self._file(ticker))
+
+        dates = candles["Date"]
+        self._touched.add(ticker)
+        self.manifest[ticker] = {
+            "start": str(covered_from),
+            "last": str(dates[-1]) if len(dates) else None,
+            "updated": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    # ---------------- planning ---------------- #
+
+    def _fetch_start(self, ticker, start):
+        """
+        (first day to download, whether the download replaces the cache):
+        the whole range when the cache does not reach back to ``start``,
+        otherwise the days from a short overlap before the high-water mark.
+        """
+        entry = self.manifest.get(ticker)
+        if entry is None or entry["last"] is None or np.datetime64(entry["start"]) > start:
+            return start, True
+        return np.datetime64(entry["last"]) - np.timedelta64(OVERLAP_DAYS, "D"), False
+
+    # ---------------- merge ---------------- #
+
+    @staticmethod
+    def _columns(data, ticker):
+        dates = pd.to_datetime(data["Date"])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        dates = dates.to_numpy().astype("datetime64[D]")
+        columns = {"Date": dates}
+        for field in OHLCV:
+            col = f"{ticker}/{field}"
+            if col not in data.columns:
+                return None
+            columns[field] = data[col].to_numpy(dtype=float)
+
+        keep = ~np.isnan(np.vstack([columns[f] for f in OHLCV])).all(axis=0)
+        return {name: values[keep] for name, values in columns.items()}
+
+    @staticmethod
+    def _adjusted_since(cached, fresh):
+        """True when the closed days both have disagree (history re-adjusted)."""
+        hwm = cached["Date"][-1]
+        common, ci, fi = np.intersect1d(cached["Date"], fresh["Date"], return_indices=True)
+        closed = common < hwm
+        if not closed.any():
+            return False
+        return not np.allclose(cached["Close"][ci[closed]], fresh["Close"][fi[closed]],
+                               rtol=1e-6, equal_nan=True)
+
+    @staticmethod
+    def _merge(cached, fresh):
+        """Cached candles before the first fresh day, then the fresh ones."""
+        keep = cached["Date"] < fresh["Date"][0] if len(fresh["Date"]) else slice(None)
+        return {name: np.concatenate([cached[name][keep], fresh[name]]) for name in cached}
+
+    # ---------------- download ---------------- #
+
+    def _download(self, tickers, start, end_date):
+        """yf.download of one group, always as "TICKER/Field" columns."""
+        logger.info(f"Downloading the data for {tickers} from {start} to {end_date}")
+        data = yf.download(tickers, start=str(start), end=end_date, interval="1d", group_by="ticker")
+        if data is None or data.empty:
+            return None
+        if isinstance(data.columns, pd.MultiIndex):
+            data.columns = [f"{col[0]}/{col[1]}" if col[1] else col[0] for col in data.columns]
+        else:
+            data.columns = [f"{tickers[0]}/{col}" for col in data.columns]
+        data.reset_index(inplace=True)
+        return data
+
+    def refresh(self, tickers, start_date, end_date):
+        """
+        Downloads the missing days of every ticker and merges them in.
+        Tickers yfinance keeps returning nothing for are not downloaded
+        while they back off; their cached candles are still served.
+        """
+        health = yfinance_health()
+        tickers = health.filter(tickers)
+        start = np.datetime64(pd.Timestamp(start_date).date())
+        end = np.datetime64(pd.Timestamp(end_date).date()) if end_date else None
+
+        # Tickers with the same first missing day share a download
+        groups = {}
+        replace = {}
+        for ticker in tickers:
+            fetch_start, replace[ticker] = self._fetch_start(ticker, start)
+            groups.setdefault(fetch_start, []).append(ticker)
+
+        refetch = []
+        answered, empty = [], []
+        for fetch_start, group in sorted(groups.items()):
+            if end is not None and fetch_start >= end:
+                continue
+            try:
+                data = self._download(group, fetch_start, end_date)
+            except Exception as e:
+                logger.error(f"Error downloading data for {group}: {e}")
+                continue
+            if data is None:
+                logger.warning(f"No data found for {group} from {fetch_start}")
+                empty.extend(group)
+                continue
+
+            for ticker in group:
+                fresh = self._columns(data, ticker)
+                (answered if fresh is not None and len(fresh["Date"]) else empty).append(ticker)
+                if fresh is None:
+                    continue
+                cached = None if replace[ticker] else self.load(ticker)
+                if cached is None:
+                    self.store(ticker, fresh, start)
+                elif self._adjusted_since(cached, fresh):
+                    refetch.append(ticker)
+                else:
+                    self.store(ticker, self._merge(cached, fresh), self.manifest[ticker]["start"])
+
+        # Nothing back for any ticker looks like an outage, not like dead tickers
+        if answered:
+            health.update(ok=answered, failed=empty)
+
+        if refetch:
+            logger.info(f"History re-adjusted for {refetch}, downloading it again")
+            for ticker in refetch:
+                self.manifest.pop(ticker, None)
+                self._touched.add(ticker)
+            self.refresh(refetch, start_date, end_date)
+        self._save_manifest()
+
+    # ---------------- serving ---------------- #
+
+    def fetch(self, tickers, start_date, end_date):
+        """
+        Daily candles of ``tickers`` in [start_date, end_date) in the layout
+        yf.download gives fetch_data: "TICKER/Field" columns for several
+        tickers, "Field/TICKER" for one, plus "Date". None when no ticker
+        has any candle in the range.
+        """
+        if not self.offline:
+            self.refresh(tickers, start_date, end_date)
+
+        start = np.datetime64(pd.Timestamp(start_date).date())
+        end = np.datetime64(pd.Timestamp(end_date).date()) if end_date else None
+
+        series = {}
+        for ticker in tickers:
+            candles = self.load(ticker)
+            if candles is None:
+                if self.offline:
+                    logger.warning(f"{ticker} is not in the price cache")
+                continue
+            dates = candles["Date"]
+            window = (dates >= start) & (dates < end) if end is not None else dates >= start
+            if window.any():
+                series[ticker] = {name: values[window] for name, values in candles.items()}
+
+        if not series:
+            logger.warning(f"No data found for {tickers} in the given date range.")
+            return None
+
+        all_dates = np.unique(np.concatenate([s["Date"] for s in series.values()]))
+        columns = {"Date": all_dates.astype("datetime64[ns]")}
+        for ticker, candles in series.items():
+            pos = np.searchsorted(all_dates, candles["Date"])
+            for field in OHLCV:
+                values = np.full(len(all_dates), np.nan)
+                values[pos] = candles[field]
+                name = f"{field}/{ticker}" if len(tickers) == 1 else f"{ticker}/{field}"
+                columns[name] = values
+        return pd.DataFrame(columns)
+
+
+_cache = None
+
+
+def get_price_cache():
+    """The process-wide PriceCache (manifest loaded once)."""
+    global _cache
+    if _cache is None:
+        _cache = PriceCache()
+    return _cache
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The technicalCharts modules import each other by their flat names and
+# the shared packages from the repository root, as run.sh sets them up.
+HERE = os.path.dirname(os.path.abspath(__file__))
+for path in (os.path.dirname(HERE), os.path.abspath(os.path.join(HERE, "..", "..", ".."))):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+import Constant
+from bench_serializer import encode, legacy_actions, synthetic_frame
+from doc_serializer import bulk_actions, ndjson_body, serialize
+from panel_indicators import TREND_LABELS
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_sources_match_the_legacy_generator(monkeypatch, compact):
+    monkeypatch.setattr(Constant, "compact_dtypes", compact)
+    data = synthetic_frame(300, seed=3)
+
+    legacy = list(legacy_actions("x", data, "T.NS"))
+    ids, sources = serialize(data, "T.NS")
+
+    assert ids == [action["_id"] for action in legacy]
+    assert sources == [action["_source"] for action in legacy]
+    assert {source["trend"] for source in sources} <= set(TREND_LABELS)
+
+
+def test_ndjson_body_encodes_the_same_actions():
+    ids, sources = serialize(synthetic_frame(50), "T.NS")
+
+    expected = "\n".join(encode(action) for action in bulk_actions("x", ids, sources)) + "\n"
+    assert ndjson_body("x", ids, sources) == expected.encode("utf-8")
+
+
+def test_upserts_are_partial_updates():
+    ids, sources = serialize(synthetic_frame(20), "T.NS")
+    action = bulk_actions("x", ids, sources, upsert=True)[0]
+    lines = ndjson_body("x", ids, sources, upsert=True).decode().splitlines()
+
+    assert action["_op_type"] == "update" and action["doc_as_upsert"]
+    assert json.loads(lines[1]) == {"doc": sources[0], "doc_as_upsert": True}
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Constant
+from incremental_indexing import _index_is_current
+from indicator_registry import max_lookback
+from panel_indicators import compute_panel, timeframe_params
+
+# float64 windows only differ from the full history by the RSI seed's leftover weight
+TOLERANCE = 1e-9
+
+
+def _prices(n, tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.05, (n, tickers)), axis=0))
+    spread = 1 + np.abs(rng.normal(0, 0.02, (n, tickers)))
+    columns = [f"T{i}" for i in range(tickers)]
+    return {
+        "Open": pd.DataFrame(close, columns=columns),
+        "High": pd.DataFrame(close * spread, columns=columns),
+        "Low": pd.DataFrame(close / spread, columns=columns),
+        "Close": pd.DataFrame(close, columns=columns),
+        "Volume": pd.DataFrame(rng.integers(1, 10 ** 6, (n, tickers)).astype(float), columns=columns),
+    }
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_tail_window_matches_full_recompute(monkeypatch, compact):
+    # A TAIL ticker is recomputed from max_lookback candles before its last
+    # indexed candle; the candles it writes must match a full rebuild.
+    monkeypatch.setattr(Constant, "compact_dtypes", compact)
+    prices = _prices(900, 20)
+    prices["Close"].iloc[:40, 3] = np.nan  # listed late
+    warmup = max_lookback(None, timeframe_params("W"))
+    last = 850
+
+    full = compute_panel(prices, timeframe="W")
+    tail = compute_panel({f: p.iloc[last - warmup:].reset_index(drop=True) for f, p in prices.items()},
+                         timeframe="W")
+
+    for name, expected in full.items():
+        expected = expected.iloc[last:].to_numpy()
+        actual = tail[name].iloc[warmup:].to_numpy()
+        if expected.dtype.kind == "f":
+            np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE, err_msg=name)
+        else:
+            assert (actual == expected).all(), name
+
+
+def test_index_is_current_spots_a_re_adjusted_history():
+    dates = pd.Series(pd.date_range("2024-01-01", periods=3, freq="W-MON"))
+    prices = {"Close": pd.DataFrame({"A.NS": [100.0, 101.5, np.nan]})}
+    candle = (dates[1], 101.5)
+
+    assert _index_is_current(candle, dates, prices, "A.NS")
+    assert _index_is_current(None, dates, prices, "A.NS")
+    assert _index_is_current((dates[2], None), dates, prices, "A.NS")
+    # a 1:2 split re-adjusts the whole history
+    assert not _index_is_current((dates[1], 101.5 * 2), dates, prices, "A.NS")
+    assert not _index_is_current((dates[0] - pd.Timedelta(weeks=1), 99.0), dates, prices, "A.NS")
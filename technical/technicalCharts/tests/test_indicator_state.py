@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Constant
+from indicator_state import IndicatorStateStore, TickerIndicatorState, seed_states
+from panel_indicators import TREND_LABELS, compute_panel, float_dtype, price_dtype
+
+
+def _state(closes):
+    state = TickerIndicatorState("A.NS")
+    for i, close in enumerate(closes):
+        state.update({"Date": f"2024-01-{i + 1:02d}", "High": close * 1.01, "Low": close * 0.99, "Close": close})
+    return state
+
+
+def test_agrees_with_the_close_it_last_took():
+    state = _state([100.0, 101.5, 99.25])
+
+    assert state.agrees_with(99.25)
+    # a 1:2 split re-adjusts the whole history
+    assert not state.agrees_with(99.25 / 2)
+    assert not state.agrees_with(math.nan)
+    assert _state([100.0, math.nan]).agrees_with(math.nan)
+
+
+def test_store_drops_a_state(tmp_path):
+    store = IndicatorStateStore(str(tmp_path))
+    store.save(_state([100.0, 101.0]))
+    assert store.load("A.NS") is not None
+
+    store.drop("A.NS")
+    store.drop("A.NS")
+    assert store.load("A.NS") is None
+
+
+def _panel(n, tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.05, (n, tickers)), axis=0))
+    spread = 1 + np.abs(rng.normal(0, 0.02, (n, tickers)))
+    close[:60, 1] = np.nan  # listed late
+    close[200:203, 2] = np.nan  # missing weeks
+    columns = [f"T{i}.NS" for i in range(tickers)]
+    fields = {"Open": close, "High": close * spread, "Low": close / spread, "Close": close,
+              "Volume": rng.integers(1, 10 ** 6, (n, tickers)).astype(float)}
+    prices = {field: pd.DataFrame(values, columns=columns).astype(price_dtype(field))
+              for field, values in fields.items()}
+    return pd.Series(pd.date_range("2012-01-02", periods=n, freq="W-MON")), prices
+
+
+@pytest.mark.parametrize("timeframe", ["D", "W", "M"])
+@pytest.mark.parametrize("compact", [True, False])
+def test_seeded_state_replays_the_panel(tmp_path, monkeypatch, compact, timeframe):
+    # seed on the first candles, then one update per candle, as
+    # incremental indexing does week after week
+    monkeypatch.setattr(Constant, "compact_dtypes", compact)
+    dates, prices = _panel(400, 4)
+    seeded = 150
+    store = IndicatorStateStore(str(tmp_path))
+    seed_states(store, dates, prices, list(prices["Close"].columns), until=dates[seeded], timeframe=timeframe)
+    panel = compute_panel(prices, timeframe=timeframe)
+
+    for ticker in prices["Close"].columns:
+        state = store.load(ticker)
+        rows = [state.update({"Date": dates[i].strftime("%Y-%m-%d"),
+                              **{f: prices[f][ticker].iat[i] for f in ("High", "Low", "Close")}})
+                for i in range(seeded, len(dates))]
+
+        for name, expected in panel.items():
+            expected = expected[ticker].to_numpy()[seeded:]
+            actual = np.array([row[name] for row in rows])
+            if name == "trend":
+                expected = np.array(TREND_LABELS)[expected]
+            elif expected.dtype.kind == "f":
+                actual = actual.astype(float_dtype())
+            np.testing.assert_array_equal(actual, expected.astype(actual.dtype), err_msg=f"{ticker} {name}")
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import momentum_rank
+from momentum_rank import RANK_SOURCES, load_panels, rank_momentum
+
+DATES = pd.date_range("2024-01-01", periods=12, freq="W-MON").strftime("%Y-%m-%d").tolist()
+
+
+def _docs(seed=0):
+    rng = np.random.default_rng(seed)
+    docs = []
+    for i in range(15):
+        ticker = f"S{i:02d}.NS"
+        indices = ["A"] if i % 2 else ["A", "B"]
+        for k, date in enumerate(DATES):
+            if i == 5 and k < 4:
+                continue  # listed late
+            docs.append({"ticker": ticker, "date": date, "type": "stock", "indices": indices,
+                         "sector_index": "B" if "B" in indices else None,
+                         "roc": 0.0 if k < 2 else rng.normal(), "rsi": rng.uniform(0, 100),
+                         "high_52w": 0.0 if i == 7 else 1.0, "dist_from_52w_high_pct": -rng.uniform(0, 50)})
+    rng.shuffle(docs)
+    return docs
+
+
+class FakeIndices:
+    def refresh(self, index):
+        pass
+
+
+class FakeES:
+    indices = FakeIndices()
+
+
+class Collector:
+    def __init__(self):
+        self.actions = []
+
+    def submit(self, actions):
+        self.actions.extend(actions)
+        return len(actions)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    docs = _docs()
+
+    def scan(es, index, query, _source, size):
+        since, dates = "", None
+        for clause in query["query"]["bool"]["filter"]:
+            if "range" in clause:
+                since = clause["range"]["date"]["gte"]
+            if "terms" in clause:
+                dates = set(clause["terms"]["date"])
+        for doc in docs:
+            if doc["date"] >= since and (dates is None or doc["date"] in dates):
+                yield {"_source": {name: doc.get(name) for name in _source}}
+
+    collector = Collector()
+    monkeypatch.setattr(momentum_rank.helpers, "scan", scan)
+    monkeypatch.setattr(momentum_rank, "bulk_controller", lambda es: collector)
+    return docs, collector
+
+
+def test_panels_match_a_pivot_of_the_documents(index):
+    docs, _ = index
+    panels, memberships, sectors = load_panels(FakeES(), "x")
+
+    frame = pd.DataFrame(docs).assign(date=lambda f: pd.to_datetime(f["date"]))
+    for field, _, valid in RANK_SOURCES:
+        expected = frame.assign(value=frame[field].where(frame[valid] != 0)) \
+            .pivot(index="date", columns="ticker", values="value")
+        pd.testing.assert_frame_equal(panels[field], expected, check_names=False)
+    assert memberships["S01.NS"] == ["A"] and sectors["S02.NS"] == "B"
+
+
+def test_ranking_some_dates_matches_ranking_everything(index):
+    _, collector = index
+    rank_momentum(FakeES(), "x")
+    everything = {action["_id"]: action["doc"] for action in collector.actions}
+
+    collector.actions.clear()
+    changed = {DATES[3], DATES[9]}
+    ranked = rank_momentum(FakeES(), "x", since=DATES[3], dates=changed)
+
+    some = {action["_id"]: action["doc"] for action in collector.actions}
+    assert ranked == len(some) > 0
+    assert {doc_id.rsplit("_", 1)[1] for doc_id in some} == changed
+    assert all(some[doc_id] == everything[doc_id] for doc_id in some)
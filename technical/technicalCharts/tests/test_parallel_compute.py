@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel_indicators import compute_panel, price_dtype
+from parallel_compute import PanelPool
+
+TICKERS = [f"T{i}.NS" for i in range(7)]
+
+
+def _prices(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.04, (n, len(TICKERS))), axis=0))
+    close[:80, 2] = np.nan  # listed late
+    fields = {"Open": close, "High": close * 1.02, "Low": close * 0.98, "Close": close,
+              "Volume": rng.integers(1, 10 ** 6, close.shape).astype(float)}
+    return {field: pd.DataFrame(values, columns=TICKERS).astype(price_dtype(field))
+            for field, values in fields.items()}
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with PanelPool(3) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize("timeframe", ["W", "D"])
+def test_pool_matches_single_process_compute(pool, timeframe):
+    prices = _prices()
+    expected = compute_panel(prices, timeframe=timeframe)
+    actual = pool.compute(prices, timeframe=timeframe)
+
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name], check_exact=True)
+
+
+def test_pool_computes_a_subset_for_fewer_tickers_than_workers(pool):
+    prices = {field: panel[TICKERS[:2]] for field, panel in _prices().items()}
+    actual = pool.compute(prices, ["vcp_trend_template"])
+
+    pd.testing.assert_frame_equal(actual["vcp_trend_template"],
+                                  compute_panel(prices, ["vcp_trend_template"])["vcp_trend_template"])
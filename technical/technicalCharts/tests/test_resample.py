@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_fetcher import _aggregation, _period_starts, resample_candles
+
+
+def groupby_candles(df, freq):
+    """The groupby().agg() resampling resample_candles replaced."""
+    df = df.assign(PeriodStart=_period_starts(df["Date"], freq))
+    agg_funcs = {col: _aggregation(col) for col in df.columns if col not in ["Date", "PeriodStart"]}
+    candles = df.groupby("PeriodStart").agg(agg_funcs).reset_index()
+    return candles.rename(columns={"PeriodStart": "Date"})
+
+
+def _daily(n=600, tickers=4, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {"Date": pd.bdate_range("2021-01-01", periods=n)}
+    for i in range(tickers):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        for field, values in (("Open", close * 1.001), ("High", close * 1.01), ("Low", close * 0.99),
+                              ("Close", close), ("Volume", rng.integers(1, 10 ** 6, n).astype(float))):
+            values = values.copy()
+            values[rng.random(n) < 0.05] = np.nan  # missing days
+            if i == 1:
+                values[:200] = np.nan  # listed late: whole periods without a candle
+            data[f"T{i}.NS/{field}"] = values
+    frame = pd.DataFrame(data)
+    frame["T3.NS/Volume"] = rng.integers(1, 10 ** 6, n)  # an int64 block
+    return frame
+
+
+@pytest.mark.parametrize("freq", ["W", "M"])
+def test_matches_groupby_agg(freq):
+    daily = _daily()
+    pd.testing.assert_frame_equal(resample_candles(daily, freq), groupby_candles(daily, freq), check_exact=True)
+
+
+def test_unsorted_days_give_the_same_candles():
+    daily = _daily()
+    shuffled = daily.sample(frac=1, random_state=0)
+    pd.testing.assert_frame_equal(resample_candles(shuffled, "W"), groupby_candles(daily, "W"), check_exact=True)
+
+
+def test_no_days_no_candles():
+    candles = resample_candles(_daily().iloc[:0], "W")
+    assert candles.empty and list(candles.columns)[0] == "Date"
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel_indicators import wilder_rsi
+
+# float64 panels only differ from the loop by summation order
+TOLERANCE = 1e-9
+
+
+def loop_rsi(close, period):
+    """The row loop wilder_rsi replaced (indexer.calculate_rsi before the vectorisation)."""
+    data = pd.DataFrame({"Close": close})
+    valid_data = data[data["Close"].notna()].copy()
+    if len(valid_data) <= period:
+        return pd.Series(np.nan, index=close.index)
+
+    valid_data["change"] = valid_data["Close"].diff()
+    valid_data["gain"] = valid_data["change"].clip(lower=0)
+    valid_data["loss"] = -valid_data["change"].clip(upper=0)
+    valid_data["avg_gain"] = np.nan
+    valid_data["avg_loss"] = np.nan
+
+    valid_data.iloc[period, valid_data.columns.get_loc("avg_gain")] = valid_data["gain"].iloc[1:period + 1].mean()
+    valid_data.iloc[period, valid_data.columns.get_loc("avg_loss")] = valid_data["loss"].iloc[1:period + 1].mean()
+    for i in range(period + 1, len(valid_data)):
+        valid_data.iloc[i, valid_data.columns.get_loc("avg_gain")] = (
+            (valid_data.iloc[i - 1]["avg_gain"] * (period - 1) + valid_data.iloc[i]["gain"]) / period)
+        valid_data.iloc[i, valid_data.columns.get_loc("avg_loss")] = (
+            (valid_data.iloc[i - 1]["avg_loss"] * (period - 1) + valid_data.iloc[i]["loss"]) / period)
+
+    rsi = 100 - (100 / (1 + valid_data["avg_gain"] / valid_data["avg_loss"]))
+    return rsi.reindex(close.index)
+
+
+def _close(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.03, n))))
+
+
+def _assert_same(expected, actual):
+    assert (expected.isna() == actual.isna()).all()
+    np.testing.assert_allclose(actual.dropna().to_numpy(), expected.dropna().to_numpy(), rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize("period", [7, 14])
+def test_matches_loop_across_nan_gaps(period):
+    close = _close(200, period)
+    close.iloc[:15] = np.nan  # listed late
+    close.iloc[[40, 41, 90, 150]] = np.nan  # missing days
+    close.iloc[60:75] = close.iloc[60]  # flat stretch
+
+    _assert_same(loop_rsi(close, period), wilder_rsi(close, [period])[period])
+
+
+@pytest.mark.parametrize("n", [5, 14, 15, 16])
+def test_matches_loop_on_short_history(n):
+    close = _close(n, n)
+    close.iloc[2] = np.nan
+
+    _assert_same(loop_rsi(close, 14), wilder_rsi(close, [14])[14])
+
+
+def test_panel_matches_loop_per_ticker():
+    panel = pd.DataFrame({"A": _close(120, 1), "B": _close(120, 2)})
+    panel.iloc[:30, 1] = np.nan
+    panel.iloc[50:53, 0] = np.nan
+
+    rsi = wilder_rsi(panel, [14])[14]
+    for ticker in panel.columns:
+        _assert_same(loop_rsi(panel[ticker], 14), rsi[ticker])
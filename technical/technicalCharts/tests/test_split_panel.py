@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from indicator_registry import PRICE_FIELDS
+from panel_indicators import split_panel
+
+DATES = pd.date_range("2024-01-01", periods=4, freq="D")
+
+
+def _download(columns):
+    frame = pd.DataFrame({"Date": DATES})
+    for i, name in enumerate(columns):
+        frame[name] = np.arange(4, dtype=float) + 10 * i
+    return frame
+
+
+def test_several_tickers():
+    data = _download([f"{t}/{f}" for t in ("A.NS", "B.NS") for f in PRICE_FIELDS])
+    dates, prices = split_panel(data, ["A.NS", "B.NS", "GONE.NS"])
+
+    assert list(dates) == list(DATES)
+    assert list(prices["Close"].columns) == ["A.NS", "B.NS"]
+    assert prices["Close"]["B.NS"].tolist() == data["B.NS/Close"].tolist()
+
+
+def test_one_ticker_batch():
+    # fetch_data names the columns of a single ticker "Field/TICKER"
+    data = _download([f"{f}/A.NS" for f in PRICE_FIELDS])
+    dates, prices = split_panel(data, ["A.NS"])
+
+    assert set(prices) == set(PRICE_FIELDS)
+    for field in PRICE_FIELDS:
+        assert list(prices[field].columns) == ["A.NS"]
+        assert prices[field]["A.NS"].tolist() == data[f"{field}/A.NS"].tolist()
+
+
+def test_nothing_downloaded():
+    dates, prices = split_panel(_download([]), ["A.NS"])
+
+    assert all(len(frame.columns) == 0 for frame in prices.values())